@@ -4,5 +4,16 @@
 """
 
 from .base_processor import BaseBatchProcessor
+from .content_dedup import ContentDeduplicator
+from .backup_manifest import BackupManifest
+from .io_scheduler import IOScheduler
+from .copy_engine import CopyEngine, copy_file, copy_file_resumable, reflink_file, verify_sampled
+from .pipeline import Pipeline
+from .rename_planner import RenamePlan, RenamePlanner, is_case_insensitive
+from .rename_journal import RenameJournal
 
-__all__ = ['BaseBatchProcessor']
\ No newline at end of file
+__all__ = [
+    'BaseBatchProcessor', 'ContentDeduplicator', 'BackupManifest', 'IOScheduler',
+    'CopyEngine', 'copy_file', 'copy_file_resumable', 'reflink_file', 'verify_sampled',
+    'Pipeline', 'RenamePlan', 'RenamePlanner', 'RenameJournal', 'is_case_insensitive',
+]
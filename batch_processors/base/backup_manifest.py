@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""
+备份清单
+
+每个备份目标目录保存一份SQLite清单，记录每个目标文件对应的
+源文件（大小、修改时间、哈希）和目标文件（大小、修改时间、哈希、编码设置）。
+再次备份时只需对源和目标做一次 stat，与清单比较即可找出
+新增、已修改、已损坏或编码设置变化的文件，不依赖 os.path.exists(dst)。
+"""
+
+import os
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .content_dedup import full_hash
+
+
+# 需要处理的原因
+REASON_NEW = 'new'
+REASON_CHANGED = 'changed'
+REASON_BROKEN = 'broken'
+REASON_SETTINGS = 'settings'
+
+
+def _stat(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime_ns
+    except OSError:
+        return None
+
+
+class BackupManifest:
+    """
+    单个备份目标目录的清单（线程安全）。
+
+    用法:
+        with BackupManifest(dest_folder) as manifest:
+            pending = manifest.plan(tasks, settings='copy')
+            ...
+            manifest.record(src, dst, settings='copy')
+    """
+
+    FILE_NAME = '.mediaflow_backup_manifest.db'
+    BATCH_SIZE = 500
+
+    def __init__(self, dest_folder: str, max_workers: Optional[int] = None):
+        """
+        初始化备份清单。
+
+        参数:
+            dest_folder: 备份目标根目录，清单保存在其中
+            max_workers: stat 扫描的线程数（I/O密集，网络盘上尤其有效）
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.dest_folder = os.path.abspath(dest_folder)
+        self.db_path = os.path.join(self.dest_folder, self.FILE_NAME)
+        self.max_workers = max_workers or min(32, (os.cpu_count() or 4) * 4)
+        self._lock = threading.Lock()
+        self._pending_rows: List[tuple] = []
+        self._pending_duplicates: List[tuple] = []
+        os.makedirs(self.dest_folder, exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                dst TEXT PRIMARY KEY,
+                src TEXT NOT NULL,
+                src_size INTEGER NOT NULL,
+                src_mtime_ns INTEGER NOT NULL,
+                src_hash TEXT,
+                dst_size INTEGER NOT NULL,
+                dst_mtime_ns INTEGER NOT NULL,
+                dst_hash TEXT,
+                settings TEXT NOT NULL
+            )""")
+        # 只记录在去重清单、没有写出目标的重复文件（去重方式为 skip 或硬链接失败时）
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS duplicates (
+                dst TEXT PRIMARY KEY,
+                src TEXT NOT NULL,
+                src_size INTEGER NOT NULL,
+                src_mtime_ns INTEGER NOT NULL,
+                canonical TEXT NOT NULL
+            )""")
+        self._conn.commit()
+
+    def close(self):
+        """写入缓冲的记录并关闭数据库"""
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self) -> 'BackupManifest':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def _key(self, dst: str) -> str:
+        """清单以相对路径为键，备份盘换盘符后仍然有效"""
+        return os.path.relpath(os.path.abspath(dst), self.dest_folder)
+
+    def _load_entries(self) -> Dict[str, tuple]:
+        with self._lock:
+            return {row[0]: row[1:] for row in self._conn.execute("SELECT * FROM entries")}
+
+    def _load_duplicates(self) -> Dict[str, tuple]:
+        with self._lock:
+            return {row[0]: row[1:] for row in self._conn.execute("SELECT * FROM duplicates")}
+
+    def _duplicate_intact(self, duplicate: tuple, src_stat: Tuple[int, int],
+                          entries: Dict[str, tuple]) -> bool:
+        """未写出目标的重复文件：源未变且规范副本的目标仍完好时无需处理"""
+        _, src_size, src_mtime_ns, canonical = duplicate
+        entry = entries.get(canonical)
+        if src_stat != (src_size, src_mtime_ns) or entry is None:
+            return False
+        dst_size, dst_mtime_ns = entry[4], entry[5]
+        return _stat(os.path.join(self.dest_folder, canonical)) == (dst_size, dst_mtime_ns)
+
+    def plan(self,
+             tasks: List[Tuple[str, str]],
+             settings: str,
+             adopt: Optional[Callable[[str, str], bool]] = None) -> List[Tuple[str, str, str]]:
+        """
+        找出需要处理的任务。
+
+        参数:
+            tasks: (源文件, 目标文件) 列表
+            settings: 本次的编码/复制设置描述，变化时需要重新生成
+            adopt: 清单中没有记录但目标已存在时（例如清单启用前的备份），
+                   判断目标是否可直接采用的函数；None表示不采用
+
+        返回:
+            [(源文件, 目标文件, 原因)]，原因为 new/changed/broken/settings
+        """
+        entries = self._load_entries()
+        duplicates = self._load_duplicates()
+        paths = [p for task in tasks for p in task]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            stats = dict(zip(paths, executor.map(_stat, paths)))
+
+        pending = []
+        adopted = 0
+        for src, dst in tasks:
+            src_stat, dst_stat = stats[src], stats[dst]
+            if src_stat is None:
+                continue
+            entry = entries.get(self._key(dst))
+            if entry is None:
+                duplicate = duplicates.get(self._key(dst))
+                if (dst_stat is None and duplicate is not None
+                        and self._duplicate_intact(duplicate, src_stat, entries)):
+                    continue
+                if dst_stat is not None and adopt is not None and adopt(src, dst):
+                    self.record(src, dst, settings)
+                    adopted += 1
+                else:
+                    pending.append((src, dst, REASON_NEW))
+                continue
+
+            (_, src_size, src_mtime_ns, src_hash,
+             dst_size, dst_mtime_ns, _, old_settings) = entry
+            if dst_stat is None or dst_stat != (dst_size, dst_mtime_ns):
+                pending.append((src, dst, REASON_BROKEN))
+            elif src_stat != (src_size, src_mtime_ns):
+                if (src_hash and src_stat[0] == src_size
+                        and self._unchanged_content(src, src_hash)):
+                    # 只有修改时间变化（如复制/还原时被重置），内容不变
+                    self.record(src, dst, old_settings, src_hash=src_hash)
+                else:
+                    pending.append((src, dst, REASON_CHANGED))
+            elif old_settings != settings:
+                pending.append((src, dst, REASON_SETTINGS))
+        self.flush()
+
+        if pending or adopted:
+            reasons = {}
+            for _, _, reason in pending:
+                reasons[reason] = reasons.get(reason, 0) + 1
+            self.logger.info(f"备份清单: {len(tasks)} 个文件，需处理 {len(pending)} 个 {reasons}，"
+                             f"采用已有目标 {adopted} 个")
+        return pending
+
+    def _unchanged_content(self, src: str, src_hash: str) -> bool:
+        try:
+            return full_hash(src) == src_hash
+        except OSError:
+            return False
+
+    def record(self,
+               src: str,
+               dst: str,
+               settings: str,
+               src_hash: Optional[str] = None,
+               dst_hash: Optional[str] = None):
+        """
+        记录一个已完成的目标文件（批量写入）。
+
+        参数:
+            src: 源文件
+            dst: 目标文件
+            settings: 生成目标时使用的设置
+            src_hash: 源文件内容哈希（已知时）
+            dst_hash: 目标文件内容哈希（已知时）
+        """
+        src_stat, dst_stat = _stat(src), _stat(dst)
+        if src_stat is None or dst_stat is None:
+            return
+        row = (self._key(dst), os.path.abspath(src), *src_stat, src_hash, *dst_stat, dst_hash, settings)
+        with self._lock:
+            self._pending_rows.append(row)
+            if len(self._pending_rows) < self.BATCH_SIZE:
+                return
+            rows, self._pending_rows = self._pending_rows, []
+            self._write(rows)
+
+    def record_duplicate(self, src: str, dst: str, canonical_dst: str):
+        """
+        记录一个没有写出目标的重复文件（批量写入）。
+
+        参数:
+            src: 重复的源文件
+            dst: 本应写出的目标文件
+            canonical_dst: 内容相同、已备份的规范副本的目标文件
+        """
+        src_stat = _stat(src)
+        if src_stat is None:
+            return
+        row = (self._key(dst), os.path.abspath(src), *src_stat, self._key(canonical_dst))
+        with self._lock:
+            self._pending_duplicates.append(row)
+            if len(self._pending_duplicates) >= self.BATCH_SIZE:
+                self._write([])
+
+    def forget(self, dst: str):
+        """删除目标文件的记录"""
+        self.flush()
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE dst = ?", (self._key(dst),))
+            self._conn.execute("DELETE FROM duplicates WHERE dst = ?", (self._key(dst),))
+            self._conn.commit()
+
+    def flush(self):
+        """写入缓冲的记录"""
+        with self._lock:
+            rows, self._pending_rows = self._pending_rows, []
+            self._write(rows)
+
+    def _write(self, rows: List[tuple]):
+        """调用方需持有锁；同时写入缓冲的重复文件记录"""
+        duplicates, self._pending_duplicates = self._pending_duplicates, []
+        if not rows and not duplicates:
+            return
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO duplicates VALUES (?, ?, ?, ?, ?)", duplicates)
+        self._conn.commit()
@@ -15,6 +15,9 @@ import logging
 from typing import Optional, List, Dict, Any, Tuple
 from pathlib import Path
 
+from .rename_journal import journaled_rename
+from .rename_planner import RenamePlan, RenamePlanner
+
 
 class BaseBatchProcessor:
     """
@@ -186,31 +189,28 @@ class BaseBatchProcessor:
         self.logger.info(f"完成: {len(results['success'])}/{total} 个文件")
         return results
     
-    def rename_file(self, old_path: str, new_name: str) -> bool:
+    def rename_file(self, 
+                    old_path: str, 
+                    new_name: str,
+                    planner: Optional[RenamePlanner] = None) -> bool:
         """
         重命名单个文件。
         
         参数:
             old_path: 当前文件路径
             new_name: 新文件名（不是完整路径）
+            planner: 连续重命名同一目录中的多个文件时可传入同一个规划器，
+                     目录只列出一次
             
         返回:
             如果成功返回True，否则返回False
         """
         try:
-            directory = os.path.dirname(old_path)
-            new_path = os.path.join(directory, new_name)
-            
             # 处理名称冲突
-            if os.path.exists(new_path):
-                base, ext = os.path.splitext(new_name)
-                counter = 1
-                while os.path.exists(new_path):
-                    new_name = f"{base} ({counter}){ext}"
-                    new_path = os.path.join(directory, new_name)
-                    counter += 1
-                    
-            os.rename(old_path, new_path)
+            new_path = (planner or RenamePlanner()).add_rename(old_path, new_name)
+            new_name = os.path.basename(new_path)
+            if new_path != old_path:
+                os.rename(old_path, new_path)
             self.logger.info(f"已重命名: {os.path.basename(old_path)} -> {new_name}")
             return True
         except Exception as e:
@@ -230,29 +230,53 @@ class BaseBatchProcessor:
         返回:
             包含'success'和'failure'列表的字典
         """
-        results = {'success': [], 'failure': []}
+        plan = self.plan_batch_rename(files, name_func)
+        results = plan.execute(os.rename)
+        planned = {move.src for move in plan}
+        results['failure'].extend(f for f in files if f not in planned)
+        return results
+    
+    def plan_batch_rename(self, 
+                        files: List[str], 
+                        name_func) -> RenamePlan:
+        """
+        规划批量重命名（在内存中解决名称冲突，不修改文件）。
         
+        返回的计划可用 preview() 预览，用 execute() 执行。
+        
+        参数:
+            files: 文件路径列表
+            name_func: 接受(索引, 原文件名)并返回新名称的函数
+            
+        返回:
+            重命名计划
+        """
+        planner = RenamePlanner()
         for i, file_path in enumerate(files):
             try:
-                original_name = os.path.basename(file_path)
-                new_name = name_func(i, original_name)
-                
-                directory = os.path.dirname(file_path)
-                new_path = os.path.join(directory, new_name)
-                
-                # 处理冲突
-                if os.path.exists(new_path) and new_path != file_path:
-                    base, ext = os.path.splitext(new_name)
-                    counter = 1
-                    while os.path.exists(new_path):
-                        new_name = f"{base} ({counter}){ext}"
-                        new_path = os.path.join(directory, new_name)
-                        counter += 1
-                
-                os.rename(file_path, new_path)
-                results['success'].append((file_path, new_path))
+                new_name = name_func(i, os.path.basename(file_path))
             except Exception as e:
-                self.logger.error(f"重命名失败 {file_path}: {e}")
-                results['failure'].append(file_path)
-                
-        return results
\ No newline at end of file
+                self.logger.error(f"生成新名称失败 {file_path}: {e}")
+                continue
+            planner.add_rename(file_path, new_name)
+        return planner.plan
+    
+    def rename_with_journal(self, 
+                          folder_path: str, 
+                          moves: List[Tuple[str, str]]) -> Dict[str, Any]:
+        """
+        通过重命名日志执行一批重命名（可回滚，中断后可恢复）。
+        
+        配置项 rename_rollback_on_error 为True时任一项失败即撤销整批；
+        rename_recovery 决定如何处理上次中断留下的日志（'resume' 或 'rollback'）。
+        
+        参数:
+            folder_path: 处理目录，日志保存在其中
+            moves: (源路径, 目标路径) 列表
+            
+        返回:
+            包含'success'（(源, 目标)列表）和'failure'列表的字典
+        """
+        return journaled_rename(folder_path, moves,
+                                rollback_on_error=self.config.get('rename_rollback_on_error', False),
+                                recovery=self.config.get('rename_recovery', 'resume'))
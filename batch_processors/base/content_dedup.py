@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""
+内容去重
+
+按内容识别重复文件，逐级筛选以减少读取量：
+1. 文件大小相同
+2. 首尾数据块的部分哈希相同
+3. 全文件快速哈希相同（有xxhash时使用xxh3_128，否则BLAKE2b）
+"""
+
+import os
+import json
+import hashlib
+import logging
+from typing import Dict, List, Tuple, Iterable
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+
+# 部分哈希读取的首尾块大小
+PARTIAL_CHUNK_SIZE = 64 * 1024
+# 全文件哈希的读取块大小
+HASH_BUFFER_SIZE = 1024 * 1024
+
+
+def new_hasher():
+    """创建快速哈希对象（xxh3_128或BLAKE2b）。"""
+    if xxhash is not None:
+        return xxhash.xxh3_128()
+    return hashlib.blake2b(digest_size=16)
+
+
+def hash_algorithm() -> str:
+    """当前使用的哈希算法名称。"""
+    return 'xxh3_128' if xxhash is not None else 'blake2b-128'
+
+
+def partial_hash(path: str, chunk_size: int = PARTIAL_CHUNK_SIZE) -> str:
+    """
+    计算文件首尾数据块的哈希。
+
+    参数:
+        path: 文件路径
+        chunk_size: 首尾各读取的字节数
+
+    返回:
+        十六进制哈希字符串
+    """
+    hasher = new_hasher()
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        hasher.update(f.read(chunk_size))
+        if size > chunk_size:
+            f.seek(max(chunk_size, size - chunk_size))
+            hasher.update(f.read(chunk_size))
+    return hasher.hexdigest()
+
+
+def full_hash(path: str, buffer_size: int = HASH_BUFFER_SIZE) -> str:
+    """
+    计算整个文件的快速哈希。
+
+    参数:
+        path: 文件路径
+        buffer_size: 读取缓冲区大小
+
+    返回:
+        十六进制哈希字符串
+    """
+    hasher = new_hasher()
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    with open(path, 'rb', buffering=0) as f:
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            hasher.update(view[:n])
+    return hasher.hexdigest()
+
+
+class ContentDeduplicator:
+    """
+    按内容对文件分组。
+
+    用法:
+        dedup = ContentDeduplicator()
+        groups = dedup.group(paths)   # 每组第一个为保留的规范文件
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._partial_cache: Dict[str, str] = {}
+        self._full_cache: Dict[str, str] = {}
+        self.bytes_hashed = 0
+
+    def group(self, paths: Iterable[str]) -> List[List[str]]:
+        """
+        把内容相同的文件分到同一组。
+
+        参数:
+            paths: 文件路径（保持输入顺序，先出现的作为规范文件）
+
+        返回:
+            分组列表，每组至少一个文件
+        """
+        by_size: Dict[int, List[str]] = {}
+        order: List[int] = []
+        for path in paths:
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                continue
+            if size not in by_size:
+                by_size[size] = []
+                order.append(size)
+            by_size[size].append(path)
+
+        groups: List[List[str]] = []
+        for size in order:
+            candidates = by_size[size]
+            # 单个文件无需哈希；空文件内容必然相同
+            if len(candidates) == 1 or size == 0:
+                groups.append(candidates)
+                continue
+            for partial_group in self._split(candidates, self._partial):
+                if len(partial_group) == 1:
+                    groups.append(partial_group)
+                    continue
+                # 小文件的部分哈希已经覆盖全部内容
+                if size <= 2 * PARTIAL_CHUNK_SIZE:
+                    groups.append(partial_group)
+                    continue
+                groups.extend(self._split(partial_group, self._full))
+        return groups
+
+    def find_duplicates(self, paths: Iterable[str]) -> Tuple[List[str], Dict[str, str]]:
+        """
+        找出重复文件。
+
+        参数:
+            paths: 文件路径
+
+        返回:
+            (唯一文件列表, {重复文件: 规范文件})
+        """
+        unique, duplicates = [], {}
+        for group in self.group(paths):
+            unique.append(group[0])
+            for path in group[1:]:
+                duplicates[path] = group[0]
+        if duplicates:
+            self.logger.info(f"内容去重: {len(duplicates)} 个重复文件")
+        return unique, duplicates
+
+    def split_tasks(self, tasks: List[Tuple[str, str]]) -> Tuple[List[Tuple[str, str]], List[Tuple[str, str, str]]]:
+        """
+        把 (源, 目标) 任务拆分为需要处理的任务和重复任务。
+
+        参数:
+            tasks: (源文件, 目标文件) 列表
+
+        返回:
+            (唯一任务列表, [(重复源文件, 目标文件, 规范源文件)])
+        """
+        dst_by_src = dict(tasks)
+        _, duplicates = self.find_duplicates(src for src, _ in tasks)
+        unique = [(src, dst) for src, dst in tasks if src not in duplicates]
+        dup_tasks = [(src, dst_by_src[src], canonical) for src, canonical in duplicates.items()]
+        return unique, dup_tasks
+
+    def _split(self, paths: List[str], key_func) -> List[List[str]]:
+        """按哈希键拆分一组候选文件，保持顺序。"""
+        buckets: Dict[str, List[str]] = {}
+        for path in paths:
+            try:
+                key = key_func(path)
+            except OSError as e:
+                self.logger.warning(f"无法读取 {path}: {e}")
+                key = f"unreadable:{path}"
+            buckets.setdefault(key, []).append(path)
+        return list(buckets.values())
+
+    def _partial(self, path: str) -> str:
+        if path not in self._partial_cache:
+            self._partial_cache[path] = partial_hash(path)
+            self.bytes_hashed += min(os.path.getsize(path), 2 * PARTIAL_CHUNK_SIZE)
+        return self._partial_cache[path]
+
+    def _full(self, path: str) -> str:
+        if path not in self._full_cache:
+            self._full_cache[path] = full_hash(path)
+            self.bytes_hashed += os.path.getsize(path)
+        return self._full_cache[path]
+
+
+def materialise_duplicate(canonical_dst: str, dst: str, mode: str = 'hardlink') -> str:
+    """
+    为重复文件生成目标。
+
+    参数:
+        canonical_dst: 已写入的规范文件目标路径
+        dst: 重复文件的目标路径
+        mode: 'hardlink'（失败时退回跳过）或'skip'
+
+    返回:
+        实际采用的方式：'hardlink' 或 'skip'
+    """
+    if mode == 'hardlink' and os.path.exists(canonical_dst) and not os.path.exists(dst):
+        try:
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            os.link(canonical_dst, dst)
+            return 'hardlink'
+        except OSError:
+            pass
+    return 'skip'
+
+
+def write_dedup_manifest(dest_folder: str, entries: Dict[str, Dict[str, str]]):
+    """
+    把去重记录合并写入目标目录的清单文件。
+
+    参数:
+        dest_folder: 目标根目录
+        entries: {重复文件目标路径: {'source':..., 'canonical':..., 'mode':...}}
+    """
+    if not entries:
+        return
+    manifest_path = os.path.join(dest_folder, '.mediaflow_dedup.json')
+    manifest = {}
+    if os.path.exists(manifest_path):
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = {}
+    for dst, entry in entries.items():
+        manifest[os.path.relpath(dst, dest_folder)] = {
+            'source': entry['source'],
+            'canonical': os.path.relpath(entry['canonical'], dest_folder),
+            'mode': entry['mode'],
+        }
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+"""
+按物理设备的I/O调度
+
+多个顺序读写同时作用在同一块机械硬盘上会导致磁头来回寻道，吞吐量急剧下降。
+这里根据 st_dev 和系统挂载信息把路径映射到物理设备（分区归并到所在磁盘，
+网络文件系统按服务器归并），并为每个设备限制并发的读写流数量：
+机械盘默认只允许一个，固态盘和网络存储允许多个，不同设备之间完全并行；
+无法判断介质类型的设备按机械盘保守处理。Windows上通过卷所在的物理磁盘号归并，
+并查询磁盘是否有寻道开销（机械盘）。长时间占用设备的读取（如转码）可使用
+独立的名额池，不阻塞同一设备上的复制。
+同一设备上的任务可按文件在磁盘上的物理位置排序。
+"""
+
+import os
+import sys
+import struct
+import logging
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+# 设备类型
+KIND_ROTATIONAL = 'rotational'
+KIND_SOLID = 'solid'
+KIND_NETWORK = 'network'
+KIND_UNKNOWN = 'unknown'
+
+# 每种设备默认的并发读写流数量（0表示不限制）；介质未知时按机械盘处理
+DEFAULT_LIMITS = {KIND_ROTATIONAL: 1, KIND_SOLID: 4, KIND_NETWORK: 2, KIND_UNKNOWN: 1}
+
+# Windows：GetDriveTypeW 返回的网络驱动器类型，以及查询卷所在磁盘和寻道开销的IOCTL
+_DRIVE_REMOTE = 4
+_IOCTL_VOLUME_GET_VOLUME_DISK_EXTENTS = 0x00560000
+_IOCTL_STORAGE_QUERY_PROPERTY = 0x002D1400
+_STORAGE_DEVICE_SEEK_PENALTY_PROPERTY = 7
+_PROPERTY_STANDARD_QUERY = 0
+_FILE_SHARE_READ_WRITE = 0x1 | 0x2
+_OPEN_EXISTING = 3
+
+# Linux FS_IOC_FIEMAP，用于获取文件第一个数据块的物理位置
+_FS_IOC_FIEMAP = 0xC020660B
+_FIEMAP_HEADER = struct.Struct('=QQIIII')
+_FIEMAP_EXTENT = struct.Struct('=QQQQQIIII')
+
+
+@dataclass(frozen=True)
+class DeviceInfo:
+    """物理设备"""
+    key: str
+    kind: str
+
+
+def _mount_sources() -> Dict[str, str]:
+    """读取 /proc/self/mountinfo，返回 {"主:次": 挂载源}"""
+    sources = {}
+    try:
+        with open('/proc/self/mountinfo', 'r', encoding='utf-8') as f:
+            for line in f:
+                fields = line.split()
+                if ' - ' not in line or len(fields) < 3:
+                    continue
+                tail = line.split(' - ', 1)[1].split()
+                if len(tail) >= 2:
+                    sources[fields[2]] = f"{tail[0]}:{tail[1]}"
+    except OSError:
+        pass
+    return sources
+
+
+def _linux_device(st_dev: int, mount_sources: Dict[str, str]) -> DeviceInfo:
+    """通过 sysfs 把分区/逻辑卷映射到磁盘，并读取是否为机械盘"""
+    major, minor = os.major(st_dev), os.minor(st_dev)
+    if major == 0:
+        source = mount_sources.get(f"{major}:{minor}", f"anon:{minor}")
+        fstype, _, remote = source.partition(':')
+        if remote.startswith('/dev/'):
+            # Btrfs等使用匿名设备号、但挂载源是块设备的文件系统：按挂载源所在磁盘归并
+            try:
+                rdev = os.stat(remote).st_rdev
+            except OSError:
+                rdev = 0
+            if os.major(rdev):
+                return _linux_device(rdev, mount_sources)
+        # 无块设备（NFS、SMB、FUSE等）：按挂载源的服务器归并
+        host = remote.lstrip('/').split('/')[0].split(':')[0] or remote
+        kind = KIND_NETWORK if fstype.startswith(('nfs', 'cifs', 'smb', 'fuse.sshfs')) else KIND_SOLID
+        return DeviceInfo(key=f"{fstype}:{host}", kind=kind)
+
+    node = os.path.realpath(f"/sys/dev/block/{major}:{minor}")
+    if os.path.exists(os.path.join(node, 'partition')):
+        node = os.path.dirname(node)
+    kind = KIND_SOLID
+    try:
+        with open(os.path.join(node, 'queue', 'rotational'), 'r') as f:
+            if f.read().strip() == '1':
+                kind = KIND_ROTATIONAL
+    except OSError:
+        pass
+    return DeviceInfo(key=os.path.basename(node) or f"{major}:{minor}", kind=kind)
+
+
+def _windows_ioctl(path: str, code: int, request: bytes, out_size: int) -> Optional[bytes]:
+    """打开设备（不需要读写权限）并执行 DeviceIoControl，失败返回None"""
+    import ctypes
+    from ctypes import wintypes
+
+    kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+    kernel32.CreateFileW.restype = wintypes.HANDLE
+    handle = kernel32.CreateFileW(path, 0, _FILE_SHARE_READ_WRITE, None, _OPEN_EXISTING, 0, None)
+    if handle in (None, wintypes.HANDLE(-1).value):
+        return None
+    try:
+        in_buffer = ctypes.create_string_buffer(request, len(request)) if request else None
+        out_buffer = ctypes.create_string_buffer(out_size)
+        returned = wintypes.DWORD()
+        ok = kernel32.DeviceIoControl(wintypes.HANDLE(handle), code, in_buffer, len(request),
+                                      out_buffer, out_size, ctypes.byref(returned), None)
+        return out_buffer.raw[:returned.value] if ok else None
+    finally:
+        kernel32.CloseHandle(wintypes.HANDLE(handle))
+
+
+def _windows_device(drive: str) -> Optional[DeviceInfo]:
+    """本地卷 -> 所在物理磁盘及其是否有寻道开销；无法查询时返回None"""
+    # VOLUME_DISK_EXTENTS：卷的第一个区段所在的磁盘号（跨盘卷按第一个磁盘归并）
+    extents = _windows_ioctl(f"\\\\.\\{drive}", _IOCTL_VOLUME_GET_VOLUME_DISK_EXTENTS, b'', 256)
+    if not extents or len(extents) < 12 or struct.unpack_from('<I', extents, 0)[0] < 1:
+        return None
+    disk = struct.unpack_from('<I', extents, 8)[0]
+    key = f"PhysicalDrive{disk}"
+
+    # STORAGE_PROPERTY_QUERY(StorageDeviceSeekPenaltyProperty) -> DEVICE_SEEK_PENALTY_DESCRIPTOR
+    query = struct.pack('<IIB3x', _STORAGE_DEVICE_SEEK_PENALTY_PROPERTY, _PROPERTY_STANDARD_QUERY, 0)
+    penalty = _windows_ioctl(f"\\\\.\\{key}", _IOCTL_STORAGE_QUERY_PROPERTY, query, 12)
+    if not penalty or len(penalty) < 9:
+        return DeviceInfo(key=key, kind=KIND_UNKNOWN)
+    return DeviceInfo(key=key, kind=KIND_ROTATIONAL if penalty[8] else KIND_SOLID)
+
+
+def _other_device(probe: str, st_dev: int) -> DeviceInfo:
+    """其他平台：Windows按物理磁盘归并并识别介质；其余按卷区分，介质未知"""
+    drive = os.path.splitdrive(probe)[0] or str(st_dev)
+    if drive.startswith(('\\\\', '//')):
+        return DeviceInfo(key=drive.upper(), kind=KIND_NETWORK)
+    if sys.platform == 'win32':
+        try:
+            import ctypes
+            if ctypes.windll.kernel32.GetDriveTypeW(drive + '\\') == _DRIVE_REMOTE:
+                return DeviceInfo(key=drive.upper(), kind=KIND_NETWORK)
+            device = _windows_device(drive)
+            if device is not None:
+                return device
+        except (ImportError, AttributeError, OSError):
+            pass
+    return DeviceInfo(key=drive.upper(), kind=KIND_UNKNOWN)
+
+
+def physical_offset(path: str) -> Optional[int]:
+    """文件第一个数据块在设备上的物理偏移（仅Linux且文件系统支持FIEMAP时）"""
+    if fcntl is None or not sys.platform.startswith('linux'):
+        return None
+    request = bytearray(_FIEMAP_HEADER.size + _FIEMAP_EXTENT.size)
+    _FIEMAP_HEADER.pack_into(request, 0, 0, 0xFFFFFFFFFFFFFFFF, 0, 0, 1, 0)
+    try:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            fcntl.ioctl(fd, _FS_IOC_FIEMAP, request)
+        finally:
+            os.close(fd)
+    except OSError:
+        return None
+    mapped = _FIEMAP_HEADER.unpack_from(request, 0)[3]
+    if not mapped:
+        return None
+    return _FIEMAP_EXTENT.unpack_from(request, _FIEMAP_HEADER.size)[1]
+
+
+class IOScheduler:
+    """
+    每个物理设备一个信号量，限制同时进行的顺序读写数量（线程安全）。
+
+    用法:
+        scheduler = IOScheduler(pools={'transcode': 1})
+        with scheduler.slot(src, dst):
+            copy_file(src, dst)
+        with scheduler.slot(video, pool='transcode'):
+            transcode(video)
+    """
+
+    def __init__(self,
+                 limits: Optional[Dict[str, int]] = None,
+                 pools: Optional[Dict[str, int]] = None):
+        """
+        初始化调度器。
+
+        参数:
+            limits: 各类设备的并发数，如 {'rotational': 1, 'solid': 4, 'network': 2, 'unknown': 1}（0为不限制）
+            pools: 独立名额池及其每个设备的并发数，如 {'transcode': 1}；
+                   池中的读取与默认名额（复制）分开计数，互不阻塞
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.limits = {**DEFAULT_LIMITS, **(limits or {})}
+        self.pools = dict(pools or {})
+        self._lock = threading.Lock()
+        self._devices: Dict[int, DeviceInfo] = {}
+        self._semaphores: Dict[Tuple[str, Optional[str]], Optional[threading.BoundedSemaphore]] = {}
+        self._mount_sources: Optional[Dict[str, str]] = None
+
+    def device_for(self, path: str) -> DeviceInfo:
+        """获取路径所在的物理设备（路径不存在时使用最近的已存在的上级目录）"""
+        probe = os.path.abspath(path)
+        while not os.path.exists(probe):
+            parent = os.path.dirname(probe)
+            if parent == probe:
+                break
+            probe = parent
+        try:
+            st_dev = os.stat(probe).st_dev
+        except OSError:
+            return DeviceInfo(key=probe, kind=KIND_SOLID)
+
+        with self._lock:
+            device = self._devices.get(st_dev)
+            if device is not None:
+                return device
+            if sys.platform.startswith('linux'):
+                if self._mount_sources is None:
+                    self._mount_sources = _mount_sources()
+                device = _linux_device(st_dev, self._mount_sources)
+            else:
+                device = _other_device(probe, st_dev)
+            self._devices[st_dev] = device
+            self.logger.debug(f"设备 {device.key} ({device.kind})")
+            return device
+
+    def _semaphore(self, device: DeviceInfo, pool: Optional[str]) -> Optional[threading.BoundedSemaphore]:
+        """设备在某个名额池中的信号量；不限制并发时为None"""
+        with self._lock:
+            key = (device.key, pool)
+            if key not in self._semaphores:
+                limit = self.limits.get(device.kind, 1) if pool is None else self.pools.get(pool, 1)
+                self._semaphores[key] = threading.BoundedSemaphore(limit) if limit else None
+            return self._semaphores[key]
+
+    @contextmanager
+    def slot(self, *paths: str, pool: Optional[str] = None):
+        """
+        占用这些路径所在设备各一个读写名额。
+
+        多个设备按固定顺序获取，避免互相等待导致死锁。
+
+        参数:
+            paths: 要读写的路径
+            pool: 名额池，None为默认（复制）名额
+        """
+        devices = {}
+        for path in paths:
+            device = self.device_for(path)
+            devices[device.key] = device
+        semaphores = [self._semaphore(devices[key], pool) for key in sorted(devices)]
+        # 不限制并发的设备没有信号量
+        semaphores = [semaphore for semaphore in semaphores if semaphore is not None]
+        acquired = []
+        try:
+            for semaphore in semaphores:
+                semaphore.acquire()
+                acquired.append(semaphore)
+            yield
+        finally:
+            for semaphore in reversed(acquired):
+                semaphore.release()
+
+    def order_by_location(self, tasks: Iterable[Tuple[str, ...]]) -> List[Tuple[str, ...]]:
+        """
+        按源文件（任务第一个元素）所在设备和磁盘上的物理位置排序。
+
+        不支持FIEMAP时退回按inode编号排序（多数文件系统上与分配位置相关）。
+        """
+        def location(task):
+            src = task[0]
+            device = self.device_for(src)
+            if device.kind != KIND_ROTATIONAL:
+                return device.key, 0
+            offset = physical_offset(src)
+            if offset is None:
+                try:
+                    offset = os.stat(src).st_ino
+                except OSError:
+                    offset = 0
+            return device.key, offset
+
+        return sorted(tasks, key=location)
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""
+分阶段处理流水线
+
+读取 -> 计算 -> 写入 三个阶段同时运行，阶段之间用有界队列连接：
+- 读取线程预读文件内容
+- 计算阶段在进程池中解码、变换、编码（绕开GIL）
+- 写入线程把结果写回磁盘
+在途数量有上限（背压），读取不会无限领先于写入；可选择按输入顺序写入。
+结束后给出每个阶段的利用率，便于判断瓶颈在磁盘还是CPU。
+"""
+
+import os
+import time
+import queue
+import logging
+import threading
+from dataclasses import dataclass, field
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+_DONE = object()
+
+
+def read_bytes(path: str) -> bytes:
+    """读取整个文件（默认的读取阶段）"""
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def write_bytes(path: str, data: bytes):
+    """
+    写入整个文件，必要时创建目录（写入阶段的常用实现）
+
+    先写入 path + '.part' 再替换为目标，中途失败不会留下半个文件或破坏已有文件。
+    """
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    part = path + '.part'
+    try:
+        with open(part, 'wb') as f:
+            f.write(data)
+        os.replace(part, path)
+    except BaseException:
+        if os.path.exists(part):
+            os.remove(part)
+        raise
+
+
+def _timed(process: Callable, data: Any) -> Tuple[Any, float]:
+    """在工作进程中执行计算并计时"""
+    start = time.perf_counter()
+    result = process(data)
+    return result, time.perf_counter() - start
+
+
+@dataclass
+class StageStats:
+    """单个阶段的统计"""
+    items: int = 0
+    busy: float = 0.0
+    concurrency: int = 1
+
+    def utilisation(self, wall: float) -> float:
+        """忙碌时间占 (总时间 × 并发数) 的比例"""
+        return self.busy / (wall * self.concurrency) if wall > 0 else 0.0
+
+
+@dataclass
+class PipelineResult:
+    """流水线运行结果"""
+    outputs: List[Tuple[Any, Any]] = field(default_factory=list)
+    failures: List[Tuple[Any, str]] = field(default_factory=list)
+    stages: Dict[str, StageStats] = field(default_factory=dict)
+    wall: float = 0.0
+
+    def summary(self) -> str:
+        """各阶段利用率摘要"""
+        parts = [f"{name} {stats.utilisation(self.wall):.0%}" for name, stats in self.stages.items()]
+        return f"{len(self.outputs)} 成功, {len(self.failures)} 失败, {self.wall:.1f}秒, 利用率: " + ", ".join(parts)
+
+
+class Pipeline:
+    """
+    读取 -> 计算 -> 写入 流水线。
+
+    process 在进程池中运行，必须是可pickle的模块级函数（可用 functools.partial 绑定参数）。
+
+    用法:
+        pipeline = Pipeline(read=lambda task: read_bytes(task[0]),
+                            process=partial(convert_bytes, fmt='PNG'),
+                            write=lambda task, data: write_bytes(task[1], data))
+        result = pipeline.run(tasks)
+    """
+
+    def __init__(self,
+                 read: Callable[[Any], Any],
+                 process: Callable[[Any], Any],
+                 write: Callable[[Any, Any], Any],
+                 workers: Optional[int] = None,
+                 queue_size: Optional[int] = None,
+                 ordered: bool = False,
+                 use_processes: bool = True):
+        """
+        初始化流水线。
+
+        参数:
+            read: 读取阶段，task -> 数据（在读取线程中运行）
+            process: 计算阶段，数据 -> 结果（在进程池中运行）
+            write: 写入阶段，(task, 结果) -> 输出值（在写入线程中运行）
+            workers: 计算进程数，默认CPU核数
+            queue_size: 读取队列长度和额外在途数量，默认 workers
+            ordered: 是否按输入顺序写入（否则先完成先写）
+            use_processes: False时计算阶段使用线程池（计算本身释放GIL时适用）
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.read = read
+        self.process = process
+        self.write = write
+        self.workers = workers or os.cpu_count() or 4
+        self.queue_size = queue_size or self.workers
+        self.ordered = ordered
+        self.use_processes = use_processes
+
+    def run(self, tasks: Iterable[Any]) -> PipelineResult:
+        """
+        处理一批任务，任一阶段的异常只记为该任务失败。
+
+        参数:
+            tasks: 任务（传给 read 和 write）
+
+        返回:
+            运行结果，outputs 为 [(task, write的返回值)]
+        """
+        tasks = list(tasks)
+        result = PipelineResult(stages={
+            'read': StageStats(),
+            'process': StageStats(concurrency=self.workers),
+            'write': StageStats(),
+        })
+        if not tasks:
+            return result
+
+        read_queue: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        write_queue: queue.Queue = queue.Queue()
+        # 已读取但未写完的任务数上限（计算中 + 等待写入）
+        in_flight = threading.BoundedSemaphore(self.workers + self.queue_size)
+        start = time.perf_counter()
+
+        def reader():
+            stats = result.stages['read']
+            for index, task in enumerate(tasks):
+                in_flight.acquire()
+                t0 = time.perf_counter()
+                try:
+                    data = self.read(task)
+                except Exception as e:
+                    write_queue.put((index, task, None, e))
+                    continue
+                finally:
+                    stats.busy += time.perf_counter() - t0
+                stats.items += 1
+                read_queue.put((index, task, data))
+            read_queue.put(_DONE)
+
+        def writer():
+            stats = result.stages['write']
+            pending: Dict[int, tuple] = {}
+            next_index = 0
+            remaining = len(tasks)
+            while remaining:
+                entry = write_queue.get()
+                if self.ordered:
+                    pending[entry[0]] = entry
+                    ready = []
+                    while next_index in pending:
+                        ready.append(pending.pop(next_index))
+                        next_index += 1
+                else:
+                    ready = [entry]
+                for _, task, output, error in ready:
+                    remaining -= 1
+                    if error is None:
+                        t0 = time.perf_counter()
+                        try:
+                            result.outputs.append((task, self.write(task, output)))
+                            stats.items += 1
+                        except Exception as e:
+                            error = e
+                        stats.busy += time.perf_counter() - t0
+                    if error is not None:
+                        result.failures.append((task, str(error)))
+                    in_flight.release()
+
+        reader_thread = threading.Thread(target=reader, name="pipeline-reader", daemon=True)
+        writer_thread = threading.Thread(target=writer, name="pipeline-writer", daemon=True)
+        reader_thread.start()
+        writer_thread.start()
+
+        # 进程启动有固定开销，任务很少时直接用线程
+        executor_class = ProcessPoolExecutor if self.use_processes and len(tasks) > 2 else ThreadPoolExecutor
+        process_stats = result.stages['process']
+        stats_lock = threading.Lock()
+        with executor_class(max_workers=self.workers) as executor:
+            while True:
+                entry = read_queue.get()
+                if entry is _DONE:
+                    break
+                index, task, data = entry
+
+                def done(future, index=index, task=task):
+                    try:
+                        output, busy = future.result()
+                    except Exception as e:
+                        write_queue.put((index, task, None, e))
+                        return
+                    with stats_lock:
+                        process_stats.items += 1
+                        process_stats.busy += busy
+                    write_queue.put((index, task, output, None))
+
+                try:
+                    future = executor.submit(_timed, self.process, data)
+                except Exception as e:
+                    # 进程池已损坏（工作进程崩溃，BrokenProcessPool）等：该任务记为失败，继续取后续任务
+                    write_queue.put((index, task, None, e))
+                    continue
+                future.add_done_callback(done)
+
+        writer_thread.join()
+        reader_thread.join()
+        result.wall = time.perf_counter() - start
+        self.logger.info(f"流水线完成: {result.summary()}")
+        return result
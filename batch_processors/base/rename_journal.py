@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+"""
+带日志的两阶段批量重命名
+
+先把整个计划写入处理目录下的日志文件，再执行重命名；每一步完成后追加一行进度标记。
+- 互换名称、仅大小写不同的重命名（在不区分大小写的文件系统上）先改为临时名称，
+  所有其他文件就位后再改为最终名称，任何时刻都不会覆盖文件
+- 某项失败时可整批回滚；进程中断后可根据日志和文件现状继续执行或回滚
+- 只有 rename 操作，不复制文件内容，上万个文件也能很快完成或撤销
+"""
+
+import os
+import json
+import uuid
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .rename_planner import is_case_insensitive
+
+
+# 每个条目的位置：在源名称 / 在临时名称 / 在目标名称 / 失败（保留在源名称）
+AT_SRC = 0
+AT_TMP = 1
+AT_DST = 2
+FAILED = -1
+
+_HEADER = 'MEDIAFLOW-RENAME-JOURNAL 1'
+_ROLLBACK = 'R'
+
+
+class _Entry:
+    __slots__ = ('src', 'dst', 'tmp', 'state')
+
+    def __init__(self, src: str, dst: str, tmp: Optional[str], state: int = AT_SRC):
+        self.src = src
+        self.dst = dst
+        self.tmp = tmp
+        self.state = state
+
+
+class RenameJournal:
+    """
+    处理目录中的重命名日志。
+
+    用法:
+        journal = RenameJournal(folder)
+        if journal.exists():
+            journal.recover('resume')       # 上次中断：继续执行（或 'rollback'）
+        results = journal.execute(moves)     # moves: [(src, dst)]
+    """
+
+    FILE_NAME = '.mediaflow_rename_journal'
+
+    def __init__(self, folder: str, sync_every: int = 256):
+        """
+        初始化重命名日志。
+
+        参数:
+            folder: 处理目录，日志保存在其中，条目以相对路径记录
+            sync_every: 每追加多少行进度标记落盘一次（中断时未落盘的进度根据文件现状推断）
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.folder = os.path.abspath(folder)
+        self.path = os.path.join(self.folder, self.FILE_NAME)
+        self.sync_every = max(1, sync_every)
+        self._handle = None
+        self._unsynced = 0
+
+    def exists(self) -> bool:
+        """是否有未完成的重命名日志"""
+        return os.path.exists(self.path)
+
+    def execute(self,
+                moves: Iterable[Tuple[str, str]],
+                rollback_on_error: bool = False) -> Dict[str, list]:
+        """
+        按日志执行一批重命名。
+
+        参数:
+            moves: [(源路径, 目标路径)]，目标不得与未参与本批的已有文件重名
+            rollback_on_error: 任一项失败时撤销整批
+
+        返回:
+            {'success': [(src, dst)], 'failure': [src]}，回滚时另含 'rolled_back': True
+        """
+        if self.exists():
+            raise RuntimeError(f"存在未完成的重命名日志，请先恢复: {self.path}")
+        entries = self._build(moves)
+        if not entries:
+            return {'success': [], 'failure': []}
+
+        self._write_plan(entries)
+        failed = self._forward(entries, stop_on_error=rollback_on_error)
+        if failed and rollback_on_error:
+            self.logger.warning(f"{failed} 个重命名失败，回滚整批 {len(entries)} 个文件")
+            self._backward(entries)
+            results = self._results(entries)
+            results['failure'] = [e.src for e in entries]
+            results['rolled_back'] = True
+            return results
+        return self._results(entries)
+
+    def recover(self, mode: str = 'resume') -> Dict[str, list]:
+        """
+        根据上次中断留下的日志继续执行或回滚。
+
+        参数:
+            mode: 'resume' 完成剩余重命名，'rollback' 恢复全部原名
+
+        返回:
+            与 execute 相同格式的结果
+        """
+        entries, rolling_back = self._load()
+        self.logger.warning(f"发现未完成的重命名日志（{len(entries)} 个条目），执行{mode}")
+        self._handle = open(self.path, 'a', encoding='utf-8')
+        if mode == 'rollback' or rolling_back:
+            # 已开始回滚的批次只能继续回滚
+            self._backward(entries)
+        else:
+            self._forward(entries, stop_on_error=False)
+        return self._results(entries)
+
+    # ---- 计划 ----
+
+    def _build(self, moves: Iterable[Tuple[str, str]]) -> List[_Entry]:
+        moves = [(os.path.abspath(src), os.path.abspath(dst)) for src, dst in moves]
+        moves = [(src, dst) for src, dst in moves if src != dst]
+        # 不区分大小写的文件系统上按小写比较，仅大小写不同的改名也经过临时名称
+        fold = str.lower if is_case_insensitive(self.folder) else os.path.normcase
+        sources = {fold(src) for src, _ in moves}
+        token = uuid.uuid4().hex[:8]
+        entries = []
+        for index, (src, dst) in enumerate(moves):
+            # 目标是本批某个文件的当前名称（互换/链式改名）时使用临时名称
+            tmp = None
+            if fold(dst) in sources:
+                tmp = os.path.join(os.path.dirname(dst), f".mediaflow-rename-{token}-{index}")
+            entries.append(_Entry(src, dst, tmp))
+        return entries
+
+    def _rel(self, path: Optional[str]) -> Optional[str]:
+        return os.path.relpath(path, self.folder) if path else None
+
+    def _abs(self, path: Optional[str]) -> Optional[str]:
+        return os.path.join(self.folder, path) if path else None
+
+    def _write_plan(self, entries: List[_Entry]):
+        """原子写入计划：先写临时文件并落盘，再替换为日志文件"""
+        partial = self.path + '.tmp'
+        with open(partial, 'w', encoding='utf-8') as f:
+            f.write(f"{_HEADER}\n")
+            for entry in entries:
+                f.write(json.dumps([self._rel(entry.src), self._rel(entry.dst), self._rel(entry.tmp)],
+                                   ensure_ascii=False, separators=(',', ':')) + '\n')
+            f.write('\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(partial, self.path)
+        self._handle = open(self.path, 'a', encoding='utf-8')
+
+    def _load(self) -> Tuple[List[_Entry], bool]:
+        """读取日志，并用文件现状校正未落盘的进度"""
+        with open(self.path, 'r', encoding='utf-8') as f:
+            lines = f.read().split('\n')
+        if not lines or lines[0] != _HEADER:
+            raise ValueError(f"无法识别的重命名日志: {self.path}")
+
+        entries = []
+        position = 1
+        while position < len(lines) and lines[position]:
+            src, dst, tmp = json.loads(lines[position])
+            entries.append(_Entry(self._abs(src), self._abs(dst), self._abs(tmp)))
+            position += 1
+
+        rolling_back = False
+        for line in lines[position + 1:]:
+            if line == _ROLLBACK:
+                rolling_back = True
+            elif line:
+                index, state = line.split()
+                entries[int(index)].state = int(state)
+
+        for entry in entries:
+            if entry.tmp and os.path.lexists(entry.tmp):
+                entry.state = AT_TMP
+            elif entry.state == AT_TMP:
+                # 临时文件已改名但进度未记录：方向由是否已开始回滚决定
+                # （改回源名称的失败条目在改名前已落盘 FAILED，不会走到这里）
+                entry.state = AT_SRC if rolling_back else AT_DST
+            elif entry.tmp is None and entry.state in (AT_SRC, AT_DST):
+                at_src, at_dst = os.path.lexists(entry.src), os.path.lexists(entry.dst)
+                if at_src != at_dst:
+                    entry.state = AT_SRC if at_src else AT_DST
+        return entries, rolling_back
+
+    def _mark(self, index: int, state: int, entries: List[_Entry]):
+        entries[index].state = state
+        self._handle.write(f"{index} {state}\n")
+        self._unsynced += 1
+        if self._unsynced >= self.sync_every:
+            self._sync()
+
+    def _sync(self):
+        self._handle.flush()
+        os.fsync(self._handle.fileno())
+        self._unsynced = 0
+
+    def _finish(self, entries: List[_Entry]):
+        """所有条目都在源名称或目标名称时删除日志；否则保留以便恢复"""
+        self._sync()
+        self._handle.close()
+        self._handle = None
+        stranded = [e for e in entries if e.state == AT_TMP]
+        if stranded:
+            self.logger.error(f"{len(stranded)} 个文件停留在临时名称，保留日志以便恢复: {self.path}")
+            return
+        os.remove(self.path)
+
+    # ---- 执行 ----
+
+    def _rename(self, old: str, new: str) -> bool:
+        # rename 在 POSIX 上会静默覆盖已有文件；本批之外的同名文件视为冲突
+        if os.path.lexists(new):
+            self.logger.error(f"目标已存在，跳过: {old} -> {new}")
+            return False
+        try:
+            os.rename(old, new)
+            return True
+        except OSError as e:
+            self.logger.error(f"重命名失败 {old} -> {new}: {e}")
+            return False
+
+    def _forward(self, entries: List[_Entry], stop_on_error: bool) -> int:
+        """阶段1：需要临时名称的改为临时名称；其余直接改名。阶段2：临时名称改为目标名称"""
+        failed = 0
+        for index, entry in enumerate(entries):
+            if entry.tmp and entry.state == AT_SRC:
+                if self._rename(entry.src, entry.tmp):
+                    self._mark(index, AT_TMP, entries)
+                else:
+                    self._mark(index, FAILED, entries)
+                    failed += 1
+                    if stop_on_error:
+                        return failed
+        # 阶段2开始前进度必须落盘：之后目标名称会被占用，已无法从文件现状推断
+        self._sync()
+        for index, entry in enumerate(entries):
+            if not entry.tmp and entry.state == AT_SRC:
+                if self._rename(entry.src, entry.dst):
+                    self._mark(index, AT_DST, entries)
+                else:
+                    self._mark(index, FAILED, entries)
+                    failed += 1
+                    if stop_on_error:
+                        return failed
+        self._sync()
+        for index, entry in enumerate(entries):
+            if entry.state == AT_TMP:
+                if self._rename(entry.tmp, entry.dst):
+                    self._mark(index, AT_DST, entries)
+                else:
+                    failed += 1
+                    # 先落盘失败标记再改回源名称，否则中断后会把“临时文件已消失”误判为已就位
+                    self._mark(index, FAILED, entries)
+                    self._sync()
+                    if not self._rename(entry.tmp, entry.src):
+                        self._mark(index, AT_TMP, entries)
+        if not (failed and stop_on_error):
+            self._finish(entries)
+        return failed
+
+    def _backward(self, entries: List[_Entry]):
+        """回滚：与执行相反，先把用临时名称的条目移开，再恢复直接改名的，最后恢复临时名称"""
+        self._handle.write(f"{_ROLLBACK}\n")
+        self._sync()
+        for index, entry in enumerate(entries):
+            if entry.tmp and entry.state == AT_DST and self._rename(entry.dst, entry.tmp):
+                self._mark(index, AT_TMP, entries)
+        self._sync()
+        for index, entry in enumerate(entries):
+            if not entry.tmp and entry.state == AT_DST and self._rename(entry.dst, entry.src):
+                self._mark(index, AT_SRC, entries)
+        self._sync()
+        for index, entry in enumerate(entries):
+            if entry.state == AT_TMP and self._rename(entry.tmp, entry.src):
+                self._mark(index, AT_SRC, entries)
+        self._finish(entries)
+
+    @staticmethod
+    def _results(entries: List[_Entry]) -> Dict[str, list]:
+        return {
+            'success': [(e.src, e.dst) for e in entries if e.state == AT_DST],
+            'failure': [e.src for e in entries if e.state != AT_DST],
+        }
+
+
+def journaled_rename(folder: str,
+                     moves: Iterable[Tuple[str, str]],
+                     rollback_on_error: bool = False,
+                     recovery: str = 'resume') -> Dict[str, list]:
+    """
+    便捷函数：先恢复目录中上次中断的重命名，再按日志执行本批重命名。
+
+    参数:
+        folder: 处理目录（保存日志）
+        moves: [(源路径, 目标路径)]
+        rollback_on_error: 任一项失败时撤销整批
+        recovery: 上次中断的处理方式，'resume' 或 'rollback'
+    """
+    journal = RenameJournal(folder)
+    if journal.exists():
+        journal.recover(recovery)
+    return journal.execute(moves, rollback_on_error)
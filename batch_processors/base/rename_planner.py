@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""
+重命名/移动规划器
+
+逐个 os.path.exists 探测冲突名称在大批量时代价很高：把上万个 IMG_0001.JPG
+扁平化到同一目录，最坏需要 O(n²) 次 stat。这里每个目标目录只列出一次，
+在内存中的名称集合里解决冲突（文件系统不区分大小写时按小写比较），
+生成完整的计划；计划既可以批量执行，也可以直接作为预览显示。
+"""
+
+import os
+import sys
+import logging
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+
+@dataclass(frozen=True)
+class PlannedMove:
+    """计划中的一次重命名/移动"""
+    src: str
+    dst: str
+
+    @property
+    def renamed(self) -> bool:
+        """目标名称是否因冲突而改名"""
+        return os.path.basename(self.src) != os.path.basename(self.dst)
+
+
+@dataclass
+class RenamePlan:
+    """按顺序执行的重命名/移动计划"""
+    moves: List[PlannedMove] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.moves)
+
+    def __iter__(self):
+        return iter(self.moves)
+
+    def preview(self, base_folder: Optional[str] = None) -> List[str]:
+        """
+        生成预览文本（与执行时的目标完全一致）。
+
+        参数:
+            base_folder: 显示相对于该目录的路径，None时显示完整路径
+        """
+        def show(path):
+            return os.path.relpath(path, base_folder) if base_folder else path
+        return [f"📄 {show(move.src)}  ➡️  {show(move.dst)}" for move in self.moves]
+
+    def execute(self,
+                operation: Callable[[str, str], object] = os.rename,
+                on_moved: Optional[Callable[[str, str], None]] = None) -> Dict[str, list]:
+        """
+        按顺序执行计划。
+
+        计划假定前面的源文件已经移走、其名称可以被后面的文件使用；
+        某项失败时，目标恰好是该源文件名称的后续项也会跳过，避免覆盖。
+
+        参数:
+            operation: 执行单项的函数，如 os.rename 或 shutil.move
+            on_moved: 每项成功后的回调 (src, dst)
+
+        返回:
+            {'success': [(src, dst)], 'failure': [src]}
+        """
+        logger = logging.getLogger(self.__class__.__name__)
+        results = {'success': [], 'failure': []}
+        still_present: Set[str] = set()
+        for move in self.moves:
+            if move.src == move.dst:
+                results['success'].append((move.src, move.dst))
+                continue
+            if os.path.normcase(move.dst) in still_present:
+                logger.error(f"跳过 {move.src}: 目标 {move.dst} 仍被未移动的文件占用")
+                results['failure'].append(move.src)
+                still_present.add(os.path.normcase(move.src))
+                continue
+            try:
+                operation(move.src, move.dst)
+            except Exception as e:
+                logger.error(f"移动失败 {move.src}: {e}")
+                results['failure'].append(move.src)
+                still_present.add(os.path.normcase(move.src))
+                continue
+            results['success'].append((move.src, move.dst))
+            if on_moved:
+                on_moved(move.src, move.dst)
+        return results
+
+
+def is_case_insensitive(directory: str) -> bool:
+    """通过大小写互换后的路径是否指向同一目录来判断文件系统是否区分大小写"""
+    head, tail = os.path.split(os.path.abspath(directory))
+    while tail and tail.swapcase() == tail:
+        head, tail = os.path.split(head)
+    if not tail:
+        # 路径中没有字母，按平台惯例判断
+        return sys.platform in ('win32', 'darwin')
+    probe = os.path.join(head, tail.swapcase())
+    try:
+        return os.path.samefile(os.path.join(head, tail), probe)
+    except OSError:
+        return False
+
+
+class RenamePlanner:
+    """
+    在内存中为一批重命名/移动分配不冲突的目标名称。
+
+    冲突时使用与原先相同的命名方式："名称 (1).jpg"、"名称 (2).jpg"...
+
+    用法:
+        planner = RenamePlanner()
+        for src in files:
+            planner.add(src, dest_folder)
+        plan = planner.plan
+        print("\\n".join(plan.preview()))
+        plan.execute(shutil.move)
+    """
+
+    def __init__(self, case_insensitive: Optional[bool] = None):
+        """
+        初始化规划器。
+
+        参数:
+            case_insensitive: 是否按不区分大小写比较名称；None时按每个文件系统自动检测
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.case_insensitive = case_insensitive
+        self.plan = RenamePlan()
+        self._names: Dict[str, Set[str]] = {}
+        self._released: Dict[str, Set[str]] = {}
+        self._folding: Dict[str, bool] = {}
+        self._device_folding: Dict[int, bool] = {}
+        self._next_counter: Dict[Tuple[str, str], int] = {}
+
+    def _folds_case(self, directory: str) -> bool:
+        if self.case_insensitive is not None:
+            return self.case_insensitive
+        folding = self._folding.get(directory)
+        if folding is None:
+            try:
+                device = os.stat(directory).st_dev
+            except OSError:
+                device = None
+            folding = self._device_folding.get(device)
+            if folding is None:
+                folding = is_case_insensitive(directory)
+                if device is not None:
+                    self._device_folding[device] = folding
+            self._folding[directory] = folding
+        return folding
+
+    def _key(self, directory: str, name: str) -> str:
+        return name.lower() if self._folds_case(directory) else name
+
+    def _occupied(self, directory: str) -> Set[str]:
+        """目录中已占用的名称（每个目录只列出一次）"""
+        names = self._names.get(directory)
+        if names is None:
+            try:
+                listing = os.listdir(directory)
+            except OSError:
+                listing = []
+            names = {self._key(directory, name) for name in listing}
+            names -= self._released.pop(directory, set())
+            self._names[directory] = names
+        return names
+
+    def add(self,
+            src: str,
+            dest_folder: str,
+            new_name: Optional[str] = None,
+            move: bool = True) -> str:
+        """
+        把一项加入计划并返回最终目标路径。
+
+        移动时源文件的名称在其所在目录中随即释放，后续项可以使用（与按顺序执行的效果一致）。
+
+        参数:
+            src: 源文件路径
+            dest_folder: 目标目录
+            new_name: 目标文件名，None时保持原名
+            move: False表示复制，源文件保留
+        """
+        name = new_name or os.path.basename(src)
+        if move:
+            self._release(src)
+
+        directory = os.path.abspath(dest_folder)
+        occupied = self._occupied(directory)
+        key = self._key(directory, name)
+        if key in occupied:
+            # 记住每个名称下一个可用的编号，同名文件很多时不必每次从1开始探测
+            base, ext = os.path.splitext(name)
+            counter_key = (directory, key)
+            counter = self._next_counter.get(counter_key, 1)
+            while True:
+                name = f"{base} ({counter}){ext}"
+                key = self._key(directory, name)
+                counter += 1
+                if key not in occupied:
+                    break
+            self._next_counter[counter_key] = counter
+        occupied.add(key)
+
+        dst = os.path.join(dest_folder, name)
+        self.plan.moves.append(PlannedMove(src, dst))
+        return dst
+
+    def add_rename(self, src: str, new_name: str) -> str:
+        """在原目录中重命名"""
+        return self.add(src, os.path.dirname(src), new_name)
+
+    def _release(self, src: str):
+        """源文件移走后其名称可被使用；所在目录尚未列出时先记下，列出时扣除"""
+        directory, name = os.path.split(os.path.abspath(src))
+        key = self._key(directory, name)
+        names = self._names.get(directory)
+        if names is not None:
+            names.discard(key)
+        else:
+            self._released.setdefault(directory, set()).add(key)
+
+    def reserve(self, path: str):
+        """标记一个路径将被占用（例如由其他方式生成的目标）"""
+        directory, name = os.path.split(os.path.abspath(path))
+        self._occupied(directory).add(self._key(directory, name))
+
+
+def plan_moves(sources: List[str], dest_folder: str,
+               case_insensitive: Optional[bool] = None) -> RenamePlan:
+    """便捷函数：规划把一批文件移动到同一目录"""
+    planner = RenamePlanner(case_insensitive)
+    for src in sources:
+        planner.add(src, dest_folder)
+    return planner.plan
+
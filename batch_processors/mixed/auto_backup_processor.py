@@ -7,13 +7,17 @@
 """
 
 import os
-import shutil
 import subprocess
-import json
 import time
 import concurrent.futures
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Callable, Tuple
 
+from core.engine.media_probe import probe_video
+from core.services.capture_index import CaptureIndex, JPEG_EXTENSIONS
+from ..base.backup_manifest import BackupManifest
+from ..base.copy_engine import CopyEngine
+from ..base.io_scheduler import IOScheduler
+from ..base.content_dedup import ContentDeduplicator, materialise_duplicate, write_dedup_manifest
 from .mixed_processor import MixedBatchProcessor
 
 
@@ -36,6 +40,19 @@ class AutoBackupProcessor(MixedBatchProcessor):
         """
         super().__init__(config)
         self.max_workers = config.get('max_workers', 2) if config else 2
+        # 内容去重：'hardlink'（重复文件硬链接到已备份的副本）、'skip'（只记录到清单）或None（关闭）
+        self.dedup_mode = config.get('dedup_mode', 'hardlink') if config else 'hardlink'
+        # 每个目标设备的并行复制数
+        self.copy_streams = config.get('copy_streams', 4) if config else 4
+        # 复制时计算源内容哈希并写入备份清单（改用缓冲复制，不走内核复制）；复制后抽样回读校验的段数（0为不校验）
+        self.checksum = config.get('checksum', False) if config else False
+        self.verify_samples = config.get('verify_samples', 0) if config else 0
+        # 目标生成方式：copy/auto/reflink/hardlink/symlink（备份默认完整复制，不与源共享数据块）
+        self.materialise = config.get('materialise', 'copy') if config else 'copy'
+        # 每个物理设备的并发读写流数量，如 {'rotational': 1, 'solid': 4, 'network': 2}
+        self.io_limits = config.get('io_limits') if config else None
+        # RAW/XMP的备份方式：'jpeg_only'（只备份JPEG）、'orphans'（没有对应JPEG的RAW及其XMP也备份）、'all'
+        self.raw_policy = config.get('raw_policy', 'jpeg_only') if config else 'jpeg_only'
     
     def check_ffmpeg_available(self) -> bool:
         """检查FFmpeg是否可用。"""
@@ -65,47 +82,31 @@ class AutoBackupProcessor(MixedBatchProcessor):
         return encoders
     
     def get_video_info(self, video_path: str) -> tuple:
-        """获取视频信息（宽度、高度、帧率、编码器）。"""
-        try:
-            cmd = ['ffprobe', '-v', 'quiet', '-print_format', 'json', '-show_streams', video_path]
-            result = subprocess.run(cmd, capture_output=True, text=True, 
-                             encoding='utf-8', errors='ignore', check=True)
-            info = json.loads(result.stdout)
-            for stream in info.get('streams', []):
-                if stream.get('codec_type') == 'video':
-                    w, h = stream.get('width'), stream.get('height')
-                    r = stream.get('r_frame_rate', '30/1')
-                    try:
-                        num, den = map(int, r.split('/'))
-                        fps = round(num / den, 2)
-                    except:
-                        fps = 30
-                    return int(w), int(h), fps, stream.get('codec_name', '')
-        except Exception as e:
-            self.logger.warning(f"无法获取视频信息: {e}")
-        return None, None, None, None
+        """获取视频信息（宽度、高度、帧率、编码器）。MP4/MOV不启动ffprobe。"""
+        info = probe_video(video_path)
+        if info is None:
+            self.logger.warning(f"无法获取视频信息: {video_path}")
+            return None, None, None, None
+        return info.width, info.height, round(info.fps or 30, 2), info.codec_name
     
     def is_8k_restore_folder(self, path: str) -> bool:
         """检查文件夹是否是8K修复文件夹。"""
         return "8K修复" in os.path.normpath(path).split(os.sep)
     
     def rename_extensions_to_uppercase(self, folder: str) -> int:
-        """将所有扩展名改为大写。"""
-        count = 0
+        """将所有扩展名改为大写（通过重命名日志执行，中断后可恢复）。"""
+        moves = []
         for root, _, files in os.walk(folder):
             if self.is_8k_restore_folder(root):
                 continue
             for f in files:
                 name, ext = os.path.splitext(f)
                 if ext != ext.upper():
-                    old = os.path.join(root, f)
-                    new = os.path.join(root, name + ext.upper())
-                    try:
-                        os.rename(old, new)
-                        count += 1
-                    except Exception as e:
-                        self.logger.warning(f"无法重命名 {f}: {e}")
-        return count
+                    moves.append((os.path.join(root, f), os.path.join(root, name + ext.upper())))
+        renamed = self.rename_with_journal(folder, moves)
+        for old in renamed['failure']:
+            self.logger.warning(f"无法重命名 {os.path.basename(old)}")
+        return len(renamed['success'])
     
     def backup(self,
               source_folder: str,
@@ -150,76 +151,246 @@ class AutoBackupProcessor(MixedBatchProcessor):
         self.logger.info("转换扩展名为大写...")
         self.rename_extensions_to_uppercase(source_folder)
         
-        # 步骤2：创建目录结构
-        self.logger.info("创建目录结构...")
-        for root, dirs, _ in os.walk(source_folder):
-            if self.is_8k_restore_folder(root):
-                continue
-            rel = os.path.relpath(root, source_folder)
-            if rel != '.':
-                os.makedirs(os.path.join(dest_folder, rel), exist_ok=True)
-        
-        # 步骤3：扫描文件
+        # 步骤2：扫描文件并创建目录结构（一次遍历）
         skip_exts = {e.lower() for e in self.RAW_EXTENSIONS}
+        video_exts = {e.lower() for e in self.VIDEO_EXTENSIONS}
+        photo_exts = {e.lower() for e in self.PHOTO_EXTENSIONS}
         video_tasks = []
         photo_copy_list = []
+        raw_candidates = []
+        captures = CaptureIndex()
         
         self.logger.info("扫描文件...")
         for root, _, files in os.walk(source_folder):
             if self.is_8k_restore_folder(root):
                 continue
+            rel = os.path.relpath(root, source_folder)
+            if rel != '.':
+                os.makedirs(os.path.join(dest_folder, rel), exist_ok=True)
             for name in files:
                 src = os.path.join(root, name)
                 ext_lower = os.path.splitext(name)[1].lower()
                 
-                if ext_lower in {e.lower() for e in self.VIDEO_EXTENSIONS}:
+                if ext_lower in video_exts:
                     # 视频：转码
                     dst = os.path.join(dest_folder, os.path.relpath(src, source_folder))
                     dst = os.path.splitext(dst)[0] + '.MP4'
-                    if not os.path.exists(dst):
-                        video_tasks.append((src, dst))
-                elif ext_lower in {e.lower() for e in self.PHOTO_EXTENSIONS} and ext_lower not in skip_exts:
+                    video_tasks.append((src, dst))
+                elif ext_lower in photo_exts and ext_lower not in skip_exts:
                     # 照片：复制
                     dst = os.path.join(dest_folder, os.path.relpath(src, source_folder))
-                    if not os.path.exists(dst):
-                        photo_copy_list.append((src, dst))
+                    photo_copy_list.append((src, dst))
+                    captures.add(src)
+                elif ext_lower in skip_exts:
+                    # RAW/XMP：按拍摄分组，扫描结束后根据是否有对应JPEG决定
+                    dst = os.path.join(dest_folder, os.path.relpath(src, source_folder))
+                    raw_candidates.append((src, dst))
+                    captures.add(src)
+        
+        if self.raw_policy != 'jpeg_only':
+            raw_tasks = self._select_raw_tasks(raw_candidates, captures)
+            self.logger.info(f"RAW/XMP: {len(raw_candidates)} 个，备份 {len(raw_tasks)} 个（{self.raw_policy}）")
+            photo_copy_list.extend(raw_tasks)
         
         self.logger.info(f"找到 {len(video_tasks)} 个视频, {len(photo_copy_list)} 张照片")
         
-        results = {'videos': [], 'photos': [], 'failed': []}
+        # 步骤3：照片复制和视频转码两个阶段并行，各自与备份清单比较、去重后处理
+        # （磁盘在转码时复制照片，CPU/GPU在复制时转码，总耗时接近两者中较长的一个）
+        transcode = not copy_only and ffmpeg_available
+        video_settings = f"transcode:{strategy}:{bitrate_option}" if transcode else 'copy'
+        photo_settings = 'copy'
         
-        # 步骤4：处理视频
-        if video_tasks and not copy_only and ffmpeg_available:
-            results['videos'] = self._transcode_videos(video_tasks, strategy, bitrate_option)
-        elif video_tasks:
+        def process_videos(tasks):
+            if transcode:
+                return self._transcode_and_record(tasks, strategy, bitrate_option, video_settings,
+                                                  manifest, copy_scheduler)
             # 直接复制视频
-            for src, dst in video_tasks:
-                try:
-                    os.makedirs(os.path.dirname(dst), exist_ok=True)
-                    shutil.copy2(src, dst)
-                    results['videos'].append(src)
-                except Exception as e:
-                    self.logger.error(f"复制失败 {src}: {e}")
-                    results['failed'].append(src)
+            return self._copy_files(tasks, video_settings, manifest, copy_scheduler,
+                                    copy_mb_per_s, 'videos')
         
-        # 步骤5：复制照片
-        for src, dst in photo_copy_list:
-            try:
-                os.makedirs(os.path.dirname(dst), exist_ok=True)
-                shutil.copy2(src, dst)
-                results['photos'].append(src)
-            except Exception as e:
-                self.logger.error(f"复制失败 {src}: {e}")
-                results['failed'].append(src)
+        # 两个阶段共享一个I/O调度器：同一块机械盘上同时只有一个复制流；
+        # 转码读取使用独立的名额池，长时间的转码不会阻塞照片复制
+        copy_scheduler = IOScheduler(self.io_limits, pools={'transcode': 1})
+        copy_mb_per_s = {}
+        manifest = BackupManifest(dest_folder)
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=2) as stages:
+                video_stage = stages.submit(self._run_stage, "视频", video_tasks, video_settings,
+                                            manifest, self._adopt_existing_video, process_videos)
+                photo_stage = stages.submit(self._run_stage, "照片", photo_copy_list, photo_settings,
+                                            manifest, self._adopt_existing_copy,
+                                            lambda tasks: self._copy_files(tasks, photo_settings, manifest,
+                                                                           copy_scheduler,
+                                                                           copy_mb_per_s, 'photos'))
+                video_result, photo_result = video_stage.result(), photo_stage.result()
+        finally:
+            manifest.close()
+        
+        # 步骤4：汇总结果，写入去重清单
+        results = {
+            'videos': video_result['done'],
+            'photos': photo_result['done'],
+            'failed': video_result['failed'] + photo_result['failed'],
+            'deduplicated': video_result['deduplicated'] + photo_result['deduplicated'],
+        }
+        if copy_mb_per_s:
+            results['copy_mb_per_s'] = copy_mb_per_s
+        dedup_entries = {**video_result['dedup_entries'], **photo_result['dedup_entries']}
+        write_dedup_manifest(dest_folder, dedup_entries)
+        if dedup_entries:
+            self.logger.info(f"内容去重: {len(dedup_entries)} 个重复文件未重复写入")
         
         return results
     
+    def _select_raw_tasks(self, 
+                          raw_candidates: List[Tuple[str, str]], 
+                          captures: CaptureIndex) -> List[Tuple[str, str]]:
+        """
+        按拍摄分组选择要备份的RAW/XMP文件。
+        
+        参数:
+            raw_candidates: RAW/XMP的 (源文件, 目标文件) 列表
+            captures: 本次扫描建立的拍摄分组索引
+            
+        返回:
+            需要备份的 (源文件, 目标文件) 列表
+        """
+        if self.raw_policy == 'all':
+            return list(raw_candidates)
+        selected = []
+        for src, dst in raw_candidates:
+            group = captures.group_of(src)
+            # 已有JPEG（相机JPEG或JPEG编辑变体）的拍摄只备份JPEG
+            if group is None or not (group.jpegs or group.edits_with(JPEG_EXTENSIONS)):
+                selected.append((src, dst))
+        return selected
+    
+    def _run_stage(self,
+                   name: str,
+                   tasks: List[tuple],
+                   settings: str,
+                   manifest: BackupManifest,
+                   adopt: Callable[[str, str], bool],
+                   process: Callable[[List[tuple]], Tuple[List[str], List[str]]]) -> Dict[str, Any]:
+        """
+        一个备份阶段：与备份清单比较 -> 内容去重 -> 处理 -> 生成重复文件。
+        
+        参数:
+            name: 阶段名称（日志用）
+            tasks: (源文件, 目标文件) 列表
+            settings: 编码/复制设置描述
+            manifest: 备份清单
+            adopt: 判断清单外已存在目标是否可采用的函数
+            process: 处理唯一任务，返回 (成功的源文件, 失败的源文件)
+            
+        返回:
+            包含 done/failed/deduplicated/dedup_entries 的字典
+        """
+        start = time.time()
+        # 只处理新增、已修改、已损坏或编码设置变化的文件
+        tasks = [(src, dst) for src, dst, _ in manifest.plan(tasks, settings, adopt=adopt)]
+        duplicate_tasks = []
+        if self.dedup_mode:
+            tasks, duplicate_tasks = ContentDeduplicator().split_tasks(tasks)
+        self.logger.info(f"{name}阶段: 需要处理 {len(tasks)} 个文件，重复 {len(duplicate_tasks)} 个")
+        
+        done, failed = process(tasks) if tasks else ([], [])
+        result = {'done': done, 'failed': failed, 'deduplicated': [], 'dedup_entries': {}}
+        if duplicate_tasks:
+            self._materialise_duplicates(duplicate_tasks, tasks, settings, manifest, result)
+        self.logger.info(f"{name}阶段完成: 成功 {len(done)} 个，失败 {len(result['failed'])} 个 "
+                         f"({time.time() - start:.1f}秒)")
+        return result
+    
+    def _copy_files(self,
+                    tasks: List[tuple],
+                    settings: str,
+                    manifest: BackupManifest,
+                    scheduler: Optional[IOScheduler] = None,
+                    rates: Optional[Dict[str, float]] = None,
+                    rate_key: str = 'photos') -> Tuple[List[str], List[str]]:
+        """
+        用复制引擎并行复制，并把大小、时间和复制时计算的源文件哈希记录到备份清单。
+        
+        提供 rates 时把本次复制速度（MB/s）写入 rates[rate_key]。
+        """
+        copied = []
+        
+        def on_copied(src, dst, digest):
+            # 哈希由复制时读出的源数据算出，并未回读目标
+            manifest.record(src, dst, settings, src_hash=digest)
+            copied.append(src)
+        
+        engine = CopyEngine(self.copy_streams, checksum=self.checksum,
+                            verify_samples=self.verify_samples, materialise=self.materialise,
+                            scheduler=scheduler)
+        stats = engine.copy_many(tasks, on_copied=on_copied)
+        if rates is not None:
+            rates[rate_key] = round(stats.mb_per_s, 1)
+        return copied, [src for src, _ in stats.failures]
+    
+    def _transcode_and_record(self,
+                              tasks: List[tuple],
+                              strategy: str,
+                              bitrate_option: str,
+                              settings: str,
+                              manifest: BackupManifest,
+                              scheduler: Optional[IOScheduler] = None) -> Tuple[List[str], List[str]]:
+        """转码视频并记录到备份清单。"""
+        transcoded = set(self._transcode_videos(tasks, strategy, bitrate_option, scheduler))
+        done, failed = [], []
+        for src, dst in tasks:
+            if src in transcoded:
+                manifest.record(src, dst, settings)
+                done.append(src)
+            else:
+                failed.append(src)
+        return done, failed
+    
+    def _adopt_existing_video(self, src: str, dst: str) -> bool:
+        """清单启用前已存在的转码结果：能解析出完整的moov才视为完成"""
+        return os.path.getsize(dst) > 1024 and probe_video(dst) is not None
+    
+    def _adopt_existing_copy(self, src: str, dst: str) -> bool:
+        """清单启用前已存在的复制结果：大小一致才视为完成"""
+        return os.path.getsize(dst) == os.path.getsize(src)
+    
+    def _materialise_duplicates(self,
+                                duplicate_tasks: List[tuple],
+                                tasks: List[tuple],
+                                settings: str,
+                                backup_manifest: BackupManifest,
+                                result: Dict[str, Any]):
+        """把重复文件硬链接到规范副本的备份目标，或只记录到去重清单和备份清单。"""
+        dst_by_src = dict(tasks)
+        done = set(result['done'])
+        for src, dst, canonical in duplicate_tasks:
+            canonical_dst = dst_by_src[canonical]
+            if canonical not in done:
+                # 规范副本处理失败，重复文件同样视为失败
+                result['failed'].append(src)
+                continue
+            if self.dedup_mode == 'hardlink' and os.path.exists(dst):
+                # 旧的（已修改或损坏的）目标，由硬链接替换；skip 模式不删除已有文件
+                os.remove(dst)
+            mode = materialise_duplicate(canonical_dst, dst, self.dedup_mode)
+            if mode == 'hardlink':
+                backup_manifest.record(src, dst, settings)
+            else:
+                # 记录到备份清单，下次备份时不会因目标不存在而重新复制
+                backup_manifest.record_duplicate(src, dst, canonical_dst)
+            result['dedup_entries'][dst] = {'source': src, 'canonical': canonical_dst, 'mode': mode}
+            result['deduplicated'].append(src)
+    
     def _transcode_videos(self, 
                         tasks: List[tuple],
                         strategy: str,
-                        bitrate_option: str) -> List[str]:
-        """转码视频。"""
+                        bitrate_option: str,
+                        scheduler: Optional[IOScheduler] = None) -> List[str]:
+        """转码视频。同一物理设备上同时读取的ffmpeg进程数受I/O调度器的转码名额池限制。"""
         results = []
+        if scheduler is None:
+            scheduler = IOScheduler(self.io_limits, pools={'transcode': 1})
         
         max_bitrate = {'low': '5M', 'medium': '10M', 'high': '20M'}[bitrate_option]
         bufsize = {'low': '10M', 'medium': '20M', 'high': '40M'}[bitrate_option]
@@ -257,18 +428,27 @@ class AutoBackupProcessor(MixedBatchProcessor):
             if scale_filter:
                 cmd += ['-vf', scale_filter]
             
-            cmd += ['-c:a', 'aac', '-b:a', '128k', '-y', dst]
+            # 先写入临时文件，完成后再替换，中断时不会留下截断的目标
+            part = dst + '.part'
+            cmd += ['-c:a', 'aac', '-b:a', '128k', '-f', 'mp4', '-y', part]
             
             start = time.time()
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=3600)
+            try:
+                with scheduler.slot(src, pool='transcode'):
+                    result = subprocess.run(cmd, capture_output=True, text=True, timeout=3600)
+            except subprocess.TimeoutExpired:
+                result = None
             
-            if result.returncode == 0 and os.path.exists(dst) and os.path.getsize(dst) > 1024:
+            if result is not None and result.returncode == 0 and os.path.exists(part) and os.path.getsize(part) > 1024:
+                os.replace(part, dst)
                 self.logger.info(f"已转码: {os.path.basename(src)} ({time.time()-start:.1f}秒)")
                 return True, src
+            if os.path.exists(part):
+                os.remove(part)
             return False, src
         
         with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as ex:
-            futures = [ex.submit(process_video, t) for t in tasks]
+            futures = [ex.submit(process_video, t) for t in scheduler.order_by_location(tasks)]
             for f in concurrent.futures.as_completed(futures):
                 ok, src = f.result()
                 if ok:
@@ -8,8 +8,12 @@
 
 import os
 import shutil
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 
+from ..base.copy_engine import CopyEngine, write_checksum_file
+from ..base.io_scheduler import IOScheduler
+from ..base.content_dedup import ContentDeduplicator, materialise_duplicate, write_dedup_manifest
+from ..base.rename_planner import RenamePlan, RenamePlanner
 from .mixed_processor import MixedBatchProcessor
 
 
@@ -26,6 +30,17 @@ class DirectoryFlattener(MixedBatchProcessor):
             config: 可选的配置字典
         """
         super().__init__(config)
+        # 复制时的内容去重：'hardlink'、'skip'或None（关闭）
+        self.dedup_mode = config.get('dedup_mode', 'hardlink') if config else 'hardlink'
+        # 每个目标设备的并行复制数
+        self.copy_streams = config.get('copy_streams', 4) if config else 4
+        # 复制时计算源内容哈希并写入校验和文件（改用缓冲复制，不走内核复制）；复制后抽样回读校验的段数（0为不校验）
+        self.checksum = config.get('checksum', False) if config else False
+        self.verify_samples = config.get('verify_samples', 0) if config else 0
+        # 目标生成方式：auto/reflink/hardlink/symlink/copy（同一Btrfs/XFS卷上auto使用reflink，不占额外空间）
+        self.materialise = config.get('materialise', 'auto') if config else 'auto'
+        # 每个物理设备的并发读写流数量，如 {'rotational': 1, 'solid': 4, 'network': 2}
+        self.io_limits = config.get('io_limits') if config else None
     
     def flatten(self, 
                folder_path: str,
@@ -53,41 +68,15 @@ class DirectoryFlattener(MixedBatchProcessor):
                 self.logger.info("操作已取消")
                 return {'success': [], 'failure': [], 'error': '已取消'}
         
-        # 阶段1：收集所有文件路径（排除根目录中的文件）
-        files_to_move = []
-        for root, dirs, files in os.walk(folder_path):
-            if root == folder_path:
-                continue  # 跳过根目录文件
-            for filename in files:
-                src_path = os.path.join(root, filename)
-                files_to_move.append(src_path)
+        # 阶段1：收集所有文件路径并规划目标名称（在内存中处理文件名冲突）
+        plan = self.plan_flatten(folder_path)
+        self.logger.info(f"找到 {len(plan)} 个文件待移动")
         
-        self.logger.info(f"找到 {len(files_to_move)} 个文件待移动")
-        
-        results = {'success': [], 'failure': []}
-        
-        # 阶段2：移动文件并处理冲突
-        for src_path in files_to_move:
-            try:
-                filename = os.path.basename(src_path)
-                dest_path = os.path.join(folder_path, filename)
-                
-                # 处理文件名冲突
-                if os.path.exists(dest_path):
-                    base, ext = os.path.splitext(filename)
-                    counter = 1
-                    while os.path.exists(dest_path):
-                        new_name = f"{base} ({counter}){ext}"
-                        dest_path = os.path.join(folder_path, new_name)
-                        counter += 1
-                
-                shutil.move(src_path, dest_path)
-                self.logger.info(f"已移动: {filename}")
-                results['success'].append(src_path)
-                
-            except Exception as e:
-                self.logger.error(f"移动失败 {src_path}: {e}")
-                results['failure'].append(src_path)
+        # 阶段2：按计划移动文件
+        moved = plan.execute(
+            shutil.move,
+            on_moved=lambda src, dst: self.logger.info(f"已移动: {os.path.basename(src)}"))
+        results = {'success': [src for src, _ in moved['success']], 'failure': moved['failure']}
         
         # 阶段3：删除空子目录
         for root, dirs, _ in os.walk(folder_path, topdown=False):
@@ -102,6 +91,38 @@ class DirectoryFlattener(MixedBatchProcessor):
         self.logger.info(f"扁平化完成: {len(results['success'])} 个文件已移动")
         return results
     
+    def plan_flatten(self, folder_path: str) -> RenamePlan:
+        """
+        规划扁平化：子目录中的所有文件移动到根目录，冲突的名称依次编号。
+        
+        参数:
+            folder_path: 要扁平化的文件夹
+            
+        返回:
+            移动计划（flatten 按此执行，也可用于预览）
+        """
+        planner = RenamePlanner()
+        for root, dirs, files in os.walk(folder_path):
+            if root == folder_path:
+                continue  # 跳过根目录文件
+            for filename in files:
+                planner.add(os.path.join(root, filename), folder_path)
+        return planner.plan
+    
+    def preview(self, folder_path: str) -> List[str]:
+        """
+        预览扁平化结果（不移动文件）。
+        
+        参数:
+            folder_path: 要扁平化的文件夹
+            
+        返回:
+            预览文本行
+        """
+        if not self.validate_path(folder_path):
+            return [f"无效目录: {folder_path}"]
+        return self.plan_flatten(folder_path).preview(folder_path)
+    
     def copy_and_flatten(self, 
                       source_folder: str,
                       dest_folder: str,
@@ -136,31 +157,63 @@ class DirectoryFlattener(MixedBatchProcessor):
                 src_path = os.path.join(root, filename)
                 files_to_copy.append(src_path)
         
-        results = {'success': [], 'failure': []}
+        results = {'success': [], 'failure': [], 'deduplicated': []}
         
-        # 复制文件
+        # 内容去重：重复文件不再复制
+        duplicates = {}
+        if self.dedup_mode:
+            _, duplicates = ContentDeduplicator().find_duplicates(files_to_copy)
+        
+        # 分配目标文件名并处理冲突（包括本次已分配的名称）
+        planner = RenamePlanner()
+        copy_tasks = []
+        duplicate_tasks = []
         for src_path in files_to_copy:
-            try:
-                filename = os.path.basename(src_path)
-                dest_path = os.path.join(dest_folder, filename)
-                
-                # 处理冲突
-                if os.path.exists(dest_path):
-                    base, ext = os.path.splitext(filename)
-                    counter = 1
-                    while os.path.exists(dest_path):
-                        new_name = f"{base} ({counter}){ext}"
-                        dest_path = os.path.join(dest_folder, new_name)
-                        counter += 1
-                
-                shutil.copy2(src_path, dest_path)
-                self.logger.info(f"已复制: {filename}")
-                results['success'].append(src_path)
-                
-            except Exception as e:
-                self.logger.error(f"复制失败 {src_path}: {e}")
-                results['failure'].append(src_path)
+            dest_path = planner.add(src_path, dest_folder, move=False)
+            if src_path in duplicates:
+                duplicate_tasks.append((src_path, dest_path))
+            else:
+                copy_tasks.append((src_path, dest_path))
         
+        # 复制文件
+        copied = {}
+        digests = {}
+        
+        def on_copied(src_path, dest_path, digest):
+            copied[src_path] = dest_path
+            if digest is not None:
+                digests[dest_path] = digest
+            self.logger.info(f"已复制: {os.path.basename(src_path)}")
+        
+        engine = CopyEngine(self.copy_streams, checksum=self.checksum,
+                            verify_samples=self.verify_samples, materialise=self.materialise,
+                            scheduler=IOScheduler(self.io_limits))
+        stats = engine.copy_many(copy_tasks, on_copied=on_copied)
+        results['success'].extend(src for src, _ in copy_tasks if src in copied)
+        results['failure'].extend(src for src, _ in stats.failures)
+        
+        # 重复文件：硬链接到已复制的副本或只记录；规范副本复制失败时按普通文件复制
+        manifest = {}
+        fallback_tasks = []
+        for src_path, dest_path in duplicate_tasks:
+            canonical_dest = copied.get(duplicates[src_path])
+            if canonical_dest is None:
+                fallback_tasks.append((src_path, dest_path))
+                continue
+            mode = materialise_duplicate(canonical_dest, dest_path, self.dedup_mode)
+            if mode == 'hardlink' and canonical_dest in digests:
+                digests[dest_path] = digests[canonical_dest]
+            manifest[dest_path] = {'source': src_path, 'canonical': canonical_dest, 'mode': mode}
+            results['deduplicated'].append(src_path)
+        if fallback_tasks:
+            stats = engine.copy_many(fallback_tasks, on_copied=on_copied)
+            results['success'].extend(src for src, _ in fallback_tasks if src in copied)
+            results['failure'].extend(src for src, _ in stats.failures)
+        
+        write_dedup_manifest(dest_folder, manifest)
+        write_checksum_file(dest_folder, digests)
+        if manifest:
+            self.logger.info(f"内容去重: {len(manifest)} 个重复文件未复制")
         self.logger.info(f"复制完成: {len(results['success'])} 个文件已复制")
         return results
 
@@ -5,12 +5,36 @@
 支持 JPG/JPEG/PNG/TIF/TIFF 之间的真正格式转换（通过 Pillow）
 """
 
+import io
 import os
+from functools import partial
 from typing import Dict, Any, Optional, List
 
+from batch_processors.base.pipeline import Pipeline, read_bytes, write_bytes
 from batch_processors.photo.photo_processor import PhotoBatchProcessor
 
 
+def encode_for_extension(data: bytes, out_ext: str) -> bytes:
+    """按目标扩展名重新编码图像（在流水线的计算进程中运行）"""
+    from PIL import Image
+    with Image.open(io.BytesIO(data)) as img:
+        # JPEG 不支持透明通道，需要提前转换
+        if out_ext in ('.jpg', '.jpeg') and img.mode in ('RGBA', 'LA', 'P'):
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            if img.mode == 'P':
+                img = img.convert('RGBA')
+            if img.mode in ('RGBA', 'LA'):
+                background.paste(img, mask=img.split()[-1])
+                img = background
+            else:
+                img = img.convert('RGB')
+        elif out_ext in ('.jpg', '.jpeg') and img.mode != 'RGB':
+            img = img.convert('RGB')
+        output = io.BytesIO()
+        img.save(output, Image.registered_extensions()[out_ext])
+        return output.getvalue()
+
+
 class BatchPhotoExtensionRenamer(PhotoBatchProcessor):
     """
     通用图像格式批量转换器
@@ -39,22 +63,8 @@ class BatchPhotoExtensionRenamer(PhotoBatchProcessor):
     def _convert_image(self, src_path: str, dst_path: str) -> bool:
         """使用 Pillow 执行真正的图像格式转换"""
         try:
-            from PIL import Image
-            with Image.open(src_path) as img:
-                out_ext = os.path.splitext(dst_path)[1].lower()
-                # JPEG 不支持透明通道，需要提前转换
-                if out_ext in ('.jpg', '.jpeg') and img.mode in ('RGBA', 'LA', 'P'):
-                    background = Image.new('RGB', img.size, (255, 255, 255))
-                    if img.mode == 'P':
-                        img = img.convert('RGBA')
-                    if img.mode in ('RGBA', 'LA'):
-                        background.paste(img, mask=img.split()[-1])
-                        img = background
-                    else:
-                        img = img.convert('RGB')
-                elif out_ext in ('.jpg', '.jpeg') and img.mode != 'RGB':
-                    img = img.convert('RGB')
-                img.save(dst_path)
+            out_ext = os.path.splitext(dst_path)[1].lower()
+            write_bytes(dst_path, encode_for_extension(read_bytes(src_path), out_ext))
             return True
         except Exception:
             return False
@@ -65,6 +75,7 @@ class BatchPhotoExtensionRenamer(PhotoBatchProcessor):
 
         results = {"success": 0, "failed": 0, "skipped": 0, "details": []}
         output_ext_final = self._apply_case(self.output_ext)
+        tasks = []
 
         for root, dirs, files in os.walk(folder_path):
             if not recursive and root != folder_path:
@@ -80,26 +91,34 @@ class BatchPhotoExtensionRenamer(PhotoBatchProcessor):
                 old_path = os.path.join(root, f)
                 new_path = os.path.join(root, new_name)
 
-                try:
-                    if os.path.exists(new_path):
-                        results["skipped"] += 1
-                        results["details"].append(f"跳过: {f}  ➡️  {new_name}  (目标已存在)")
-                        continue
-
-                    if self._convert_image(old_path, new_path):
-                        os.remove(old_path)  # 转换成功后删除原文件
-                        results["success"] += 1
-                        results["details"].append(f"格式转换: {f}  ➡️  {new_name}")
-                    else:
-                        results["failed"] += 1
-                        results["details"].append(f"失败: {f}  ➡️  {new_name}  (图像解码失败)")
-                except Exception as e:
-                    results["failed"] += 1
-                    results["details"].append(f"失败: {f}  ➡️  {new_name}  ({str(e)})")
+                if os.path.exists(new_path):
+                    results["skipped"] += 1
+                    results["details"].append(f"跳过: {f}  ➡️  {new_name}  (目标已存在)")
+                    continue
+                tasks.append((old_path, new_path, f, new_name))
 
             if not recursive:
                 break
 
+        # 读取、解码编码、写入分阶段并行；按顺序写入，明细与预览一致
+        def write(task, data):
+            old_path, new_path, f, new_name = task
+            write_bytes(new_path, data)
+            os.remove(old_path)  # 转换成功后删除原文件
+            results["details"].append(f"格式转换: {f}  ➡️  {new_name}")
+
+        out_ext = f".{self.output_ext.lower()}"
+        pipeline = Pipeline(read=lambda task: read_bytes(task[0]),
+                            process=partial(encode_for_extension, out_ext=out_ext),
+                            write=write,
+                            workers=self.config.get('pipeline_workers'),
+                            ordered=True)
+        run = pipeline.run(tasks)
+        results["success"] += len(run.outputs)
+        for (_, _, f, new_name), error in run.failures:
+            results["failed"] += 1
+            results["details"].append(f"失败: {f}  ➡️  {new_name}  (图像解码失败: {error})")
+
         return results
 
     def preview(self, folder_path: str, recursive: bool = True) -> List[str]:
@@ -57,31 +57,33 @@ class PhotoExtensionRenamer(PhotoBatchProcessor):
         results = {'success': [], 'failure': []}
         
         files = self.scan_photos(folder_path, [from_ext], recursive)
+        moves = []
         
         for file_path in files:
-            try:
-                directory = os.path.dirname(file_path)
-                filename = os.path.basename(file_path)
-                
-                name_without_ext = os.path.splitext(filename)[0]
-                file_ext = os.path.splitext(filename)[1].lower()
+            directory = os.path.dirname(file_path)
+            filename = os.path.basename(file_path)
+            
+            name_without_ext = os.path.splitext(filename)[0]
+            file_ext = os.path.splitext(filename)[1].lower()
+            
+            if file_ext == from_ext:
+                new_filename = name_without_ext + to_ext
+                new_path = os.path.join(directory, new_filename)
                 
-                if file_ext == from_ext:
-                    new_filename = name_without_ext + to_ext
-                    new_path = os.path.join(directory, new_filename)
-                    
-                    if os.path.exists(new_path):
-                        self.logger.warning(f"目标已存在，跳过: {new_filename}")
-                        results['failure'].append(file_path)
-                        continue
-                    
-                    os.rename(file_path, new_path)
-                    self.logger.info(f"已重命名: {filename} -> {new_filename}")
-                    results['success'].append(file_path)
-                    
-            except Exception as e:
-                self.logger.error(f"重命名失败 {file_path}: {e}")
-                results['failure'].append(file_path)
+                # 仅大小写不同时在不区分大小写的文件系统上 exists 也为真，不算冲突
+                if new_path != file_path and os.path.exists(new_path) \
+                        and not os.path.samefile(file_path, new_path):
+                    self.logger.warning(f"目标已存在，跳过: {new_filename}")
+                    results['failure'].append(file_path)
+                    continue
+                moves.append((file_path, new_path))
+        
+        # 通过重命名日志执行，失败可回滚，中断后可恢复
+        renamed = self.rename_with_journal(folder_path, moves)
+        for file_path, new_path in renamed['success']:
+            self.logger.info(f"已重命名: {os.path.basename(file_path)} -> {os.path.basename(new_path)}")
+            results['success'].append(file_path)
+        results['failure'].extend(renamed['failure'])
                 
         self.logger.info(f"完成: {len(results['success'])} 个文件已重命名")
         return results
@@ -6,14 +6,46 @@
 基于Tool文件夹中的jpg2png.py和png2grey.py脚本。
 """
 
+import io
 import os
+from functools import partial
 from typing import Optional, List, Dict, Any
 
 from PIL import Image
 
+from ..base.pipeline import Pipeline, read_bytes, write_bytes
 from .photo_processor import PhotoBatchProcessor
 
 
+def convert_image_bytes(data: bytes, pil_format: str, save_kwargs: Dict[str, Any]) -> bytes:
+    """
+    解码图像、处理透明通道并编码为目标格式（在流水线的计算进程中运行）。
+    
+    参数:
+        data: 源文件内容
+        pil_format: 目标格式（PIL名称）
+        save_kwargs: 保存参数
+        
+    返回:
+        编码后的文件内容
+    """
+    with Image.open(io.BytesIO(data)) as img:
+        # 处理JPEG的RGBA到RGB
+        if pil_format == 'JPEG' and img.mode in ('RGBA', 'LA'):
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            if img.mode == 'RGBA':
+                background.paste(img, mask=img.split()[3])
+            else:
+                background.paste(img, mask=img.split()[1])
+            img = background
+        elif img.mode == 'P':
+            img = img.convert('RGBA')
+        
+        output = io.BytesIO()
+        img.save(output, pil_format, **save_kwargs)
+        return output.getvalue()
+
+
 class PhotoFormatConverter(PhotoBatchProcessor):
     """
     在不同照片格式之间转换照片文件。
@@ -76,60 +108,46 @@ class PhotoFormatConverter(PhotoBatchProcessor):
         target_extension = target_format_info['extensions'][0]
         pil_format = target_format_info['pil_format']
         
-        results = {'success': [], 'failure': []}
+        # 带质量保存
+        save_kwargs = {}
+        if pil_format in ('JPEG', 'WEBP'):
+            save_kwargs['quality'] = quality
+        elif pil_format == 'PNG':
+            save_kwargs['compress_level'] = 6
         
-        # 获取源文件
+        # 获取源文件并确定输出路径
         files = self.scan_files(folder_path, source_extensions, recursive)
-        
+        tasks = []
         for file_path in files:
-            try:
-                directory = os.path.dirname(file_path)
-                filename = os.path.basename(file_path)
-                name_without_ext = os.path.splitext(filename)[0]
-                
-                # 确定输出路径
-                if output_folder:
-                    rel_path = os.path.relpath(file_path, folder_path)
-                    out_dir = os.path.dirname(rel_path)
-                    if out_dir and out_dir != '.':
-                        out_path = os.path.join(output_folder, out_dir)
-                        os.makedirs(out_path, exist_ok=True)
-                    else:
-                        out_path = output_folder
-                    new_filename = name_without_ext + target_extension
-                    out_file = os.path.join(out_path, new_filename)
-                else:
-                    # 就地转换
-                    out_file = os.path.join(directory, name_without_ext + target_extension)
-                
-                # 转换图像
-                with Image.open(file_path) as img:
-                    # 处理JPEG的RGBA到RGB
-                    if pil_format == 'JPEG' and img.mode in ('RGBA', 'LA'):
-                        background = Image.new('RGB', img.size, (255, 255, 255))
-                        if img.mode == 'RGBA':
-                            background.paste(img, mask=img.split()[3])
-                        else:
-                            background.paste(img, mask=img.split()[1])
-                        img = background
-                    elif img.mode == 'P':
-                        img = img.convert('RGBA')
-                    
-                    # 带质量保存
-                    save_kwargs = {}
-                    if pil_format in ('JPEG', 'WEBP'):
-                        save_kwargs['quality'] = quality
-                    elif pil_format == 'PNG':
-                        save_kwargs['compress_level'] = 6
-                    
-                    img.save(out_file, pil_format, **save_kwargs)
-                    self.logger.info(f"已转换: {filename} -> {os.path.basename(out_file)}")
-                    results['success'].append((file_path, out_file))
-                    
-            except Exception as e:
-                self.logger.error(f"转换失败 {file_path}: {e}")
-                results['failure'].append(file_path)
-                
+            directory = os.path.dirname(file_path)
+            name_without_ext = os.path.splitext(os.path.basename(file_path))[0]
+            if output_folder:
+                rel_dir = os.path.dirname(os.path.relpath(file_path, folder_path))
+                out_path = os.path.join(output_folder, rel_dir) if rel_dir and rel_dir != '.' else output_folder
+                out_file = os.path.join(out_path, name_without_ext + target_extension)
+            else:
+                # 就地转换
+                out_file = os.path.join(directory, name_without_ext + target_extension)
+            tasks.append((file_path, out_file))
+        
+        # 读取、转换、写入分阶段并行
+        def write(task, data):
+            write_bytes(task[1], data)
+            self.logger.info(f"已转换: {os.path.basename(task[0])} -> {os.path.basename(task[1])}")
+            return task[1]
+        
+        pipeline = Pipeline(read=lambda task: read_bytes(task[0]),
+                            process=partial(convert_image_bytes, pil_format=pil_format, save_kwargs=save_kwargs),
+                            write=write,
+                            workers=self.config.get('pipeline_workers'))
+        run = pipeline.run(tasks)
+        
+        results = {'success': [(task[0], out_file) for task, out_file in run.outputs],
+                   'failure': []}
+        for task, error in run.failures:
+            self.logger.error(f"转换失败 {task[0]}: {error}")
+            results['failure'].append(task[0])
+        
         self.logger.info(f"完成: {len(results['success'])}/{len(files)} 个文件已转换")
         return results
     
@@ -6,14 +6,42 @@
 基于Tool文件夹中的png2grey.py脚本。
 """
 
+import io
 import os
+from functools import partial
 from typing import Optional, Dict, Any
 
 from PIL import Image
 
+from ..base.pipeline import Pipeline, read_bytes, write_bytes
 from .photo_processor import PhotoBatchProcessor
 
 
+def grayscale_image_bytes(data: bytes, preserve_alpha: bool = False) -> bytes:
+    """
+    解码图像、转换为灰度并按原格式编码（在流水线的计算进程中运行）。
+    
+    参数:
+        data: 源文件内容
+        preserve_alpha: 是否保留alpha通道
+        
+    返回:
+        编码后的文件内容
+    """
+    with Image.open(io.BytesIO(data)) as img:
+        image_format = img.format
+        # 转换为灰度图
+        if preserve_alpha and img.mode == 'RGBA':
+            # 保留alpha转换为灰度
+            gray_img = img.convert('LA').convert('RGBA')
+        else:
+            gray_img = img.convert('L')
+        
+        output = io.BytesIO()
+        gray_img.save(output, image_format)
+        return output.getvalue()
+
+
 class PhotoGrayscaleConverter(PhotoBatchProcessor):
     """
     将照片转换为灰度图。
@@ -54,49 +82,37 @@ class PhotoGrayscaleConverter(PhotoBatchProcessor):
         if extensions is None:
             extensions = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp']
         
-        results = {'success': [], 'failure': []}
-        
         files = self.scan_files(folder_path, extensions, recursive)
         
+        # 确定输出路径
+        tasks = []
         for file_path in files:
-            try:
-                directory = os.path.dirname(file_path)
-                filename = os.path.basename(file_path)
-                name_without_ext = os.path.splitext(filename)[0]
-                
-                # 确定输出路径
-                if output_folder:
-                    rel_path = os.path.relpath(file_path, folder_path)
-                    out_dir = os.path.dirname(rel_path)
-                    if out_dir and out_dir != '.':
-                        out_path = os.path.join(output_folder, out_dir)
-                        os.makedirs(out_path, exist_ok=True)
-                    else:
-                        out_path = output_folder
-                    out_file = os.path.join(out_path, filename)
-                else:
-                    # 就地转换
-                    out_file = file_path
-                
-                # 打开并转换
-                with Image.open(file_path) as img:
-                    # 转换为灰度图
-                    if preserve_alpha and img.mode == 'RGBA':
-                        # 保留alpha转换为灰度
-                        gray_img = img.convert('LA').convert('RGBA')
-                    else:
-                        gray_img = img.convert('L')
-                    
-                    # 保存
-                    gray_img.save(out_file)
-                    
-                    self.logger.info(f"已转换为灰度图: {filename}")
-                    results['success'].append(file_path)
-                    
-            except Exception as e:
-                self.logger.error(f"转换失败 {file_path}: {e}")
-                results['failure'].append(file_path)
-                
+            if output_folder:
+                rel_dir = os.path.dirname(os.path.relpath(file_path, folder_path))
+                out_path = os.path.join(output_folder, rel_dir) if rel_dir and rel_dir != '.' else output_folder
+                out_file = os.path.join(out_path, os.path.basename(file_path))
+            else:
+                # 就地转换
+                out_file = file_path
+            tasks.append((file_path, out_file))
+        
+        # 读取、转换、写入分阶段并行
+        def write(task, data):
+            write_bytes(task[1], data)
+            self.logger.info(f"已转换为灰度图: {os.path.basename(task[0])}")
+            return task[0]
+        
+        pipeline = Pipeline(read=lambda task: read_bytes(task[0]),
+                            process=partial(grayscale_image_bytes, preserve_alpha=preserve_alpha),
+                            write=write,
+                            workers=self.config.get('pipeline_workers'))
+        run = pipeline.run(tasks)
+        
+        results = {'success': [file_path for _, file_path in run.outputs], 'failure': []}
+        for task, error in run.failures:
+            self.logger.error(f"转换失败 {task[0]}: {error}")
+            results['failure'].append(task[0])
+        
         self.logger.info(f"完成: {len(results['success'])}/{len(files)} 个文件已转换")
         return results
     
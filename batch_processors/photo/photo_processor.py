@@ -9,6 +9,8 @@
 import os
 from typing import Optional, List, Dict, Any
 
+from core.engine.exif_reader import PhotoMetadata, read_dimensions, read_photo_metadata
+from core.engine.raw_preview import extract_preview
 from ..base.base_processor import BaseBatchProcessor
 
 
@@ -72,6 +74,29 @@ class PhotoBatchProcessor(BaseBatchProcessor):
         raw_extensions = ['.arw', '.nef', '.dng', '.raf', '.raw', '.rw2', '.orf', '.cr2', '.cr3']
         return self.scan_files(folder_path, raw_extensions, recursive)
     
+    def extract_raw_preview(self, raw_path: str, output_path: str) -> bool:
+        """
+        把RAW文件内嵌的JPEG预览原样写出（不解马赛克、不重新编码）。
+        
+        参数:
+            raw_path: RAW文件路径
+            output_path: 输出JPEG路径
+            
+        返回:
+            是否成功
+        """
+        preview = extract_preview(raw_path)
+        if preview is None:
+            self.logger.warning(f"未找到内嵌预览: {raw_path}")
+            return False
+        try:
+            with preview:
+                preview.save(output_path)
+            return True
+        except Exception as e:
+            self.logger.error(f"写出预览失败 {raw_path}: {e}")
+            return False
+    
     def scan_jpeg_photos(self, folder_path: str, recursive: bool = True) -> List[str]:
         """
         扫描文件夹中的JPEG文件。
@@ -100,20 +125,57 @@ class PhotoBatchProcessor(BaseBatchProcessor):
             return None
             
         try:
-            return {
+            info = {
                 'path': photo_path,
                 'name': os.path.basename(photo_path),
                 'size': os.path.getsize(photo_path),
                 'ext': os.path.splitext(photo_path)[1],
                 'modified': os.path.getmtime(photo_path)
             }
+            # 只读文件头，不解码像素
+            meta = read_photo_metadata(photo_path)
+            if meta is not None:
+                info.update({
+                    'width': meta.width,
+                    'height': meta.height,
+                    'orientation': meta.orientation,
+                    'capture_time': meta.capture_time,
+                    'camera_make': meta.camera_make,
+                    'camera_model': meta.camera_model
+                })
+            return info
         except Exception as e:
             self.logger.error(f"获取照片信息失败: {e}")
             return None
     
+    def scan_photo_metadata(self, 
+                            folder_path: str, 
+                            recursive: bool = True,
+                            index=None) -> Dict[str, PhotoMetadata]:
+        """
+        批量读取文件夹中照片的元数据（拍摄时间、相机、尺寸、方向）。
+        
+        结果缓存在照片元数据索引中，再次扫描时只读取新增或变化的文件。
+        
+        参数:
+            folder_path: 要扫描的文件夹
+            recursive: 是否递归扫描
+            index: 可选的PhotoMetadataIndex实例，默认使用共享索引
+            
+        返回:
+            {绝对路径: 元数据} 字典
+        """
+        from core.services.photo_index import PhotoMetadataIndex
+        
+        photos = self.scan_photos(folder_path, recursive=recursive)
+        if index is not None:
+            return index.scan(photos)
+        with PhotoMetadataIndex() as shared_index:
+            return shared_index.scan(photos)
+    
     def get_dimension(self, photo_path: str) -> Optional[tuple]:
         """
-        使用PIL获取照片尺寸。
+        获取照片尺寸：JPEG/TIFF系文件只读文件头，其他格式使用PIL。
         
         参数:
             photo_path: 照片文件路径
@@ -121,6 +183,9 @@ class PhotoBatchProcessor(BaseBatchProcessor):
         返回:
             (宽度, 高度)元组或None
         """
+        size = read_dimensions(photo_path)
+        if size is not None:
+            return size
         try:
             from PIL import Image
             with Image.open(photo_path) as img:
@@ -102,22 +102,22 @@ class VideoExtensionRenamer(VideoBatchProcessor):
             return {'success': [], 'failure': []}
             
         results = {'success': [], 'failure': []}
+        moves = []
         
         for root, _, files in os.walk(folder_path) if recursive else [(folder_path, [], os.listdir(folder_path))]:
             for filename in files:
-                file_path = os.path.join(root, filename)
                 name, ext = os.path.splitext(filename)
-                
                 if ext and ext != ext.upper():
-                    new_path = os.path.join(root, name + ext.upper())
-                    
-                    try:
-                        os.rename(file_path, new_path)
-                        self.logger.info(f"已改为大写: {filename} -> {name + ext.upper()}")
-                        results['success'].append(file_path)
-                    except Exception as e:
-                        self.logger.error(f"失败: {filename}: {e}")
-                        results['failure'].append(file_path)
+                    moves.append((os.path.join(root, filename), os.path.join(root, name + ext.upper())))
+        
+        # 通过重命名日志执行（仅大小写改名经临时名称完成），失败可回滚，中断后可恢复
+        renamed = self.rename_with_journal(folder_path, moves)
+        for file_path, new_path in renamed['success']:
+            self.logger.info(f"已改为大写: {os.path.basename(file_path)} -> {os.path.basename(new_path)}")
+            results['success'].append(file_path)
+        for file_path in renamed['failure']:
+            self.logger.error(f"失败: {os.path.basename(file_path)}")
+            results['failure'].append(file_path)
                         
         return results
     
@@ -7,8 +7,10 @@
 """
 
 import os
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, List, Dict, Any
 
+from core.engine.media_probe import probe_video
 from ..base.base_processor import BaseBatchProcessor
 
 
@@ -36,6 +38,8 @@ class VideoBatchProcessor(BaseBatchProcessor):
             config: 可选的配置字典
         """
         super().__init__(config)
+        # 并行探测视频信息的线程数
+        self.max_workers = config.get('max_workers', 8) if config else 8
         
     def scan_videos(self, 
                     folder_path: str, 
@@ -87,7 +91,9 @@ class VideoBatchProcessor(BaseBatchProcessor):
                           min_width: Optional[int] = None,
                           min_height: Optional[int] = None) -> List[str]:
         """
-        按分辨率筛选视频（需要ffprobe）。
+        按分辨率筛选视频。
+        
+        MP4/MOV直接解析moov盒子，其他容器回退到ffprobe；元数据读取在线程池中并行进行。
         
         参数:
             folder_path: 要扫描的文件夹
@@ -97,34 +103,24 @@ class VideoBatchProcessor(BaseBatchProcessor):
         返回:
             符合条件的视频文件路径列表
         """
-        import subprocess
-        import json
-        
         videos = self.scan_videos(folder_path)
         filtered = []
         
-        for video_path in videos:
+        def probe(video_path):
             try:
-                cmd = ['ffprobe', '-v', 'quiet', '-print_format', 'json', 
-                      '-show_streams', video_path]
-                result = subprocess.run(cmd, capture_output=True, text=True, 
-                                     encoding='utf-8', errors='ignore')
-                
-                if result.returncode == 0:
-                    info = json.loads(result.stdout)
-                    for stream in info.get('streams', []):
-                        if stream.get('codec_type') == 'video':
-                            width = stream.get('width', 0)
-                            height = stream.get('height', 0)
-                            
-                            if min_width and width < min_width:
-                                break
-                            if min_height and height < min_height:
-                                break
-                            else:
-                                filtered.append(video_path)
-                            break
+                return probe_video(video_path)
             except Exception as e:
                 self.logger.warning(f"无法检查分辨率 {video_path}: {e}")
+                return None
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for video_path, info in zip(videos, executor.map(probe, videos)):
+                if info is None:
+                    continue
+                if min_width and info.width < min_width:
+                    continue
+                if min_height and info.height < min_height:
+                    continue
+                filtered.append(video_path)
                 
         return filtered
\ No newline at end of file
@@ -7,6 +7,8 @@ import numpy as np
 import ffmpeg
 import logging
 
+from core.engine.luma_decoder import probe_video_size
+
 
 class EncodeResult:
     """编码结果"""
@@ -72,18 +74,38 @@ class CodecEngine:
             self.logger.error(f"视频压缩失败: {str(e)}")
             return EncodeResult(success=False, message=str(e))
     
-    def extract_frames(self, video_path: str, interval: float = 1.0) -> List[np.ndarray]:
-        """提取视频帧用于预览"""
+    def extract_frames(self, video_path: str, interval: float = 1.0,
+                       proxy_manager=None) -> List[np.ndarray]:
+        """
+        提取视频帧用于预览
+        
+        Args:
+            video_path: 视频路径
+            interval: 抽帧间隔（秒）
+            proxy_manager: 可选的代理管理器，提供时优先从低分辨率代理抽帧
+        
+        Returns:
+            RGB帧列表
+        """
         frames = []
         try:
-            # 计算每隔interval秒提取一帧
-            stream = ffmpeg.input(video_path, ss=0)
-            stream = ffmpeg.filter(stream, 'select', f'not(mod(n,{int(interval * 30)}))')  # 假设30fps
+            if proxy_manager is not None:
+                video_path = proxy_manager.resolve(video_path)
+            
+            size = probe_video_size(video_path)
+            if size is None:
+                raise ValueError(f"无法获取视频尺寸: {video_path}")
+            width, height = size
+            
+            # 按时间间隔抽帧，不依赖固定帧率
+            stream = ffmpeg.input(video_path)
+            stream = ffmpeg.filter(stream, 'fps', fps=1.0 / interval)
             stream = ffmpeg.output(stream, 'pipe:', format='rawvideo', pix_fmt='rgb24')
             
             out, _ = ffmpeg.run(stream, capture_stdout=True, quiet=True)
-            # 这里简化处理，实际需要根据视频尺寸解析RGB数据
-            # 实际实现需要知道视频尺寸等信息
+            frame_count = len(out) // (width * height * 3)
+            data = np.frombuffer(out, dtype=np.uint8, count=frame_count * width * height * 3)
+            frames = list(data.reshape(frame_count, height, width, 3))
             
         except Exception as e:
             self.logger.error(f"提取视频帧失败: {str(e)}")
@@ -0,0 +1,302 @@
+"""
+照片元数据（EXIF/文件头）读取
+
+直接解析 JPEG 的 APP1/SOF 段和 TIFF 系容器（TIFF/DNG/NEF/ARW/CR2/ORF/RW2）的 IFD，
+只做有限长度的读取，不解码像素。
+"""
+import logging
+import os
+import struct
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+# 首次读取的字节数；IFD和SOF通常都在这个范围内，超出部分再按需读取
+HEAD_SIZE = 16 * 1024
+
+# TIFF 数据类型 -> (单个值字节数, struct格式)
+TIFF_TYPES = {
+    1: (1, 'B'), 2: (1, 's'), 3: (2, 'H'), 4: (4, 'I'), 5: (8, 'II'),
+    6: (1, 'b'), 7: (1, 'B'), 8: (2, 'h'), 9: (4, 'i'), 10: (8, 'ii'),
+    11: (4, 'f'), 12: (8, 'd'), 13: (4, 'I'),
+}
+
+# 常用标签
+TAG_NEW_SUBFILE_TYPE = 0x00FE
+TAG_IMAGE_WIDTH = 0x0100
+TAG_IMAGE_LENGTH = 0x0101
+TAG_COMPRESSION = 0x0103
+TAG_MAKE = 0x010F
+TAG_MODEL = 0x0110
+TAG_STRIP_OFFSETS = 0x0111
+TAG_ORIENTATION = 0x0112
+TAG_STRIP_BYTE_COUNTS = 0x0117
+TAG_DATETIME = 0x0132
+TAG_SUB_IFDS = 0x014A
+TAG_JPEG_OFFSET = 0x0201
+TAG_JPEG_LENGTH = 0x0202
+TAG_EXIF_IFD = 0x8769
+TAG_DATETIME_ORIGINAL = 0x9003
+TAG_DATETIME_DIGITIZED = 0x9004
+TAG_SUBSEC_ORIGINAL = 0x9291
+TAG_PIXEL_X = 0xA002
+TAG_PIXEL_Y = 0xA003
+
+# TIFF 系文件头：标准 TIFF、ORF、RW2
+TIFF_MAGICS = (b'II*\x00', b'MM\x00*', b'IIRO', b'IIRS', b'MMOR', b'IIU\x00')
+
+# JPEG 中带尺寸信息的 SOF 标记
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+@dataclass
+class PhotoMetadata:
+    """照片元数据"""
+    width: Optional[int] = None                 # 存储宽度
+    height: Optional[int] = None                # 存储高度
+    orientation: int = 1                        # EXIF方向（1-8）
+    capture_time: Optional[datetime] = None     # 拍摄时间（相机本地时间）
+    camera_make: str = ""                       # 相机厂商
+    camera_model: str = ""                      # 相机型号
+
+    @property
+    def display_size(self) -> Optional[Tuple[int, int]]:
+        """按方向旋转后的显示尺寸"""
+        if not self.width or not self.height:
+            return None
+        if self.orientation in (5, 6, 7, 8):
+            return self.height, self.width
+        return self.width, self.height
+
+
+class TiffParser:
+    """
+    TIFF IFD 解析器
+
+    数据通过 read_at(偏移, 长度) 获取，可以来自有限读取的文件窗口、
+    内存中的 APP1 段或 mmap；base 为 TIFF 头在数据源中的偏移。
+    """
+
+    def __init__(self, read_at: Callable[[int, int], bytes], base: int = 0):
+        self.read_at = read_at
+        self.base = base
+        header = read_at(base, 8)
+        if len(header) < 8:
+            raise ValueError("TIFF头不完整")
+        self.endian = '<' if header[:2] == b'II' else '>'
+        self.first_ifd = struct.unpack(self.endian + 'I', header[4:8])[0]
+
+    def read_ifd(self, offset: int) -> Tuple[Dict[int, tuple], int]:
+        """
+        读取一个IFD
+
+        Returns:
+            ({标签: (类型, 数量, 值字段字节)}, 下一个IFD偏移)
+        """
+        count_bytes = self.read_at(self.base + offset, 2)
+        if len(count_bytes) < 2:
+            return {}, 0
+        count = struct.unpack(self.endian + 'H', count_bytes)[0]
+        data = self.read_at(self.base + offset + 2, count * 12 + 4)
+        count = min(count, len(data) // 12)
+        entries = {}
+        for i in range(count):
+            tag, typ, n = struct.unpack_from(self.endian + 'HHI', data, i * 12)
+            entries[tag] = (typ, n, data[i * 12 + 8:i * 12 + 12])
+        next_ifd = 0
+        if len(data) >= count * 12 + 4:
+            next_ifd = struct.unpack_from(self.endian + 'I', data, count * 12)[0]
+        return entries, next_ifd
+
+    def value(self, entry: tuple):
+        """解析标签值：单个数值返回标量，多个返回列表，ASCII返回字符串"""
+        typ, count, field = entry
+        if typ not in TIFF_TYPES or count == 0:
+            return None
+        size, fmt = TIFF_TYPES[typ]
+        total = size * count
+        if total <= 4:
+            raw = field[:total]
+        else:
+            raw = self.read_at(self.base + struct.unpack(self.endian + 'I', field)[0], total)
+            if len(raw) < total:
+                return None
+        if typ == 2:
+            return raw.split(b'\x00', 1)[0].decode('utf-8', errors='ignore').strip()
+        if typ == 7:
+            return raw
+        values = struct.unpack(f"{self.endian}{count * len(fmt)}{fmt[0]}", raw)
+        if typ in (5, 10):
+            values = [num / den if den else 0.0 for num, den in zip(values[::2], values[1::2])]
+        return values[0] if count == 1 else list(values)
+
+    def get(self, entries: Dict[int, tuple], tag: int, default=None):
+        """读取IFD中某个标签的值，不存在时返回default"""
+        entry = entries.get(tag)
+        if entry is None:
+            return default
+        result = self.value(entry)
+        return default if result is None else result
+
+    def values(self, entry: Optional[tuple]) -> List:
+        """总是以列表形式返回数值"""
+        if entry is None:
+            return []
+        result = self.value(entry)
+        if result is None:
+            return []
+        return result if isinstance(result, list) else [result]
+
+    def iter_ifds(self, max_ifds: int = 32):
+        """遍历 IFD0 链及其 SubIFD，返回 (偏移, 标签字典)"""
+        pending = [self.first_ifd]
+        seen = set()
+        while pending and len(seen) < max_ifds:
+            offset = pending.pop(0)
+            if not offset or offset in seen:
+                continue
+            seen.add(offset)
+            entries, next_ifd = self.read_ifd(offset)
+            yield offset, entries
+            pending.extend(self.values(entries.get(TAG_SUB_IFDS)))
+            pending.append(next_ifd)
+
+
+class _FileWindow:
+    """带首块缓存的有限读取：首块之内直接切片，之外按需 seek"""
+
+    def __init__(self, f, head: bytes):
+        self.f = f
+        self.head = head
+
+    def read_at(self, offset: int, size: int) -> bytes:
+        if offset + size <= len(self.head):
+            return self.head[offset:offset + size]
+        self.f.seek(offset)
+        return self.f.read(size)
+
+
+def _parse_datetime(value) -> Optional[datetime]:
+    if not isinstance(value, str) or not value.strip():
+        return None
+    try:
+        return datetime.strptime(value.strip()[:19], "%Y:%m:%d %H:%M:%S")
+    except ValueError:
+        return None
+
+
+def _fill_from_tiff(parser: TiffParser, meta: PhotoMetadata, raw_container: bool):
+    """从 IFD0 / EXIF IFD（RAW还包括SubIFD）中提取元数据"""
+    ifd0, _ = parser.read_ifd(parser.first_ifd)
+    meta.camera_make = parser.get(ifd0, TAG_MAKE, "")
+    meta.camera_model = parser.get(ifd0, TAG_MODEL, "")
+    meta.orientation = parser.get(ifd0, TAG_ORIENTATION, 1)
+    capture = _parse_datetime(parser.get(ifd0, TAG_DATETIME))
+
+    exif_offset = parser.get(ifd0, TAG_EXIF_IFD)
+    if exif_offset:
+        exif, _ = parser.read_ifd(exif_offset)
+        original = _parse_datetime(parser.get(exif, TAG_DATETIME_ORIGINAL))
+        if original:
+            subsec = parser.get(exif, TAG_SUBSEC_ORIGINAL)
+            if isinstance(subsec, str) and subsec.isdigit():
+                original = original.replace(microsecond=int(subsec[:6].ljust(6, '0')))
+        capture = original or _parse_datetime(parser.get(exif, TAG_DATETIME_DIGITIZED)) or capture
+        if TAG_PIXEL_X in exif and TAG_PIXEL_Y in exif:
+            meta.width = parser.get(exif, TAG_PIXEL_X)
+            meta.height = parser.get(exif, TAG_PIXEL_Y)
+    meta.capture_time = capture
+
+    if raw_container:
+        # RAW/TIFF：取所有IFD中最大的图像（IFD0常常只是缩略图）
+        best = 0
+        for _, entries in parser.iter_ifds():
+            w = parser.get(entries, TAG_IMAGE_WIDTH, 0)
+            h = parser.get(entries, TAG_IMAGE_LENGTH, 0)
+            if isinstance(w, int) and isinstance(h, int) and w * h > best:
+                best = w * h
+                meta.width, meta.height = w, h
+
+
+def _read_jpeg(f, head: bytes) -> Optional[PhotoMetadata]:
+    """逐段扫描JPEG：解析APP1中的EXIF和SOF中的尺寸，遇到SOS即停止"""
+    window = _FileWindow(f, head)
+    meta = PhotoMetadata()
+    offset = 2
+    found_sof = False
+    while True:
+        marker = window.read_at(offset, 4)
+        if len(marker) < 4 or marker[0] != 0xFF:
+            break
+        code = marker[1]
+        if code == 0xFF:           # 填充字节
+            offset += 1
+            continue
+        if code in (0xD8, 0x01) or 0xD0 <= code <= 0xD7:
+            offset += 2
+            continue
+        if code in (0xD9, 0xDA):   # EOI / SOS：之后是压缩数据
+            break
+        length = struct.unpack('>H', marker[2:4])[0]
+        if code == 0xE1:
+            ident = window.read_at(offset + 4, 6)
+            if ident == b'Exif\x00\x00':
+                # 直接在文件窗口上解析，不读取APP1中嵌入的缩略图数据
+                try:
+                    parser = TiffParser(window.read_at, base=offset + 10)
+                    _fill_from_tiff(parser, meta, raw_container=False)
+                except (ValueError, struct.error) as e:
+                    logger.debug(f"EXIF解析失败: {e}")
+        elif code in _SOF_MARKERS and not found_sof:
+            sof = window.read_at(offset + 4, 5)
+            if len(sof) == 5:
+                height, width = struct.unpack('>HH', sof[1:5])
+                # SOF尺寸就是实际像素尺寸，优先于EXIF中的PixelX/YDimension
+                meta.width, meta.height = width, height
+                found_sof = True
+        offset += 2 + length
+    return meta
+
+
+def read_photo_metadata(photo_path: str) -> Optional[PhotoMetadata]:
+    """
+    读取照片元数据
+
+    Args:
+        photo_path: 照片路径（JPEG或TIFF系RAW）
+
+    Returns:
+        元数据；不支持的格式或读取失败时返回None
+    """
+    try:
+        with open(photo_path, 'rb') as f:
+            head = f.read(HEAD_SIZE)
+            if head[:2] == b'\xff\xd8':
+                return _read_jpeg(f, head)
+            if head[:4] in TIFF_MAGICS:
+                window = _FileWindow(f, head)
+                parser = TiffParser(window.read_at)
+                meta = PhotoMetadata()
+                _fill_from_tiff(parser, meta, raw_container=True)
+                return meta
+    except (OSError, ValueError, struct.error) as e:
+        logger.debug(f"读取照片元数据失败 {photo_path}: {e}")
+    return None
+
+
+def read_dimensions(photo_path: str) -> Optional[Tuple[int, int]]:
+    """只读文件头获取 (宽, 高)，失败时返回None"""
+    meta = read_photo_metadata(photo_path)
+    if meta and meta.width and meta.height:
+        return meta.width, meta.height
+    return None
+
+
+def is_supported(photo_path: str) -> bool:
+    """根据扩展名判断是否可能被 read_photo_metadata 解析"""
+    return os.path.splitext(photo_path)[1].lower() in (
+        '.jpg', '.jpeg', '.tif', '.tiff', '.dng', '.nef', '.nrw', '.arw',
+        '.cr2', '.orf', '.rw2', '.pef', '.srw')
@@ -0,0 +1,68 @@
+"""
+感知哈希（dHash / pHash）
+
+从低分辨率解码计算64位哈希：JPEG用 draft 模式直接按DCT缩放解码，
+RAW使用内嵌预览，不做完整分辨率解码。
+"""
+import logging
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from core.engine.raw_preview import is_raw_file, load_preview_image
+
+
+logger = logging.getLogger(__name__)
+
+HASH_BITS = 64
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """两个哈希之间的汉明距离"""
+    return (a ^ b).bit_count()
+
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), 'big')
+
+
+def dhash(gray: np.ndarray) -> int:
+    """差值哈希：9x8灰度图相邻像素比较"""
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    return _bits_to_int(small[:, 1:] > small[:, :-1])
+
+
+def phash(gray: np.ndarray) -> int:
+    """DCT哈希：32x32灰度图的低频8x8系数与中位数比较"""
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8]
+    # 中位数不含直流分量，避免整体亮度主导阈值
+    return _bits_to_int(low > np.median(low.ravel()[1:]))
+
+
+def load_gray(image_path: str, size: int = 64) -> Optional[np.ndarray]:
+    """以接近 size 的分辨率解码为灰度图"""
+    if is_raw_file(image_path):
+        image = load_preview_image(image_path, max_size=size)
+        return np.asarray(image.convert('L')) if image is not None else None
+    with Image.open(image_path) as image:
+        image.draft('L', (size, size))
+        return np.asarray(image.convert('L'))
+
+
+def compute_hashes(image_path: str) -> Optional[Tuple[int, int]]:
+    """
+    计算图像的 (dHash, pHash)
+
+    作为进程池任务使用，异常在内部处理。
+    """
+    try:
+        gray = load_gray(image_path)
+        if gray is None or gray.size == 0:
+            return None
+        return dhash(gray), phash(gray)
+    except Exception as e:
+        logger.debug(f"计算感知哈希失败 {image_path}: {e}")
+        return None
@@ -0,0 +1,143 @@
+"""
+亮度(Y)帧解码器
+
+通过FFmpeg以 gray 像素格式输出原始帧到管道，只传输亮度平面，
+帧数据直接读入预分配的NumPy环形缓冲区，供PSNR-Y/SSIM-Y等指标使用。
+"""
+import logging
+import queue
+import subprocess
+import threading
+from typing import Iterator, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from core.engine.media_probe import probe_video
+
+
+def probe_video_size(video_path: str) -> Optional[Tuple[int, int]]:
+    """获取FFmpeg解码输出的分辨率（宽，高），已考虑旋转"""
+    info = probe_video(video_path)
+    if info is not None and info.width and info.height:
+        return info.display_size
+    cap = cv2.VideoCapture(video_path)
+    try:
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        return (width, height) if width > 0 and height > 0 else None
+    finally:
+        cap.release()
+
+
+class LumaFrameReader:
+    """
+    FFmpeg亮度帧读取器
+
+    后台线程把帧读入环形缓冲区，迭代时返回缓冲区中的视图（不复制）。
+    返回的帧在下一次迭代前有效，需要保留时请自行复制。
+
+    用法:
+        with LumaFrameReader(path, size=(960, 540)) as reader:
+            for y in reader:
+                ...
+    """
+
+    def __init__(self,
+                 video_path: str,
+                 size: Optional[Tuple[int, int]] = None,
+                 ring_size: int = 8):
+        """
+        Args:
+            video_path: 视频路径
+            size: 输出分辨率（宽，高），None表示原始分辨率
+            ring_size: 环形缓冲区帧数，决定解码可以领先计算多少帧
+        """
+        self.logger = logging.getLogger(__name__)
+        self.video_path = video_path
+        self.size = size or probe_video_size(video_path)
+        if self.size is None:
+            raise ValueError(f"无法获取视频尺寸: {video_path}")
+
+        width, height = self.size
+        self.ring = np.empty((max(2, ring_size), height, width), dtype=np.uint8)
+        self._free: "queue.Queue[int]" = queue.Queue()
+        self._ready: "queue.Queue[Optional[int]]" = queue.Queue()
+        self._stop = threading.Event()
+        self._process: Optional[subprocess.Popen] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> 'LumaFrameReader':
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def open(self):
+        """启动FFmpeg解码进程和读取线程"""
+        width, height = self.size
+        cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-nostdin',
+               '-i', self.video_path,
+               '-vf', f'scale={width}:{height}:flags=area',
+               '-pix_fmt', 'gray', '-f', 'rawvideo', 'pipe:1']
+        self._process = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                                         stderr=subprocess.DEVNULL,
+                                         bufsize=self.ring[0].nbytes)
+        for index in range(len(self.ring)):
+            self._free.put(index)
+        self._thread = threading.Thread(target=self._read_loop, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """停止解码并释放进程"""
+        self._stop.set()
+        # 唤醒可能在等待空闲槽位的读取线程
+        self._free.put(-1)
+        if self._process is not None:
+            if self._process.poll() is None:
+                self._process.kill()
+            self._process.stdout.close()
+            self._process.wait()
+            self._process = None
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        if self._process is None:
+            self.open()
+        previous = None
+        while True:
+            index = self._ready.get()
+            if previous is not None:
+                self._free.put(previous)
+            if index is None:
+                return
+            previous = index
+            yield self.ring[index]
+
+    def _read_loop(self):
+        """读取线程：逐帧填充空闲槽位"""
+        flat = self.ring.reshape(len(self.ring), -1)
+        stdout = self._process.stdout
+        try:
+            while not self._stop.is_set():
+                index = self._free.get()
+                if index < 0 or self._stop.is_set():
+                    break
+                view = memoryview(flat[index])
+                filled = 0
+                while filled < len(view):
+                    n = stdout.readinto(view[filled:])
+                    if not n:
+                        break
+                    filled += n
+                if filled < len(view):
+                    break
+                self._ready.put(index)
+        except (OSError, ValueError) as e:
+            if not self._stop.is_set():
+                self.logger.error(f"读取亮度帧失败 {self.video_path}: {e}")
+        finally:
+            self._ready.put(None)
@@ -0,0 +1,295 @@
+"""
+视频元数据探测
+
+MP4/MOV（ISO-BMFF）直接解析 moov 盒子：顶层盒子之间用 seek 跳过 mdat，
+只读取 moov（位于文件末尾且较大时用 mmap 映射），不启动任何进程。
+其他容器或解析失败时回退到 ffprobe。
+"""
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+import subprocess
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+# QuickTime/MP4 时间起点
+_EPOCH_1904 = datetime(1904, 1, 1, tzinfo=timezone.utc)
+
+# 可能出现在 ISO-BMFF 文件开头的盒子类型
+_ISO_TOP_LEVEL = {b'ftyp', b'moov', b'mdat', b'wide', b'free', b'skip', b'pnot', b'uuid'}
+
+# moov 超过该大小时用 mmap 代替一次性读取
+_MMAP_THRESHOLD = 8 * 1024 * 1024
+
+# 常见 FourCC 到 ffprobe codec_name 的映射
+FOURCC_CODECS = {
+    'avc1': 'h264', 'avc3': 'h264',
+    'hvc1': 'hevc', 'hev1': 'hevc', 'dvh1': 'hevc', 'dvhe': 'hevc',
+    'av01': 'av1', 'vp09': 'vp9', 'mp4v': 'mpeg4',
+    'jpeg': 'mjpeg', 'mjpa': 'mjpeg',
+    'apch': 'prores', 'apcn': 'prores', 'apcs': 'prores', 'apco': 'prores',
+    'ap4h': 'prores', 'ap4x': 'prores',
+}
+
+
+@dataclass
+class VideoProbeResult:
+    """视频元数据"""
+    width: int                                   # 编码宽度
+    height: int                                  # 编码高度
+    duration: float                              # 时长（秒）
+    fps: Optional[float] = None                  # 平均帧率
+    fourcc: str = ""                             # 样本描述中的FourCC（ffprobe回退时为空）
+    codec_name: str = ""                         # ffprobe风格的编码名称
+    rotation: int = 0                            # 顺时针旋转角度（0/90/180/270）
+    creation_time: Optional[datetime] = None     # 创建时间（UTC）
+    bitrate: Optional[float] = None              # 平均码率（bit/s）
+    source: str = "mp4"                          # 数据来源：mp4 或 ffprobe
+
+    @property
+    def display_size(self) -> Tuple[int, int]:
+        """应用旋转后的显示尺寸（宽，高）"""
+        if self.rotation in (90, 270):
+            return self.height, self.width
+        return self.width, self.height
+
+
+def probe_video(video_path: str) -> Optional[VideoProbeResult]:
+    """
+    探测视频元数据
+
+    Args:
+        video_path: 视频路径
+
+    Returns:
+        元数据，无法识别时返回None
+    """
+    try:
+        result = _probe_iso_bmff(video_path)
+        if result is not None:
+            return result
+    except (OSError, ValueError, struct.error) as e:
+        logger.debug(f"MP4盒子解析失败，回退到ffprobe {video_path}: {e}")
+    return _probe_ffprobe(video_path)
+
+
+def _iter_boxes(buf, start: int, end: int) -> Iterator[Tuple[bytes, int, int]]:
+    """遍历缓冲区中的盒子，返回 (类型, 负载起点, 负载终点)"""
+    offset = start
+    while offset + 8 <= end:
+        size, box_type = struct.unpack_from('>I4s', buf, offset)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from('>Q', buf, offset + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header or offset + size > end:
+            break
+        yield box_type, offset + header, offset + size
+        offset += size
+
+
+def _find_box(buf, start: int, end: int, box_type: bytes) -> Optional[Tuple[int, int]]:
+    for found, payload_start, payload_end in _iter_boxes(buf, start, end):
+        if found == box_type:
+            return payload_start, payload_end
+    return None
+
+
+def _find_path(buf, start: int, end: int, *path: bytes) -> Optional[Tuple[int, int]]:
+    """按路径查找嵌套盒子，如 (b'mdia', b'minf', b'stbl')"""
+    span = (start, end)
+    for box_type in path:
+        span = _find_box(buf, span[0], span[1], box_type)
+        if span is None:
+            return None
+    return span
+
+
+def _locate_moov(f, file_size: int) -> Optional[Tuple[int, int]]:
+    """用 seek 遍历顶层盒子，返回 moov 负载的 (偏移, 长度)"""
+    header = f.read(8)
+    if len(header) < 8 or header[4:8] not in _ISO_TOP_LEVEL:
+        return None
+    offset = 0
+    while offset + 8 <= file_size:
+        f.seek(offset)
+        header = f.read(16)
+        if len(header) < 8:
+            break
+        size, box_type = struct.unpack_from('>I4s', header)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack_from('>Q', header, 8)[0]
+            header_size = 16
+        elif size == 0:
+            size = file_size - offset
+        if size < header_size:
+            break
+        if box_type == b'moov':
+            return offset + header_size, min(size, file_size - offset) - header_size
+        offset += size
+    return None
+
+
+def _probe_iso_bmff(video_path: str) -> Optional[VideoProbeResult]:
+    """只读取 moov 盒子解析 MP4/MOV"""
+    file_size = os.path.getsize(video_path)
+    with open(video_path, 'rb') as f:
+        location = _locate_moov(f, file_size)
+        if location is None:
+            return None
+        moov_offset, moov_size = location
+        if moov_size >= _MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return _parse_moov(mm, moov_offset, moov_offset + moov_size, file_size)
+        f.seek(moov_offset)
+        buf = f.read(moov_size)
+        return _parse_moov(buf, 0, len(buf), file_size)
+
+
+def _parse_moov(buf, start: int, end: int, file_size: int) -> Optional[VideoProbeResult]:
+    mvhd = _find_box(buf, start, end, b'mvhd')
+    if mvhd is None:
+        return None
+    version = buf[mvhd[0]]
+    if version == 1:
+        creation, _, timescale, duration = struct.unpack_from('>QQIQ', buf, mvhd[0] + 4)
+    else:
+        creation, _, timescale, duration = struct.unpack_from('>IIII', buf, mvhd[0] + 4)
+    movie_duration = duration / timescale if timescale else 0.0
+
+    for box_type, trak_start, trak_end in _iter_boxes(buf, start, end):
+        if box_type != b'trak':
+            continue
+        track = _parse_video_track(buf, trak_start, trak_end)
+        if track is None:
+            continue
+
+        duration_sec = movie_duration or track.get('duration', 0.0)
+        fourcc = track.get('fourcc', '')
+        return VideoProbeResult(
+            width=track['width'],
+            height=track['height'],
+            duration=duration_sec,
+            fps=track.get('fps'),
+            fourcc=fourcc,
+            codec_name=FOURCC_CODECS.get(fourcc, fourcc),
+            rotation=track.get('rotation', 0),
+            creation_time=_EPOCH_1904 + timedelta(seconds=creation) if creation else None,
+            bitrate=file_size * 8 / duration_sec if duration_sec > 0 else None,
+            source="mp4",
+        )
+    return None
+
+
+def _parse_video_track(buf, start: int, end: int) -> Optional[Dict]:
+    """解析视频轨道；非视频轨道返回None"""
+    hdlr = _find_path(buf, start, end, b'mdia', b'hdlr')
+    if hdlr is None or bytes(buf[hdlr[0] + 8:hdlr[0] + 12]) != b'vide':
+        return None
+    track: Dict = {}
+
+    # tkhd：变换矩阵（旋转）和显示尺寸（16.16定点数）
+    tkhd = _find_box(buf, start, end, b'tkhd')
+    if tkhd is not None:
+        matrix_offset = tkhd[0] + (52 if buf[tkhd[0]] == 1 else 40)
+        a, b = struct.unpack_from('>ii', buf, matrix_offset)
+        width, height = struct.unpack_from('>II', buf, matrix_offset + 36)
+        track['width'], track['height'] = width >> 16, height >> 16
+        if a or b:
+            track['rotation'] = int(round(math.degrees(math.atan2(b, a)))) % 360
+
+    # mdhd：轨道时间刻度和时长
+    timescale = 0
+    mdhd = _find_path(buf, start, end, b'mdia', b'mdhd')
+    if mdhd is not None:
+        if buf[mdhd[0]] == 1:
+            timescale, duration = struct.unpack_from('>IQ', buf, mdhd[0] + 20)
+        else:
+            timescale, duration = struct.unpack_from('>II', buf, mdhd[0] + 12)
+        if timescale:
+            track['duration'] = duration / timescale
+
+    stbl = _find_path(buf, start, end, b'mdia', b'minf', b'stbl')
+    if stbl is not None:
+        # stsd：第一个样本描述的FourCC和编码尺寸
+        stsd = _find_box(buf, stbl[0], stbl[1], b'stsd')
+        if stsd is not None and stsd[1] - stsd[0] >= 44:
+            entry = stsd[0] + 8
+            track['fourcc'] = bytes(buf[entry + 4:entry + 8]).decode('latin-1').strip()
+            coded_w, coded_h = struct.unpack_from('>HH', buf, entry + 32)
+            if coded_w and coded_h:
+                track['width'], track['height'] = coded_w, coded_h
+
+        # stts：样本数 / 总时长 = 平均帧率
+        stts = _find_box(buf, stbl[0], stbl[1], b'stts')
+        if stts is not None and timescale:
+            entry_count = struct.unpack_from('>I', buf, stts[0] + 4)[0]
+            entry_count = min(entry_count, (stts[1] - stts[0] - 8) // 8)
+            samples = total = 0
+            for count, delta in struct.iter_unpack('>II', buf[stts[0] + 8:stts[0] + 8 + entry_count * 8]):
+                samples += count
+                total += count * delta
+            if total:
+                track['fps'] = round(samples * timescale / total, 3)
+
+    if not track.get('width') or not track.get('height'):
+        return None
+    return track
+
+
+def _probe_ffprobe(video_path: str) -> Optional[VideoProbeResult]:
+    """用 ffprobe 探测非 MP4/MOV 容器"""
+    cmd = ['ffprobe', '-v', 'quiet', '-print_format', 'json',
+           '-show_format', '-show_streams', video_path]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True,
+                                encoding='utf-8', errors='ignore', check=True)
+        info = json.loads(result.stdout)
+    except Exception as e:
+        logger.warning(f"无法获取视频信息 {video_path}: {e}")
+        return None
+
+    fmt = info.get('format', {})
+    for stream in info.get('streams', []):
+        if stream.get('codec_type') != 'video':
+            continue
+        fps = None
+        try:
+            num, den = map(int, stream.get('avg_frame_rate', '0/0').split('/'))
+            fps = round(num / den, 3) if den else None
+        except ValueError:
+            pass
+        rotation = int(float(stream.get('tags', {}).get('rotate', 0))) % 360
+        for side_data in stream.get('side_data_list', []):
+            if 'rotation' in side_data:
+                rotation = int(-float(side_data['rotation'])) % 360
+        creation_time = None
+        created = fmt.get('tags', {}).get('creation_time')
+        if created:
+            try:
+                creation_time = datetime.fromisoformat(created.replace('Z', '+00:00'))
+            except ValueError:
+                pass
+        bitrate = fmt.get('bit_rate')
+        return VideoProbeResult(
+            width=int(stream.get('width', 0)),
+            height=int(stream.get('height', 0)),
+            duration=float(fmt.get('duration') or stream.get('duration') or 0.0),
+            fps=fps,
+            codec_name=stream.get('codec_name', ''),
+            rotation=rotation,
+            creation_time=creation_time,
+            bitrate=float(bitrate) if bitrate else None,
+            source="ffprobe",
+        )
+    return None
@@ -4,27 +4,105 @@
 import cv2
 import numpy as np
 import os
-from typing import Dict, Any, Optional
+import json
+import subprocess
+import tempfile
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Any, Optional, Tuple
 import logging
+from core.engine.luma_decoder import LumaFrameReader, probe_video_size
+from core.engine.media_probe import probe_video
+from core.engine.ssim import SSIMCalculator
 from core.models.video_task import QualityMetrics
 
 
+@dataclass
+class VmafResult:
+    """VMAF计算结果"""
+    mean: float                        # 平均VMAF
+    harmonic_mean: Optional[float]     # 调和平均VMAF（对低分帧更敏感）
+    min: float                         # 最低帧VMAF
+    frame_scores: np.ndarray           # 逐帧VMAF（float32，按n_subsample采样）
+
+
+@lru_cache(maxsize=1)
+def is_vmaf_available() -> bool:
+    """检查FFmpeg是否编译了libvmaf滤镜"""
+    try:
+        out = subprocess.run(['ffmpeg', '-hide_banner', '-filters'],
+                             capture_output=True, text=True, encoding='utf-8',
+                             errors='ignore').stdout
+        return ' libvmaf ' in out
+    except (OSError, subprocess.SubprocessError):
+        return False
+
+
 class QualityAnalyzer:
     """质量分析引擎"""
     
-    def __init__(self):
+    # 解码后端：opencv（BGR全彩帧）或 ffmpeg_gray（仅亮度平面，PSNR-Y/SSIM-Y）
+    DECODERS = ('opencv', 'ffmpeg_gray')
+    
+    def __init__(self, decoder: str = "opencv", luma_size: Optional[Tuple[int, int]] = None):
+        """
+        Args:
+            decoder: 帧解码后端，见DECODERS
+            luma_size: ffmpeg_gray后端的比较分辨率（宽，高），None为参考视频原始分辨率
+        """
         self.logger = logging.getLogger(__name__)
+        if decoder not in self.DECODERS:
+            raise ValueError(f"不支持的解码后端: {decoder}")
+        self.decoder = decoder
+        self.luma_size = luma_size
+        self.ssim_calculator = SSIMCalculator()
     
-    def compare_videos(self, original_path: str, processed_path: str) -> QualityMetrics:
-        """对比视频质量，返回PSNR、SSIM等指标"""
+    def compare_videos(self, original_path: str, processed_path: str,
+                       include_vmaf: bool = False, vmaf_subsample: int = 1) -> QualityMetrics:
+        """对比视频质量，返回PSNR、SSIM等指标（可选VMAF）"""
         try:
-            # 读取视频文件并逐帧比较
-            cap_orig = cv2.VideoCapture(original_path)
-            cap_proc = cv2.VideoCapture(processed_path)
+            if self.decoder == 'ffmpeg_gray':
+                psnr_values, ssim_values = self._compare_frames_luma(original_path, processed_path)
+            else:
+                psnr_values, ssim_values = self._compare_frames_opencv(original_path, processed_path)
             
-            psnr_values = []
-            ssim_values = []
+            # 计算平均值
+            avg_psnr = np.mean(psnr_values) if psnr_values else None
+            avg_ssim = np.mean(ssim_values) if ssim_values else None
+            
+            # 获取原始和处理后视频的比特率
+            bitrate_orig = self._get_video_bitrate(original_path)
+            bitrate_proc = self._get_video_bitrate(processed_path)
+            
+            # VMAF由FFmpeg libvmaf独立计算
+            vmaf = None
+            if include_vmaf:
+                vmaf_result = self.compute_vmaf(original_path, processed_path,
+                                                n_subsample=vmaf_subsample)
+                vmaf = vmaf_result.mean if vmaf_result else None
+            
+            return QualityMetrics(
+                psnr=avg_psnr,
+                ssim=avg_ssim,
+                vmaf=vmaf,
+                bitrate_original=bitrate_orig,
+                bitrate_compressed=bitrate_proc,
+                compression_ratio=bitrate_orig/bitrate_proc if bitrate_proc and bitrate_orig else None
+            )
             
+        except Exception as e:
+            self.logger.error(f"视频质量对比失败: {str(e)}")
+            return QualityMetrics()
+    
+    def _compare_frames_opencv(self, original_path: str, processed_path: str) -> Tuple[list, list]:
+        """用OpenCV解码BGR帧并逐帧计算PSNR/SSIM"""
+        cap_orig = cv2.VideoCapture(original_path)
+        cap_proc = cv2.VideoCapture(processed_path)
+        
+        psnr_values = []
+        ssim_values = []
+        
+        try:
             while True:
                 ret_orig, frame_orig = cap_orig.read()
                 ret_proc, frame_proc = cap_proc.read()
@@ -41,35 +119,117 @@ class QualityAnalyzer:
                 ssim = self._calculate_ssim(frame_orig, frame_proc)
                 if ssim is not None:
                     ssim_values.append(ssim)
-            
+        finally:
             cap_orig.release()
             cap_proc.release()
+        
+        return psnr_values, ssim_values
+    
+    def _compare_frames_luma(self, original_path: str, processed_path: str) -> Tuple[list, list]:
+        """用FFmpeg只解码亮度平面并逐帧计算PSNR-Y/SSIM-Y，两路由FFmpeg缩放到同一尺寸"""
+        size = self.luma_size or probe_video_size(original_path)
+        
+        psnr_values = []
+        ssim_values = []
+        
+        with LumaFrameReader(original_path, size) as reader_orig, \
+                LumaFrameReader(processed_path, size) as reader_proc:
+            for y_orig, y_proc in zip(reader_orig, reader_proc):
+                psnr = self._calculate_psnr(y_orig, y_proc)
+                if psnr is not None:
+                    psnr_values.append(psnr)
+                
+                ssim = self._calculate_ssim(y_orig, y_proc)
+                if ssim is not None:
+                    ssim_values.append(ssim)
+        
+        return psnr_values, ssim_values
+    
+    def compute_vmaf(self, original_path: str, processed_path: str,
+                     n_threads: Optional[int] = None, n_subsample: int = 1,
+                     model: Optional[str] = None) -> Optional[VmafResult]:
+        """
+        使用FFmpeg libvmaf计算VMAF
+        
+        Args:
+            original_path: 参考（原始）视频
+            processed_path: 待评估（处理后）视频
+            n_threads: libvmaf线程数，默认CPU核数
+            n_subsample: 每n帧计算一次，>1时显著加速
+            model: libvmaf模型参数（如"version=vmaf_4k_v0.6.1"），默认内置模型
             
-            # 计算平均值
-            avg_psnr = np.mean(psnr_values) if psnr_values else None
-            avg_ssim = np.mean(ssim_values) if ssim_values else None
-            
-            # 获取原始和处理后视频的比特率
-            bitrate_orig = self._get_video_bitrate(original_path)
-            bitrate_proc = self._get_video_bitrate(processed_path)
-            
-            return QualityMetrics(
-                psnr=avg_psnr,
-                ssim=avg_ssim,
-                bitrate_original=bitrate_orig,
-                bitrate_compressed=bitrate_proc,
-                compression_ratio=bitrate_orig/bitrate_proc if bitrate_proc and bitrate_orig else None
-            )
+        Returns:
+            VMAF结果；libvmaf不可用或计算失败时返回None
+        """
+        if not is_vmaf_available():
+            self.logger.warning("FFmpeg未启用libvmaf，跳过VMAF计算")
+            return None
+        
+        size = probe_video_size(original_path)
+        if size is None:
+            self.logger.error(f"无法读取参考视频尺寸: {original_path}")
+            return None
+        width, height = size
+        
+        n_threads = n_threads or os.cpu_count() or 1
+        options = f"log_fmt=json:log_path=vmaf.json:n_threads={n_threads}:n_subsample={max(1, n_subsample)}"
+        if model:
+            options += f":model={model}"
+        # 两路先对齐到参考分辨率和时间戳再比较；libvmaf第一路为待评估视频
+        scale = f"scale={width}:{height}:flags=bicubic,format=yuv420p,setpts=PTS-STARTPTS"
+        graph = f"[0:v]{scale}[dis];[1:v]{scale}[ref];[dis][ref]libvmaf={options}"
+        
+        try:
+            # 在临时目录中运行，日志使用相对路径以避免滤镜参数转义问题
+            with tempfile.TemporaryDirectory(prefix="mediaflow_vmaf_") as tmp_dir:
+                cmd = ['ffmpeg', '-hide_banner', '-nostats', '-loglevel', 'error',
+                       '-i', os.path.abspath(processed_path),
+                       '-i', os.path.abspath(original_path),
+                       '-lavfi', graph, '-f', 'null', '-']
+                result = subprocess.run(cmd, cwd=tmp_dir, capture_output=True, text=True,
+                                        encoding='utf-8', errors='ignore')
+                if result.returncode != 0:
+                    self.logger.error(f"VMAF计算失败: {result.stderr.strip()}")
+                    return None
+                with open(os.path.join(tmp_dir, 'vmaf.json'), 'r', encoding='utf-8') as f:
+                    log = json.load(f)
             
+            return self._parse_vmaf_log(log)
         except Exception as e:
-            self.logger.error(f"视频质量对比失败: {str(e)}")
-            return QualityMetrics()
+            self.logger.error(f"VMAF计算失败: {str(e)}")
+            return None
+    
+    def _parse_vmaf_log(self, log: Dict[str, Any]) -> Optional[VmafResult]:
+        """解析libvmaf的JSON日志"""
+        frames = log.get('frames', [])
+        scores = np.fromiter((frame['metrics']['vmaf'] for frame in frames),
+                             dtype=np.float32, count=len(frames))
+        if scores.size == 0:
+            return None
+        
+        pooled = log.get('pooled_metrics', {}).get('vmaf', {})
+        return VmafResult(
+            mean=float(pooled.get('mean', scores.mean())),
+            harmonic_mean=pooled.get('harmonic_mean'),
+            min=float(pooled.get('min', scores.min())),
+            frame_scores=scores
+        )
+    
+    def compare_frames(self, original_frame: np.ndarray,
+                       processed_frame: np.ndarray) -> Dict[str, float]:
+        """对比单帧质量，返回PSNR、SSIM、MS-SSIM"""
+        return {
+            'psnr': self._calculate_psnr(original_frame, processed_frame),
+            'ssim': self._calculate_ssim(original_frame, processed_frame),
+            'ms_ssim': self._calculate_ms_ssim(original_frame, processed_frame)
+        }
     
     def generate_quality_report(self, metrics: QualityMetrics) -> Dict[str, Any]:
         """生成质量分析报告"""
         report = {
             'psnr': metrics.psnr,
             'ssim': metrics.ssim,
+            'vmaf': metrics.vmaf,
             'bitrate_original': metrics.bitrate_original,
             'bitrate_compressed': metrics.bitrate_compressed,
             'compression_ratio': metrics.compression_ratio,
@@ -98,34 +258,36 @@ class QualityAnalyzer:
             return None
     
     def _calculate_ssim(self, img1: np.ndarray, img2: np.ndarray) -> Optional[float]:
-        """计算两幅图像的SSIM值"""
+        """计算两幅图像的SSIM值（亮度通道）"""
         try:
-            # 确保图像尺寸相同
-            if img1.shape != img2.shape:
-                img2 = cv2.resize(img2, (img1.shape[1], img1.shape[0]))
-            
-            # 转换为灰度图计算SSIM
-            gray1 = cv2.cvtColor(img1, cv2.COLOR_BGR2GRAY)
-            gray2 = cv2.cvtColor(img2, cv2.COLOR_BGR2GRAY)
-            
-            # 使用OpenCV的SSIM计算
-            ssim = cv2.quality.QualitySSIM_compute(gray1, gray2)
-            return ssim[0]  # 返回第一个通道的SSIM值
-        except Exception:
-            # 如果OpenCV不支持，使用sklearn的实现
-            try:
-                from skimage.metrics import structural_similarity as ssim_sk
-                gray1 = cv2.cvtColor(img1, cv2.COLOR_BGR2GRAY)
-                gray2 = cv2.cvtColor(img2, cv2.COLOR_BGR2GRAY)
-                score = ssim_sk(gray1, gray2)
-                return score
-            except ImportError:
-                return None
-            except Exception:
-                return None
+            gray1, gray2 = self._to_gray_pair(img1, img2)
+            return self.ssim_calculator.ssim(gray1, gray2)
+        except Exception as e:
+            self.logger.debug(f"SSIM计算失败: {e}")
+            return None
+    
+    def _calculate_ms_ssim(self, img1: np.ndarray, img2: np.ndarray) -> Optional[float]:
+        """计算两幅图像的MS-SSIM值（亮度通道）"""
+        try:
+            gray1, gray2 = self._to_gray_pair(img1, img2)
+            return self.ssim_calculator.ms_ssim(gray1, gray2)
+        except Exception as e:
+            self.logger.debug(f"MS-SSIM计算失败: {e}")
+            return None
+    
+    def _to_gray_pair(self, img1: np.ndarray, img2: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """对齐尺寸并转换为灰度图（亮度帧直接使用）"""
+        if img1.shape != img2.shape:
+            img2 = cv2.resize(img2, (img1.shape[1], img1.shape[0]))
+        gray1 = img1 if img1.ndim == 2 else cv2.cvtColor(img1, cv2.COLOR_BGR2GRAY)
+        gray2 = img2 if img2.ndim == 2 else cv2.cvtColor(img2, cv2.COLOR_BGR2GRAY)
+        return gray1, gray2
     
     def _get_video_bitrate(self, video_path: str) -> Optional[float]:
         """获取视频比特率"""
+        info = probe_video(video_path)
+        if info is not None and info.bitrate:
+            return info.bitrate
         try:
             cap = cv2.VideoCapture(video_path)
             fps = cap.get(cv2.CAP_PROP_FPS)
@@ -173,6 +335,8 @@ class QualityAnalyzer:
             return "视频质量较低，建议调整编码参数提高质量"
         elif metrics.ssim and metrics.ssim < 0.8:
             return "视频相似度较低，建议优化编码设置"
+        elif metrics.vmaf is not None and metrics.vmaf < 80:
+            return "VMAF感知质量较低，建议降低CRF或提高码率"
         elif metrics.compression_ratio and metrics.compression_ratio > 10:
             return "压缩比较高，可能导致质量损失"
         else:
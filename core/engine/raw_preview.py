@@ -0,0 +1,209 @@
+"""
+RAW 内嵌预览提取
+
+TIFF 系 RAW（NEF/ARW/DNG/CR2/ORF/PEF...）和富士 RAF 都内嵌一张相机生成的JPEG预览。
+这里用 mmap 映射文件，遍历 IFD 找出最大的可显示JPEG（跳过无损JPEG编码的RAW数据本身），
+返回指向映射区域的 memoryview，不复制、不解马赛克。
+"""
+import io
+import logging
+import mmap
+import os
+import struct
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from core.engine.exif_reader import (
+    TiffParser, TAG_COMPRESSION, TAG_JPEG_LENGTH, TAG_JPEG_OFFSET, TAG_ORIENTATION,
+    TAG_STRIP_BYTE_COUNTS, TAG_STRIP_OFFSETS, TIFF_MAGICS
+)
+
+
+logger = logging.getLogger(__name__)
+
+RAW_EXTENSIONS = ('.nef', '.nrw', '.arw', '.srf', '.sr2', '.dng', '.cr2', '.orf',
+                  '.pef', '.rw2', '.raf', '.srw', '.3fr', '.erf', '.kdc', '.mos', '.iiq')
+
+# 可显示的JPEG：基线、扩展顺序、渐进式（SOF3等无损JPEG是RAW数据本身）
+_VIEWABLE_SOF = {0xC0, 0xC1, 0xC2}
+
+_RAF_MAGIC = b'FUJIFILMCCD-RAW '
+
+
+@dataclass
+class RawPreview:
+    """
+    内嵌JPEG预览
+
+    data 是文件映射上的 memoryview，在 close() 之前有效；
+    需要长期保留时使用 to_bytes() 复制一份。
+    """
+    path: str
+    data: memoryview
+    width: Optional[int] = None
+    height: Optional[int] = None
+    orientation: int = 1
+    _mmap: Optional[mmap.mmap] = None
+
+    def __enter__(self) -> 'RawPreview':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def close(self):
+        """释放文件映射"""
+        if self._mmap is not None:
+            self.data.release()
+            self._mmap.close()
+            self._mmap = None
+
+    def to_bytes(self) -> bytes:
+        """复制JPEG数据"""
+        return bytes(self.data)
+
+    def save(self, output_path: str):
+        """把JPEG直接写入文件（不重新编码）"""
+        with open(output_path, 'wb') as f:
+            f.write(self.data)
+
+
+def _jpeg_size(buf, start: int, end: int) -> Optional[Tuple[int, int, int]]:
+    """扫描JPEG段头，返回 (SOF标记, 宽, 高)；不是JPEG时返回None"""
+    if end - start < 4 or buf[start] != 0xFF or buf[start + 1] != 0xD8:
+        return None
+    offset = start + 2
+    while offset + 4 <= end:
+        if buf[offset] != 0xFF:
+            return None
+        code = buf[offset + 1]
+        if code == 0xFF:
+            offset += 1
+            continue
+        if code == 0xDA or code == 0xD9:
+            return None
+        length = struct.unpack_from('>H', buf, offset + 2)[0]
+        if 0xC0 <= code <= 0xCF and code not in (0xC4, 0xC8, 0xCC):
+            if offset + 9 > end:
+                return None
+            height, width = struct.unpack_from('>HH', buf, offset + 5)
+            return code, width, height
+        offset += 2 + length
+    return None
+
+
+def _tiff_candidates(mm: mmap.mmap, base: int = 0) -> Tuple[List[Tuple[int, int]], int]:
+    """收集所有IFD中的JPEG候选区域 (偏移, 长度)，并返回IFD0中的方向"""
+    parser = TiffParser(lambda o, n: mm[o:o + n], base=base)
+    candidates = []
+    orientation = 1
+    for index, (_, entries) in enumerate(parser.iter_ifds()):
+        if index == 0:
+            orientation = parser.get(entries, TAG_ORIENTATION, 1)
+        # JPEGInterchangeFormat（NEF/ARW/ORF的预览、各种缩略图）
+        offset = parser.get(entries, TAG_JPEG_OFFSET)
+        length = parser.get(entries, TAG_JPEG_LENGTH)
+        if isinstance(offset, int) and isinstance(length, int) and length > 0:
+            candidates.append((base + offset, length))
+        # 单条带JPEG压缩（CR2 IFD0、DNG预览SubIFD）
+        if parser.get(entries, TAG_COMPRESSION) in (6, 7):
+            offsets = parser.values(entries.get(TAG_STRIP_OFFSETS))
+            counts = parser.values(entries.get(TAG_STRIP_BYTE_COUNTS))
+            if len(offsets) == 1 and len(counts) == 1 and counts[0] > 0:
+                candidates.append((base + offsets[0], counts[0]))
+    return candidates, orientation
+
+
+def _raf_candidates(mm: mmap.mmap) -> Tuple[List[Tuple[int, int]], int]:
+    """RAF头部固定位置记录了JPEG预览的偏移和长度"""
+    offset, length = struct.unpack_from('>II', mm, 84)
+    return [(offset, length)], 1
+
+
+def extract_preview(raw_path: str) -> Optional[RawPreview]:
+    """
+    提取RAW文件中最大的可显示JPEG预览
+
+    Args:
+        raw_path: RAW文件路径
+
+    Returns:
+        预览（使用后需 close()），没有找到时返回None
+    """
+    try:
+        with open(raw_path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError) as e:
+        logger.warning(f"无法映射RAW文件 {raw_path}: {e}")
+        return None
+
+    try:
+        size = len(mm)
+        head = mm[:16]
+        if head.startswith(_RAF_MAGIC):
+            candidates, orientation = _raf_candidates(mm)
+        elif head[:4] in TIFF_MAGICS:
+            candidates, orientation = _tiff_candidates(mm)
+        else:
+            candidates, orientation = [], 1
+
+        best = None
+        for offset, length in candidates:
+            end = min(offset + length, size)
+            info = _jpeg_size(mm, offset, end)
+            if info is None or info[0] not in _VIEWABLE_SOF:
+                continue
+            _, width, height = info
+            if best is None or width * height > best[2] * best[3]:
+                best = (offset, end, width, height)
+
+        if best is None:
+            mm.close()
+            return None
+        offset, end, width, height = best
+        return RawPreview(path=raw_path, data=memoryview(mm)[offset:end],
+                          width=width, height=height, orientation=orientation, _mmap=mm)
+    except (ValueError, struct.error, IndexError) as e:
+        logger.warning(f"解析RAW预览失败 {raw_path}: {e}")
+        mm.close()
+        return None
+
+
+def load_preview_image(raw_path: str, max_size: Optional[int] = None):
+    """
+    把RAW预览解码为PIL图像（按EXIF方向旋转）
+
+    Args:
+        raw_path: RAW文件路径
+        max_size: 长边上限；提供时利用JPEG DCT缩放（draft）直接低分辨率解码
+
+    Returns:
+        PIL.Image 或 None
+    """
+    from PIL import Image
+
+    preview = extract_preview(raw_path)
+    if preview is None:
+        return None
+    with preview:
+        image = Image.open(io.BytesIO(preview.data))
+        if max_size:
+            image.draft('RGB', (max_size, max_size))
+        image.load()
+    # EXIF方向 -> 转置操作（与 ImageOps.exif_transpose 一致）
+    method = {
+        2: Image.Transpose.FLIP_LEFT_RIGHT, 3: Image.Transpose.ROTATE_180,
+        4: Image.Transpose.FLIP_TOP_BOTTOM, 5: Image.Transpose.TRANSPOSE,
+        6: Image.Transpose.ROTATE_270, 7: Image.Transpose.TRANSVERSE,
+        8: Image.Transpose.ROTATE_90,
+    }.get(preview.orientation)
+    if method is not None:
+        image = image.transpose(method)
+    if max_size:
+        image.thumbnail((max_size, max_size))
+    return image
+
+
+def is_raw_file(path: str) -> bool:
+    """根据扩展名判断是否为RAW文件"""
+    return os.path.splitext(path)[1].lower() in RAW_EXTENSIONS
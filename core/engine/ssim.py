@@ -0,0 +1,187 @@
+"""
+SSIM / MS-SSIM 计算
+
+float32 上的可分离高斯滤波实现（11抽头，sigma=1.5），与 skimage 的
+structural_similarity(gaussian_weights=True, use_sample_covariance=False) 对齐。
+中间结果缓存在按尺寸复用的线程本地缓冲区中，逐帧计算不再分配内存。
+"""
+import threading
+from typing import Dict, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+
+# Wang et al. 2003 五个尺度的权重
+MS_SSIM_WEIGHTS = (0.0448, 0.2856, 0.3001, 0.2363, 0.1333)
+
+
+class _Scratch:
+    """单一尺寸的中间缓冲区"""
+
+    NAMES = ('x', 'y', 'mu_x', 'mu_y', 'xx', 'yy', 'xy', 'num', 'den')
+
+    def __init__(self, shape: Tuple[int, int]):
+        for name in self.NAMES:
+            setattr(self, name, np.empty(shape, dtype=np.float32))
+
+
+class SSIMCalculator:
+    """SSIM/MS-SSIM计算器，支持单帧和批量帧"""
+
+    def __init__(self, window_size: int = 11, sigma: float = 1.5, data_range: float = 255.0):
+        """
+        Args:
+            window_size: 高斯窗口大小（奇数）
+            sigma: 高斯标准差
+            data_range: 像素取值范围（8位图像为255）
+        """
+        self.window_size = window_size
+        self.pad = (window_size - 1) // 2
+        self.kernel = cv2.getGaussianKernel(window_size, sigma, cv2.CV_32F)
+        self.c1 = (0.01 * data_range) ** 2
+        self.c2 = (0.03 * data_range) ** 2
+        self._local = threading.local()
+
+    def ssim(self, img1: np.ndarray, img2: np.ndarray) -> float:
+        """计算两幅单通道图像的平均SSIM"""
+        ssim_value, _ = self._ssim_cs(self._load(img1, img2))
+        return ssim_value
+
+    def ssim_batch(self, frames1: np.ndarray, frames2: np.ndarray) -> np.ndarray:
+        """
+        批量计算SSIM
+
+        Args:
+            frames1: 形状为(N, H, W)的参考帧
+            frames2: 形状为(N, H, W)的待评估帧
+
+        Returns:
+            长度为N的float32 SSIM数组
+        """
+        scores = np.empty(len(frames1), dtype=np.float32)
+        for i, (a, b) in enumerate(zip(frames1, frames2)):
+            scores[i] = self.ssim(a, b)
+        return scores
+
+    def ms_ssim(self, img1: np.ndarray, img2: np.ndarray,
+                weights: Sequence[float] = MS_SSIM_WEIGHTS) -> float:
+        """
+        计算多尺度SSIM
+
+        图像过小时自动减少尺度数并重新归一化权重。
+        """
+        scales = len(weights)
+        min_side = min(img1.shape[:2])
+        while scales > 1 and (min_side >> (scales - 1)) < self.window_size:
+            scales -= 1
+        weights = np.asarray(weights[:scales], dtype=np.float64)
+        weights /= weights.sum()
+
+        scratch = self._load(img1, img2)
+        result = 1.0
+        for level in range(scales):
+            ssim_value, cs_value = self._ssim_cs(scratch)
+            if level == scales - 1:
+                result *= max(ssim_value, 0.0) ** weights[level]
+                break
+            result *= max(cs_value, 0.0) ** weights[level]
+            scratch = self._downsample(scratch)
+        return float(result)
+
+    def ms_ssim_batch(self, frames1: np.ndarray, frames2: np.ndarray) -> np.ndarray:
+        """批量计算MS-SSIM，返回长度为N的float32数组"""
+        scores = np.empty(len(frames1), dtype=np.float32)
+        for i, (a, b) in enumerate(zip(frames1, frames2)):
+            scores[i] = self.ms_ssim(a, b)
+        return scores
+
+    def _buffers(self, shape: Tuple[int, int]) -> _Scratch:
+        """获取当前线程中指定尺寸的缓冲区"""
+        cache: Optional[Dict[Tuple[int, int], _Scratch]] = getattr(self._local, 'cache', None)
+        if cache is None:
+            cache = self._local.cache = {}
+        scratch = cache.get(shape)
+        if scratch is None:
+            scratch = cache[shape] = _Scratch(shape)
+        return scratch
+
+    def _load(self, img1: np.ndarray, img2: np.ndarray) -> _Scratch:
+        """把输入转换为float32写入缓冲区"""
+        if img1.shape != img2.shape:
+            raise ValueError(f"图像尺寸不一致: {img1.shape} vs {img2.shape}")
+        if img1.ndim != 2:
+            raise ValueError("SSIM需要单通道图像")
+        scratch = self._buffers(img1.shape)
+        np.copyto(scratch.x, img1, casting='unsafe')
+        np.copyto(scratch.y, img2, casting='unsafe')
+        return scratch
+
+    def _downsample(self, scratch: _Scratch) -> _Scratch:
+        """2x2平均下采样到下一尺度"""
+        height, width = scratch.x.shape
+        half = self._buffers((height // 2, width // 2))
+        size = (width // 2, height // 2)
+        cv2.resize(scratch.x[:height // 2 * 2, :width // 2 * 2], size, dst=half.x,
+                   interpolation=cv2.INTER_AREA)
+        cv2.resize(scratch.y[:height // 2 * 2, :width // 2 * 2], size, dst=half.y,
+                   interpolation=cv2.INTER_AREA)
+        return half
+
+    def _filter(self, src: np.ndarray, dst: np.ndarray) -> np.ndarray:
+        """可分离高斯滤波"""
+        return cv2.sepFilter2D(src, cv2.CV_32F, self.kernel, self.kernel, dst=dst,
+                               borderType=cv2.BORDER_REFLECT)
+
+    def _ssim_cs(self, s: _Scratch) -> Tuple[float, float]:
+        """计算缓冲区中两幅图像的平均SSIM和平均对比度-结构项"""
+        self._filter(s.x, s.mu_x)
+        self._filter(s.y, s.mu_y)
+
+        # 二阶矩：E[x^2], E[y^2], E[xy]
+        np.multiply(s.x, s.x, out=s.num)
+        self._filter(s.num, s.xx)
+        np.multiply(s.y, s.y, out=s.num)
+        self._filter(s.num, s.yy)
+        np.multiply(s.x, s.y, out=s.num)
+        self._filter(s.num, s.xy)
+
+        # 方差与协方差（就地覆盖二阶矩）
+        np.multiply(s.mu_x, s.mu_x, out=s.num)
+        s.xx -= s.num
+        np.multiply(s.mu_y, s.mu_y, out=s.den)
+        s.yy -= s.den
+        s.den += s.num                      # mu_x^2 + mu_y^2
+        np.multiply(s.mu_x, s.mu_y, out=s.num)
+        s.xy -= s.num                       # sigma_xy
+
+        # 对比度-结构项 cs = (2*sigma_xy + C2) / (sigma_x^2 + sigma_y^2 + C2)
+        s.xy *= 2
+        s.xy += self.c2
+        s.xx += s.yy
+        s.xx += self.c2
+        crop = (slice(self.pad, -self.pad or None), slice(self.pad, -self.pad or None))
+        np.divide(s.xy, s.xx, out=s.yy)
+        cs_value = float(s.yy[crop].mean(dtype=np.float64))
+
+        # 亮度项 l = (2*mu_x*mu_y + C1) / (mu_x^2 + mu_y^2 + C1)
+        s.num *= 2
+        s.num += self.c1
+        s.den += self.c1
+        np.divide(s.num, s.den, out=s.num)
+        s.num *= s.yy
+        ssim_value = float(s.num[crop].mean(dtype=np.float64))
+        return ssim_value, cs_value
+
+
+_default_calculator = SSIMCalculator()
+
+
+def ssim(img1: np.ndarray, img2: np.ndarray) -> float:
+    """计算两幅8位单通道图像的SSIM"""
+    return _default_calculator.ssim(img1, img2)
+
+
+def ms_ssim(img1: np.ndarray, img2: np.ndarray) -> float:
+    """计算两幅8位单通道图像的MS-SSIM"""
+    return _default_calculator.ms_ssim(img1, img2)
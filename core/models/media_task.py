@@ -123,6 +123,8 @@ class EncodeConfig:
     resolution: Optional[tuple] = None  # 分辨率（宽，高）
     framerate: Optional[float] = None  # 帧率
     hardware_acceleration: bool = False  # 是否使用硬件加速
+    target_quality: Optional[float] = None  # 目标质量（设置后按质量自动搜索CRF）
+    target_metric: str = "ssim"   # 目标质量指标（ssim/psnr/vmaf）
     
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典"""
@@ -133,7 +135,9 @@ class EncodeConfig:
             "bitrate": self.bitrate,
             "resolution": self.resolution,
             "framerate": self.framerate,
-            "hardware_acceleration": self.hardware_acceleration
+            "hardware_acceleration": self.hardware_acceleration,
+            "target_quality": self.target_quality,
+            "target_metric": self.target_metric
         }
 
 
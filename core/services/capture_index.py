@@ -0,0 +1,211 @@
+"""
+拍摄分组索引
+
+一次扫描把同一次拍摄的文件按 (目录, 拍摄文件名主干) 归为一组：
+RAW、相机JPEG、XMP附属文件（name.xmp 或 name.NEF.xmp）以及编辑后的变体
+（如 _DSC0001-已增强-降噪.jpg/.dng；_DSC0001-2.jpg 只在 _DSC0001 也存在时归入）。
+成对操作（一起重命名、删除孤立文件、成对时只备份JPEG）都变成字典查询，
+不再对目录反复做正则扫描。
+"""
+import logging
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from core.engine.raw_preview import RAW_EXTENSIONS
+
+
+JPEG_EXTENSIONS = ('.jpg', '.jpeg')
+SIDECAR_EXTENSIONS = ('.xmp',)
+# 编辑软件导出的其他图像格式（只作为编辑变体归组）
+RENDERED_EXTENSIONS = JPEG_EXTENSIONS + ('.tif', '.tiff', '.png', '.heic', '.heif')
+
+# 编辑变体后缀：增强/降噪（Lightroom中英文界面）、"-Edit"，可带 -N 编号
+DEFAULT_EDIT_SUFFIX = r'(?:-已增强(?:-降噪)?|-Enhanced(?:-NR)?|-Edit)(?:-\d+)?'
+# 仅有编号的后缀（导出副本 _DSC0001-2）：去掉编号后的拍摄也存在时才视为编辑变体，
+# 否则按原名单独成组（如文件名本身带编号的 IMG-2024）
+DEFAULT_COUNTER_SUFFIX = r'-\d+'
+
+
+@dataclass
+class CaptureGroup:
+    """同一次拍摄的所有文件"""
+    directory: str
+    stem: str
+    raws: List[str] = field(default_factory=list)
+    jpegs: List[str] = field(default_factory=list)
+    sidecars: List[str] = field(default_factory=list)
+    edits: List[str] = field(default_factory=list)
+
+    @property
+    def files(self) -> List[str]:
+        return self.raws + self.jpegs + self.edits + self.sidecars
+
+    @property
+    def is_pair(self) -> bool:
+        """RAW+JPEG成对"""
+        return bool(self.raws and self.jpegs)
+
+    def edits_with(self, extensions: Tuple[str, ...]) -> List[str]:
+        """指定扩展名的编辑变体，如 edits_with(JPEG_EXTENSIONS)"""
+        return [p for p in self.edits if os.path.splitext(p)[1].lower() in extensions]
+
+    def variants_of(self, path: str, extensions: Tuple[str, ...]) -> List[str]:
+        """与 path 同名、仅扩展名不同的文件，如降噪DNG对应的降噪JPG"""
+        base = os.path.splitext(os.path.basename(path))[0].lower()
+        return [p for p in self.raws + self.jpegs + self.edits
+                if p != path and os.path.splitext(p)[1].lower() in extensions
+                and os.path.splitext(os.path.basename(p))[0].lower() == base]
+
+
+class CaptureIndex:
+    """
+    按拍摄分组的文件索引
+
+    用法:
+        index = CaptureIndex.scan(folder)
+        group = index.group_of(path)
+        if group and group.jpegs:
+            ...
+    """
+
+    def __init__(self,
+                 edit_suffix: str = DEFAULT_EDIT_SUFFIX,
+                 counter_suffix: str = DEFAULT_COUNTER_SUFFIX):
+        """
+        Args:
+            edit_suffix: 编辑变体后缀的正则（不含扩展名）
+            counter_suffix: 仅编号后缀的正则，去掉后的拍摄存在时才归入该拍摄
+        """
+        self.logger = logging.getLogger(__name__)
+        self._name_pattern = re.compile(r'(?P<stem>.+?)(?:(?P<edit>' + edit_suffix + r')|(?P<counter>'
+                                        + counter_suffix + r'))?\Z')
+        self._groups: Dict[Tuple[str, str], CaptureGroup] = {}
+        self._path_keys: Dict[str, Tuple[str, str]] = {}
+        # 基础拍摄尚未出现的编号副本：{基础拍摄的键: [按原名建立的分组键]}
+        self._counter_groups: Dict[Tuple[str, str], List[Tuple[str, str]]] = {}
+
+    @classmethod
+    def scan(cls,
+             folder: str,
+             recursive: bool = True,
+             skip_dir: Optional[Callable[[str], bool]] = None,
+             **kwargs) -> 'CaptureIndex':
+        """
+        扫描目录建立索引
+
+        Args:
+            folder: 目录
+            recursive: 是否包含子目录
+            skip_dir: 返回True时跳过该目录
+        """
+        index = cls(**kwargs)
+        for root, _, files in os.walk(folder):
+            if skip_dir is None or not skip_dir(root):
+                for name in files:
+                    index.add(os.path.join(root, name))
+            if not recursive:
+                break
+        return index
+
+    def __len__(self) -> int:
+        return len(self._groups)
+
+    def __iter__(self) -> Iterator[CaptureGroup]:
+        return iter(self._groups.values())
+
+    def _classify(self, name: str) -> Optional[Tuple[str, str, Optional[str]]]:
+        """
+        返回 (类别, 拍摄主干, 编号副本的原主干)；与拍摄无关的文件返回None
+
+        RAW始终归为 raws（包括增强/降噪后的DNG），编辑后缀只把渲染格式归为 edits。
+        """
+        base, ext = os.path.splitext(name)
+        ext = ext.lower()
+        if ext in SIDECAR_EXTENSIONS:
+            # name.NEF.xmp 形式的附属文件：去掉被附属文件的扩展名
+            inner_base, inner_ext = os.path.splitext(base)
+            if inner_ext.lower() in RAW_EXTENSIONS + RENDERED_EXTENSIONS:
+                base = inner_base
+            kind = 'sidecars'
+        elif ext in RAW_EXTENSIONS:
+            kind = 'raws'
+        elif ext in RENDERED_EXTENSIONS:
+            kind = 'jpegs' if ext in JPEG_EXTENSIONS else 'edits'
+        else:
+            return None
+        match = self._name_pattern.match(base)
+        if match.group('counter'):
+            return kind, match.group('stem'), base
+        if match.group('edit') and kind == 'jpegs':
+            kind = 'edits'
+        return kind, match.group('stem'), None
+
+    def add(self, path: str) -> Optional[CaptureGroup]:
+        """加入一个文件，返回其所在的分组（与拍摄无关的文件返回None）"""
+        directory, name = os.path.split(path)
+        classified = self._classify(name)
+        if classified is None:
+            return None
+        kind, stem, counter_base = classified
+        key = (os.path.normcase(directory), stem.lower())
+        if counter_base is not None:
+            if key in self._groups:
+                kind = 'edits' if kind == 'jpegs' else kind
+            else:
+                # 基础拍摄还没出现：先按原名成组，之后出现时再并入
+                own_key = (key[0], counter_base.lower())
+                pending = self._counter_groups.setdefault(key, [])
+                if own_key not in pending:
+                    pending.append(own_key)
+                key, stem = own_key, counter_base
+        group = self._groups.get(key)
+        if group is None:
+            group = self._groups[key] = CaptureGroup(directory, stem)
+            for counter_key in self._counter_groups.pop(key, []):
+                self._merge_counter_group(counter_key, group, key)
+        getattr(group, kind).append(path)
+        self._path_keys[os.path.normcase(path)] = key
+        return group
+
+    def _merge_counter_group(self, counter_key: Tuple[str, str], group: CaptureGroup, key: Tuple[str, str]):
+        """把编号副本的分组并入刚出现的基础拍摄"""
+        counter_group = self._groups.pop(counter_key, None)
+        if counter_group is None:
+            return
+        group.raws.extend(counter_group.raws)
+        group.edits.extend(counter_group.jpegs + counter_group.edits)
+        group.sidecars.extend(counter_group.sidecars)
+        for path in counter_group.files:
+            self._path_keys[os.path.normcase(path)] = key
+
+    def group_of(self, path: str) -> Optional[CaptureGroup]:
+        """文件所在的分组"""
+        key = self._path_keys.get(os.path.normcase(path))
+        return self._groups.get(key) if key else None
+
+    def get(self, directory: str, stem: str) -> Optional[CaptureGroup]:
+        """按目录和拍摄主干查找分组"""
+        return self._groups.get((os.path.normcase(directory), stem.lower()))
+
+    def orphan_sidecars(self) -> List[str]:
+        """所属的RAW/JPEG/编辑变体都已不存在的XMP附属文件"""
+        return [p for g in self if not (g.raws or g.jpegs or g.edits) for p in g.sidecars]
+
+    def unpaired_raws(self) -> List[str]:
+        """没有对应JPEG（相机JPEG或JPEG编辑变体）的RAW"""
+        return [p for g in self if not (g.jpegs or g.edits_with(JPEG_EXTENSIONS)) for p in g.raws]
+
+    def rename_group(self, group: CaptureGroup, new_stem: str) -> List[Tuple[str, str]]:
+        """
+        整组改名：每个文件名中的拍摄主干替换为 new_stem，编辑后缀和扩展名保持不变
+
+        Returns:
+            [(原路径, 新路径)]，可交给 RenameJournal 执行
+        """
+        moves = []
+        for path in group.files:
+            directory, name = os.path.split(path)
+            moves.append((path, os.path.join(directory, new_stem + name[len(group.stem):])))
+        return moves
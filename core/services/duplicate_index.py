@@ -0,0 +1,269 @@
+"""
+重复/近似重复照片索引
+
+感知哈希在进程池中计算，按 (路径, 大小, 修改时间) 持久化到 SQLite；
+查询使用内存中的多索引哈希表（汉明距离），新增照片只需查表，
+不会与全部已有照片两两比较。
+"""
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from config.app_config import app_config
+from core.engine.image_hash import compute_hashes, hamming_distance
+
+
+class MultiIndexHash:
+    """
+    多索引哈希（汉明距离近邻查询）
+
+    64位哈希切成 chunks 段，每段各建一张哈希表。若两哈希距离不超过 k，
+    由鸽巢原理至少有一段的距离不超过 k // chunks，因此只需在每段上
+    枚举很小半径内的取值查表，再对候选做完整距离校验。
+    """
+
+    def __init__(self, bits: int = 64, chunks: int = 4):
+        self.chunks = chunks
+        self.chunk_bits = bits // chunks
+        self._mask = (1 << self.chunk_bits) - 1
+        self._tables: List[Dict[int, set]] = [{} for _ in range(chunks)]
+        self._values: Dict[object, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def _split(self, value: int) -> List[int]:
+        return [(value >> (i * self.chunk_bits)) & self._mask for i in range(self.chunks)]
+
+    def add(self, value: int, item):
+        """插入条目（已存在时先移除旧值）"""
+        self.remove(item)
+        self._values[item] = value
+        for table, part in zip(self._tables, self._split(value)):
+            table.setdefault(part, set()).add(item)
+
+    def remove(self, item) -> bool:
+        value = self._values.pop(item, None)
+        if value is None:
+            return False
+        for table, part in zip(self._tables, self._split(value)):
+            bucket = table.get(part)
+            if bucket is not None:
+                bucket.discard(item)
+                if not bucket:
+                    del table[part]
+        return True
+
+    def _neighbours(self, part: int, radius: int):
+        """枚举与 part 距离不超过 radius 的所有段值"""
+        yield part
+        if radius <= 0:
+            return
+        for flips in range(1, radius + 1):
+            for positions in combinations(range(self.chunk_bits), flips):
+                flipped = part
+                for position in positions:
+                    flipped ^= 1 << position
+                yield flipped
+
+    def query(self, value: int, max_distance: int) -> List[Tuple[int, object]]:
+        """返回与 value 的汉明距离不超过 max_distance 的 (距离, 条目)，按距离排序"""
+        radius = max_distance // self.chunks
+        candidates = set()
+        for table, part in zip(self._tables, self._split(value)):
+            for neighbour in self._neighbours(part, radius):
+                bucket = table.get(neighbour)
+                if bucket:
+                    candidates.update(bucket)
+        results = []
+        for item in candidates:
+            distance = hamming_distance(value, self._values[item])
+            if distance <= max_distance:
+                results.append((distance, item))
+        results.sort(key=lambda r: r[0])
+        return results
+
+
+def _to_signed(value: int) -> int:
+    """SQLite INTEGER 为有符号64位"""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def _to_unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+class DuplicateIndex:
+    """照片感知哈希索引"""
+
+    DB_FILE_NAME = "mediaflow_phash_index.db"
+    IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp',
+                        '.nef', '.nrw', '.arw', '.dng', '.cr2', '.orf', '.pef', '.rw2', '.raf')
+
+    def __init__(self, db_path: Optional[str] = None, max_workers: Optional[int] = None):
+        """
+        Args:
+            db_path: 索引数据库路径，默认位于 paths.temp_directory 下
+            max_workers: 计算哈希的进程数
+        """
+        self.logger = logging.getLogger(__name__)
+        base_dir = app_config.get('paths.temp_directory') or tempfile.gettempdir()
+        self.db_path = db_path or os.path.join(base_dir, self.DB_FILE_NAME)
+        self.max_workers = max_workers or os.cpu_count() or 4
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS image_hashes (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                dhash INTEGER NOT NULL,
+                phash INTEGER NOT NULL
+            )""")
+        self._conn.commit()
+
+        # 内存中的哈希记录和pHash多索引表
+        self._entries: Dict[str, Tuple[int, int, int, int]] = {}
+        self._table = MultiIndexHash()
+        for path, size, mtime_ns, d, p in self._conn.execute("SELECT * FROM image_hashes"):
+            entry = (size, mtime_ns, _to_unsigned(d), _to_unsigned(p))
+            self._entries[path] = entry
+            self._table.add(entry[3], path)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self) -> 'DuplicateIndex':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def scan_folders(self, folders: Iterable[str]) -> List[str]:
+        """扫描文件夹（如 MainWindow.root_paths）并索引其中的图像，返回新增/更新的路径"""
+        paths = []
+        for folder in folders:
+            for root, _, files in os.walk(folder):
+                paths.extend(os.path.join(root, f) for f in files
+                             if os.path.splitext(f)[1].lower() in self.IMAGE_EXTENSIONS)
+        return self.add_paths(paths)
+
+    def prune_missing(self) -> List[str]:
+        """从索引中删除已不存在的文件，返回被删除的路径"""
+        missing = [path for path in list(self._entries) if not os.path.exists(path)]
+        if not missing:
+            return []
+        with self._lock:
+            for path in missing:
+                self._entries.pop(path, None)
+                self._table.remove(path)
+            self._conn.executemany("DELETE FROM image_hashes WHERE path = ?", [(p,) for p in missing])
+            self._conn.commit()
+        self.logger.info(f"感知哈希索引: 移除 {len(missing)} 张已不存在的图像")
+        return missing
+
+    def add_paths(self, image_paths: Iterable[str]) -> List[str]:
+        """
+        索引图像；未变化的文件直接跳过
+
+        Returns:
+            本次新计算哈希的路径列表
+        """
+        pending = []
+        for path in (os.path.abspath(p) for p in image_paths):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entry = self._entries.get(path)
+            if entry is None or entry[:2] != (stat.st_size, stat.st_mtime_ns):
+                pending.append((path, stat.st_size, stat.st_mtime_ns))
+        if not pending:
+            return []
+
+        added, rows = [], []
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            hashes = executor.map(compute_hashes, [p[0] for p in pending],
+                                  chunksize=max(1, len(pending) // (self.max_workers * 8)))
+            for (path, size, mtime_ns), result in zip(pending, hashes):
+                if result is None:
+                    continue
+                d, p = result
+                with self._lock:
+                    self._entries[path] = (size, mtime_ns, d, p)
+                    self._table.add(p, path)
+                rows.append((path, size, mtime_ns, _to_signed(d), _to_signed(p)))
+                added.append(path)
+
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO image_hashes VALUES (?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+        self.logger.info(f"感知哈希索引: 新增/更新 {len(added)} 张，共 {len(self._entries)} 张")
+        return added
+
+    def find_similar(self, image_path: str, max_distance: int = 6) -> List[Tuple[int, str]]:
+        """
+        查找与某张图像相似的已索引图像
+
+        先按pHash在多索引表中取候选，再用dHash复核（两者都不超过阈值）。
+
+        Returns:
+            [(pHash距离, 路径)]，不含自身
+        """
+        path = os.path.abspath(image_path)
+        entry = self._entries.get(path)
+        if entry is None:
+            result = compute_hashes(path)
+            if result is None:
+                return []
+            d, p = result
+        else:
+            d, p = entry[2], entry[3]
+
+        with self._lock:
+            candidates = self._table.query(p, max_distance)
+        return [(distance, other) for distance, other in candidates
+                if other != path and hamming_distance(self._entries[other][2], d) <= max_distance]
+
+    def find_duplicate_groups(self,
+                              image_paths: Optional[Iterable[str]] = None,
+                              max_distance: int = 6) -> List[List[str]]:
+        """
+        把相似图像分组
+
+        Args:
+            image_paths: 只为这些图像查找重复（如新导入的照片）；None表示整个索引
+            max_distance: 汉明距离阈值（64位中，0为完全相同）
+
+        Returns:
+            每组至少两张图像的分组列表
+        """
+        queries = ([os.path.abspath(p) for p in image_paths] if image_paths is not None
+                   else list(self._entries))
+        parent: Dict[str, str] = {}
+
+        def find(x):
+            parent.setdefault(x, x)
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        for path in queries:
+            for _, other in self.find_similar(path, max_distance):
+                parent[find(path)] = find(other)
+
+        groups: Dict[str, List[str]] = {}
+        for path in parent:
+            groups.setdefault(find(path), []).append(path)
+        return [sorted(group) for group in groups.values() if len(group) > 1]
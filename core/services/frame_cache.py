@@ -0,0 +1,308 @@
+"""
+解码帧缓存服务
+
+按 (视频, 时间戳, 缩放比例) 缓存已解码的帧，按字节数做LRU淘汰，
+上限取 system.cache_size_mb；后台预取线程围绕当前拖动位置向前/向后解码，
+使来回拖动进度条时无需重复解码。
+"""
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from config.app_config import app_config
+
+
+FrameKey = Tuple[str, float, float]
+
+
+class FrameCache:
+    """按字节计量的LRU帧缓存（线程安全）"""
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        """
+        Args:
+            max_bytes: 缓存上限（字节），默认取 system.cache_size_mb
+        """
+        if max_bytes is None:
+            max_bytes = int(app_config.get('system.cache_size_mb', 1024)) * 1024 * 1024
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._frames: "OrderedDict[Hashable, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._frames
+
+    def get(self, key: Hashable) -> Optional[np.ndarray]:
+        """读取帧并标记为最近使用"""
+        with self._lock:
+            frame = self._frames.get(key)
+            if frame is None:
+                self.misses += 1
+                return None
+            self._frames.move_to_end(key)
+            self.hits += 1
+            return frame
+
+    def put(self, key: Hashable, frame: np.ndarray):
+        """写入帧，超出预算时淘汰最久未使用的帧"""
+        size = frame.nbytes
+        if size > self.max_bytes:
+            return
+        # 缓存中的帧会被多个线程读取，禁止就地修改
+        frame.setflags(write=False)
+        with self._lock:
+            old = self._frames.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old.nbytes
+            self._frames[key] = frame
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._frames.popitem(last=False)
+                self.current_bytes -= evicted.nbytes
+
+    def discard_video(self, video_path: str):
+        """移除某个视频的所有帧"""
+        with self._lock:
+            for key in [k for k in self._frames if k[0] == video_path]:
+                self.current_bytes -= self._frames.pop(key).nbytes
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._frames.clear()
+            self.current_bytes = 0
+
+    def get_stats(self) -> Dict[str, float]:
+        """缓存统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'frames': len(self._frames),
+                'used_mb': self.current_bytes / (1024 * 1024),
+                'max_mb': self.max_bytes / (1024 * 1024),
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+
+class _FrameDecoder:
+    """单个视频的顺序解码器（OpenCV），仅在一个线程中使用"""
+
+    def __init__(self, video_path: str):
+        self.video_path = video_path
+        self.cap = cv2.VideoCapture(video_path)
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.next_index = 0
+
+    def read(self, index: int) -> Optional[np.ndarray]:
+        """读取指定帧；连续读取时不做seek"""
+        if index != self.next_index:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+        ret, frame = self.cap.read()
+        self.next_index = index + 1 if ret else -1
+        return frame if ret else None
+
+    def skip(self, index: int) -> bool:
+        """越过指定帧（只解码不取出图像），保持顺序读取的位置"""
+        if index != self.next_index:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+        ret = self.cap.grab()
+        self.next_index = index + 1 if ret else -1
+        return ret
+
+    def release(self):
+        self.cap.release()
+
+
+class FramePrefetcher:
+    """
+    围绕当前播放位置预取多个视频（如原始/处理后）的帧
+
+    用法:
+        prefetcher = FramePrefetcher()
+        prefetcher.set_sources(original_path, processed_path)
+        frames = prefetcher.seek(12.5)   # 返回各视频在该时间点的帧
+    """
+
+    def __init__(self,
+                 cache: Optional[FrameCache] = None,
+                 ahead: Optional[int] = None,
+                 behind: Optional[int] = None,
+                 scale: float = 1.0):
+        """
+        Args:
+            cache: 帧缓存，默认新建
+            ahead: 向后预取帧数，默认为 ui.frame_cache_size 的一半
+            behind: 向前预取帧数，默认为 ui.frame_cache_size 的一半
+            scale: 解码后的缩放比例
+        """
+        self.logger = logging.getLogger(__name__)
+        window = int(app_config.get('ui.frame_cache_size', 50))
+        self.cache = cache or FrameCache()
+        self.ahead = window // 2 if ahead is None else ahead
+        self.behind = window - window // 2 if behind is None else behind
+        self.scale = scale
+
+        self.sources: List[str] = []
+        self.fps = 30.0
+        self.frame_count = 0
+        # 每个视频自己的帧率和帧数（帧率不同的两个视频按时间戳对齐）
+        self._fps: Dict[str, float] = {}
+        self._frame_counts: Dict[str, int] = {}
+        self._foreground: Dict[str, _FrameDecoder] = {}
+        self._position = 0
+        self._generation = 0
+        self._stopped = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._prefetch_loop, daemon=True,
+                                        name="frame-prefetch")
+        self._thread.start()
+
+    def set_sources(self, *video_paths: str):
+        """设置要同步预取的视频"""
+        with self._condition:
+            self._release_decoders(self._foreground)
+            self.sources = [p for p in video_paths if p]
+            for path in self.sources:
+                decoder = self._foreground[path] = _FrameDecoder(path)
+                self._fps[path] = decoder.fps
+                self._frame_counts[path] = decoder.frame_count
+            if self.sources:
+                first = self._foreground[self.sources[0]]
+                self.fps = first.fps
+                self.frame_count = first.frame_count
+            self._position = 0
+            self._generation += 1
+            self._condition.notify()
+
+    def seek(self, timestamp: float) -> List[Optional[np.ndarray]]:
+        """
+        跳转到指定时间点
+
+        Returns:
+            各视频在该时间点的帧（与 set_sources 的顺序一致）
+        """
+        with self._condition:
+            self._position = self._index_for(timestamp)
+            self._generation += 1
+            self._condition.notify()
+        return [self.get_frame(path, self._index_for(timestamp, path)) for path in list(self.sources)]
+
+    def get_frame(self, video_path: str, index: int) -> Optional[np.ndarray]:
+        """读取帧（index 为该视频自己的帧序号）：命中缓存直接返回，否则同步解码并写入缓存"""
+        key = self._key(video_path, index)
+        frame = self.cache.get(key)
+        if frame is not None:
+            return frame
+        decoder = self._foreground.get(video_path)
+        if decoder is None:
+            return None
+        frame = decoder.read(index)
+        if frame is not None:
+            frame = self._resize(frame)
+            self.cache.put(key, frame)
+        return frame
+
+    def stop(self):
+        """停止预取线程并释放解码器"""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._thread.join()
+        self._release_decoders(self._foreground)
+
+    def _index_for(self, timestamp: float, video_path: Optional[str] = None) -> int:
+        """时间戳对应的帧序号；不指定视频时按第一个视频计算"""
+        fps = self._fps.get(video_path, self.fps)
+        frame_count = self._frame_counts.get(video_path, self.frame_count)
+        index = int(round(timestamp * fps))
+        if frame_count > 0:
+            index = min(index, frame_count - 1)
+        return max(0, index)
+
+    def _key(self, video_path: str, index: int) -> FrameKey:
+        """缓存键：(视频, 按该视频帧率对齐后的时间戳, 缩放比例)"""
+        return (video_path, round(index / self._fps.get(video_path, self.fps), 3), self.scale)
+
+    def _resize(self, frame: np.ndarray) -> np.ndarray:
+        if self.scale == 1.0:
+            return frame
+        return cv2.resize(frame, None, fx=self.scale, fy=self.scale,
+                          interpolation=cv2.INTER_AREA)
+
+    def _window(self, position: int, frame_count: int) -> List[Tuple[int, int]]:
+        """预取顺序：先向后连续解码，再回到前方区间连续解码"""
+        last = position + self.ahead
+        if frame_count > 0:
+            last = min(last, frame_count - 1)
+        first = max(0, position - self.behind)
+        return [(position, last), (first, position - 1)]
+
+    def _prefetch_range(self, path: str, decoder: _FrameDecoder, start: int, end: int, generation: int):
+        """
+        从第一个未缓存的帧起顺序解码到最后一个未缓存的帧
+
+        中间已缓存的帧只越过、不重复存储；逐帧跳过会导致每个空缺都seek一次。
+        """
+        missing = [index for index in range(start, end + 1) if self._key(path, index) not in self.cache]
+        if not missing:
+            return
+        for index in range(missing[0], missing[-1] + 1):
+            if self._generation != generation or self._stopped:
+                return
+            key = self._key(path, index)
+            if key in self.cache:
+                if not decoder.skip(index):
+                    return
+                continue
+            frame = decoder.read(index)
+            if frame is None:
+                return
+            self.cache.put(key, self._resize(frame))
+
+    def _prefetch_loop(self):
+        """后台预取线程"""
+        decoders: Dict[str, _FrameDecoder] = {}
+        generation = -1
+        while True:
+            with self._condition:
+                while not self._stopped and self._generation == generation:
+                    self._condition.wait()
+                if self._stopped:
+                    break
+                generation = self._generation
+                position = self._position
+                sources = list(self.sources)
+
+            for path in list(decoders):
+                if path not in sources:
+                    decoders.pop(path).release()
+            timestamp = position / self.fps
+            try:
+                for window in range(2):
+                    for path in sources:
+                        decoder = decoders.get(path) or decoders.setdefault(path, _FrameDecoder(path))
+                        own_position = self._index_for(timestamp, path)
+                        start, end = self._window(own_position, self._frame_counts.get(path, 0))[window]
+                        self._prefetch_range(path, decoder, start, end, generation)
+            except Exception as e:
+                self.logger.error(f"预取帧失败: {e}")
+
+        self._release_decoders(decoders)
+
+    @staticmethod
+    def _release_decoders(decoders: Dict[str, _FrameDecoder]):
+        for decoder in decoders.values():
+            decoder.release()
+        decoders.clear()
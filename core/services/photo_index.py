@@ -0,0 +1,194 @@
+"""
+照片元数据索引
+
+在线程池中批量读取照片文件头（见 core.engine.exif_reader），
+把拍摄时间、相机型号、尺寸和方向按 (路径, 大小, 修改时间) 缓存到 SQLite，
+再次扫描时只读取新增或变化的文件。无法解析的文件（如不含元数据的PNG/HEIC）
+同样按 (路径, 大小, 修改时间) 记录，未变化时不再重复读取。
+"""
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from config.app_config import app_config
+from core.engine.exif_reader import PhotoMetadata, read_photo_metadata
+
+
+class PhotoMetadataIndex:
+    """照片元数据索引（线程安全）"""
+
+    DB_FILE_NAME = "mediaflow_photo_index.db"
+    BATCH_SIZE = 500
+
+    def __init__(self, db_path: Optional[str] = None, max_workers: Optional[int] = None):
+        """
+        Args:
+            db_path: 索引数据库路径，默认位于 paths.temp_directory 下
+            max_workers: 读取文件头的线程数（I/O密集，可高于CPU核数）
+        """
+        self.logger = logging.getLogger(__name__)
+        base_dir = app_config.get('paths.temp_directory') or tempfile.gettempdir()
+        self.db_path = db_path or os.path.join(base_dir, self.DB_FILE_NAME)
+        self.max_workers = max_workers or min(32, (os.cpu_count() or 4) * 4)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS photos (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                width INTEGER,
+                height INTEGER,
+                orientation INTEGER,
+                capture_time TEXT,
+                camera_make TEXT,
+                camera_model TEXT
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_photos_capture ON photos(capture_time)")
+        # 无法解析的文件（负缓存）
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS unparsed (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL
+            )""")
+        self._conn.commit()
+
+    def close(self):
+        """关闭数据库"""
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self) -> 'PhotoMetadataIndex':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def get(self, photo_path: str) -> Optional[PhotoMetadata]:
+        """获取单个照片的元数据（索引过期时重新读取）"""
+        return self.scan([photo_path]).get(os.path.abspath(photo_path))
+
+    def scan(self, photo_paths: Iterable[str]) -> Dict[str, PhotoMetadata]:
+        """
+        批量获取元数据
+
+        Args:
+            photo_paths: 照片路径
+
+        Returns:
+            {绝对路径: 元数据}；无法解析的文件不在结果中
+        """
+        paths = [os.path.abspath(p) for p in photo_paths]
+        results: Dict[str, PhotoMetadata] = {}
+        if not paths:
+            return results
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            stats = dict(zip(paths, executor.map(self._stat, paths)))
+            cached = self._load_rows(paths)
+
+            stale = []
+            for path in paths:
+                stat = stats[path]
+                if stat is None:
+                    continue
+                row = cached.get(path)
+                if row is not None and row[0] == stat[0] and row[1] == stat[1]:
+                    if row[2] is not None:
+                        results[path] = row[2]
+                else:
+                    stale.append(path)
+
+            batch, unparsed = [], []
+            for path, meta in zip(stale, executor.map(read_photo_metadata, stale)):
+                if meta is None:
+                    unparsed.append((path, *stats[path]))
+                    continue
+                results[path] = meta
+                batch.append((path, *stats[path], meta.width, meta.height, meta.orientation,
+                              meta.capture_time.isoformat() if meta.capture_time else None,
+                              meta.camera_make, meta.camera_model))
+                if len(batch) >= self.BATCH_SIZE:
+                    self._store_rows(batch)
+                    batch = []
+            self._store_rows(batch)
+            self._store_unparsed(unparsed)
+
+        if stale:
+            self.logger.info(f"照片元数据索引: {len(paths)} 个文件，读取 {len(stale)} 个")
+        return results
+
+    def find_by_capture_time(self, start: datetime, end: datetime) -> List[Tuple[str, datetime]]:
+        """查询拍摄时间在 [start, end) 内的照片，按时间排序"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, capture_time FROM photos "
+                "WHERE capture_time >= ? AND capture_time < ? ORDER BY capture_time",
+                (start.isoformat(), end.isoformat())).fetchall()
+        return [(path, datetime.fromisoformat(value)) for path, value in rows]
+
+    def remove_missing(self) -> int:
+        """删除索引中已不存在的文件，返回删除数量"""
+        with self._lock:
+            paths = [row[0] for row in self._conn.execute("SELECT path FROM photos")]
+        missing = [(p,) for p in paths if not os.path.exists(p)]
+        with self._lock:
+            self._conn.executemany("DELETE FROM photos WHERE path = ?", missing)
+            unparsed = [row[0] for row in self._conn.execute("SELECT path FROM unparsed")]
+            self._conn.executemany("DELETE FROM unparsed WHERE path = ?",
+                                   [(p,) for p in unparsed if not os.path.exists(p)])
+            self._conn.commit()
+        return len(missing)
+
+    @staticmethod
+    def _stat(path: str) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(path)
+            return stat.st_size, stat.st_mtime_ns
+        except OSError:
+            return None
+
+    def _load_rows(self, paths: List[str]) -> Dict[str, tuple]:
+        """按块查询已索引的记录；无法解析的文件对应的元数据为None"""
+        rows = {}
+        with self._lock:
+            for i in range(0, len(paths), self.BATCH_SIZE):
+                chunk = paths[i:i + self.BATCH_SIZE]
+                placeholders = ",".join("?" * len(chunk))
+                for path, size, mtime_ns in self._conn.execute(
+                        f"SELECT * FROM unparsed WHERE path IN ({placeholders})", chunk):
+                    rows[path] = (size, mtime_ns, None)
+                for (path, size, mtime_ns, width, height, orientation,
+                     capture_time, make, model) in self._conn.execute(
+                        f"SELECT * FROM photos WHERE path IN ({placeholders})", chunk):
+                    meta = PhotoMetadata(
+                        width=width, height=height, orientation=orientation or 1,
+                        capture_time=datetime.fromisoformat(capture_time) if capture_time else None,
+                        camera_make=make or "", camera_model=model or "")
+                    rows[path] = (size, mtime_ns, meta)
+        return rows
+
+    def _store_rows(self, rows: List[tuple]):
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO photos VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self._conn.executemany("DELETE FROM unparsed WHERE path = ?", [(row[0],) for row in rows])
+            self._conn.commit()
+
+    def _store_unparsed(self, rows: List[tuple]):
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO unparsed VALUES (?, ?, ?)", rows)
+            self._conn.executemany("DELETE FROM photos WHERE path = ?", [(row[0],) for row in rows])
+            self._conn.commit()
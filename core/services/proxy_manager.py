@@ -0,0 +1,207 @@
+"""
+低分辨率代理文件管理
+
+为大分辨率源（如8K修复素材）在后台生成全帧内编码（GOP=1）的低分辨率代理，
+任意帧都可直接解码，用于拖动预览、对比和抽帧；最终质量指标仍使用原文件。
+代理保存在 paths.temp_directory 下，并按 (源路径, 大小, 修改时间) 记录映射。
+"""
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from PySide6.QtCore import QObject, Signal
+
+from config.app_config import app_config
+from core.engine.luma_decoder import probe_video_size
+
+
+class ProxyManager(QObject):
+    """代理文件生成与映射"""
+
+    proxy_ready = Signal(str, str)    # 源路径, 代理路径
+    proxy_failed = Signal(str, str)   # 源路径, 错误信息
+
+    MAP_FILE_NAME = "proxies.json"
+    CODECS = {
+        # 编码器参数, 容器扩展名
+        'h264': (['-c:v', 'libx264', '-preset', 'veryfast', '-tune', 'fastdecode',
+                  '-crf', '20', '-g', '1', '-bf', '0', '-pix_fmt', 'yuv420p'], '.mp4'),
+        'mjpeg': (['-c:v', 'mjpeg', '-q:v', '4', '-pix_fmt', 'yuvj420p'], '.avi'),
+    }
+
+    def __init__(self,
+                 proxy_dir: Optional[str] = None,
+                 max_width: int = 960,
+                 codec: str = 'h264',
+                 max_workers: int = 1):
+        """
+        Args:
+            proxy_dir: 代理目录，默认位于 paths.temp_directory 下
+            max_width: 代理宽度上限，宽度不超过它的源不生成代理
+            codec: 代理编码，h264（GOP=1）或 mjpeg
+            max_workers: 同时生成的代理数
+        """
+        super().__init__()
+        if codec not in self.CODECS:
+            raise ValueError(f"不支持的代理编码: {codec}")
+        self.logger = logging.getLogger(__name__)
+        base_dir = app_config.get('paths.temp_directory') or tempfile.gettempdir()
+        self.proxy_dir = proxy_dir or os.path.join(base_dir, 'mediaflow_proxies')
+        os.makedirs(self.proxy_dir, exist_ok=True)
+        self.map_file = os.path.join(self.proxy_dir, self.MAP_FILE_NAME)
+
+        self.max_width = max_width
+        self.codec = codec
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix="proxy")
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._proxies: Dict[str, Dict[str, Any]] = self._load_map()
+
+    def get_proxy(self, source_path: str) -> Optional[str]:
+        """返回与当前源文件匹配的已生成代理，没有则返回None"""
+        source_path = os.path.abspath(source_path)
+        with self._lock:
+            entry = self._proxies.get(source_path)
+        if not entry or entry.get('signature') != self._signature(source_path):
+            return None
+        proxy_path = entry.get('proxy')
+        return proxy_path if proxy_path and os.path.exists(proxy_path) else None
+
+    def resolve(self, source_path: str, generate: bool = True) -> str:
+        """
+        交互场景下应使用的文件：有代理用代理，否则用原文件
+
+        Args:
+            source_path: 源视频
+            generate: 代理不存在且需要时是否在后台生成
+
+        Returns:
+            代理路径或源路径
+        """
+        proxy_path = self.get_proxy(source_path)
+        if proxy_path:
+            return proxy_path
+        if generate and self.needs_proxy(source_path):
+            self.request(source_path)
+        return source_path
+
+    def needs_proxy(self, source_path: str) -> bool:
+        """源宽度超过代理宽度时才需要代理"""
+        size = probe_video_size(source_path)
+        return size is not None and size[0] > self.max_width
+
+    def request(self, source_path: str) -> Optional[Future]:
+        """在后台生成代理（已在生成中时复用同一任务）"""
+        source_path = os.path.abspath(source_path)
+        with self._lock:
+            future = self._pending.get(source_path)
+            if future is not None:
+                return future
+            future = self._executor.submit(self._generate, source_path)
+            self._pending[source_path] = future
+        # 锁外挂接回调：任务已结束时 add_done_callback 会同步调用 _on_done
+        future.add_done_callback(lambda _f, path=source_path: self._on_done(path, _f))
+        return future
+
+    def remove(self, source_path: str):
+        """删除某个源的代理"""
+        source_path = os.path.abspath(source_path)
+        with self._lock:
+            entry = self._proxies.pop(source_path, None)
+            self._save_map()
+        if entry and os.path.exists(entry.get('proxy', '')):
+            os.remove(entry['proxy'])
+
+    def shutdown(self):
+        """停止后台生成"""
+        with self._lock:
+            futures = list(self._pending.values())
+            self._pending.clear()
+        for future in futures:
+            future.cancel()
+        self._executor.shutdown(wait=False)
+
+    def _on_done(self, source_path: str, future: Future):
+        with self._lock:
+            if self._pending.get(source_path) is future:
+                del self._pending[source_path]
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            self.logger.warning(f"生成代理失败 {source_path}: {error}")
+            self.proxy_failed.emit(source_path, str(error))
+        else:
+            self.proxy_ready.emit(source_path, future.result())
+
+    def _generate(self, source_path: str) -> str:
+        """用FFmpeg生成全帧内编码的低分辨率代理"""
+        existing = self.get_proxy(source_path)
+        if existing:
+            return existing
+
+        signature = self._signature(source_path)
+        encode_args, ext = self.CODECS[self.codec]
+        name = os.path.splitext(os.path.basename(source_path))[0]
+        digest = hashlib.blake2b(f"{source_path}|{signature}".encode('utf-8'),
+                                 digest_size=8).hexdigest()
+        proxy_path = os.path.join(self.proxy_dir, f"{name}_{digest}_proxy{ext}")
+        tmp_path = f"{proxy_path}.tmp{ext}"
+
+        # 保持原帧率和时间戳，代理上的时间点与源一一对应
+        cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-nostdin',
+               '-i', source_path, '-map', '0:v:0',
+               '-vf', f"scale='min({self.max_width},iw)':-2:flags=area",
+               *encode_args, '-an', '-y', tmp_path]
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True,
+                                    encoding='utf-8', errors='ignore')
+            if result.returncode != 0:
+                raise RuntimeError(result.stderr.strip() or f"FFmpeg退出码 {result.returncode}")
+            os.replace(tmp_path, proxy_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        with self._lock:
+            old = self._proxies.get(source_path)
+            self._proxies[source_path] = {'proxy': proxy_path, 'signature': signature,
+                                          'codec': self.codec, 'max_width': self.max_width}
+            self._save_map()
+        if old and old.get('proxy') != proxy_path and os.path.exists(old.get('proxy', '')):
+            os.remove(old['proxy'])
+        self.logger.info(f"代理已生成: {source_path} -> {proxy_path}")
+        return proxy_path
+
+    @staticmethod
+    def _signature(source_path: str) -> Optional[str]:
+        try:
+            stat = os.stat(source_path)
+        except OSError:
+            return None
+        return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+    def _load_map(self) -> Dict[str, Dict[str, Any]]:
+        """加载源 -> 代理映射"""
+        if os.path.exists(self.map_file):
+            try:
+                with open(self.map_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except Exception as e:
+                self.logger.warning(f"加载代理映射失败: {e}")
+        return {}
+
+    def _save_map(self):
+        """保存映射（调用方持有锁）"""
+        try:
+            with open(self.map_file, 'w', encoding='utf-8') as f:
+                json.dump(self._proxies, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            self.logger.warning(f"保存代理映射失败: {e}")
@@ -0,0 +1,275 @@
+"""
+目标质量编码服务
+
+给定目标质量（SSIM/PSNR/VMAF），在若干采样片段上二分搜索CRF，
+选出满足质量要求的最大CRF（即最小输出），缓存结果后只做一次完整编码。
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Tuple, Union
+
+import ffmpeg
+
+from config.app_config import app_config
+from core.engine.codec_engine import CodecEngine, EncodeResult
+from core.engine.media_probe import probe_video
+from core.engine.quality_analyzer import QualityAnalyzer
+from core.models.media_task import EncodeConfig
+
+
+@dataclass
+class TargetQualityResult:
+    """目标质量搜索结果"""
+    crf: int                                   # 选定的CRF
+    score: Optional[float] = None              # 选定CRF在采样片段上的质量
+    metric: str = "ssim"                       # 使用的质量指标
+    probes: Dict[int, float] = field(default_factory=dict)  # 已探测的CRF -> 质量
+    from_cache: bool = False                   # 是否来自缓存
+
+
+class TargetQualityEncoder:
+    """按目标质量自动选择CRF的编码器"""
+
+    SUPPORTED_METRICS = ('ssim', 'psnr', 'vmaf')
+    CACHE_FILE_NAME = "mediaflow_crf_cache.json"
+
+    def __init__(self,
+                 codec_engine: Optional[CodecEngine] = None,
+                 quality_analyzer: Optional[QualityAnalyzer] = None,
+                 cache_file: Optional[str] = None,
+                 max_workers: Optional[int] = None):
+        self.logger = logging.getLogger(__name__)
+        self.codec_engine = codec_engine or CodecEngine()
+        self.quality_analyzer = quality_analyzer or QualityAnalyzer()
+        self.work_dir = app_config.get('paths.temp_directory') or tempfile.gettempdir()
+        self.cache_file = cache_file or os.path.join(self.work_dir, self.CACHE_FILE_NAME)
+        self.max_workers = max_workers or app_config.get('system.max_concurrent_tasks', 4)
+        self._cache_lock = threading.Lock()
+        self._cache = self._load_cache()
+
+    def encode(self,
+               input_path: str,
+               output_path: str,
+               config: Union[EncodeConfig, Dict[str, Any]]) -> EncodeResult:
+        """
+        编码视频；若配置了target_quality则先搜索CRF再完整编码一次
+
+        Args:
+            input_path: 输入视频
+            output_path: 输出视频
+            config: 编码配置（EncodeConfig或字典）
+
+        Returns:
+            编码结果
+        """
+        config_dict = config.to_dict() if isinstance(config, EncodeConfig) else dict(config)
+        target = config_dict.get('target_quality')
+        if target is not None:
+            search = self.find_crf(input_path, config_dict, target,
+                                   config_dict.get('target_metric', 'ssim'))
+            self.logger.info(f"目标质量 {search.metric}>={target}: 选定CRF {search.crf}"
+                             f"{'（缓存）' if search.from_cache else ''}")
+            config_dict['crf'] = search.crf
+            config_dict['bitrate'] = None
+        return self.codec_engine.compress_video(input_path, output_path, config_dict)
+
+    def find_crf(self,
+                 input_path: str,
+                 config: Union[EncodeConfig, Dict[str, Any]],
+                 target: float,
+                 metric: str = "ssim",
+                 crf_range: Tuple[int, int] = (18, 40),
+                 sample_count: int = 4,
+                 segment_duration: float = 2.0,
+                 aggregate: str = "min") -> TargetQualityResult:
+        """
+        在采样片段上二分搜索满足目标质量的最大CRF
+
+        Args:
+            input_path: 输入视频
+            config: 编码配置，crf与bitrate会被忽略
+            target: 目标质量值（如SSIM 0.95、PSNR 40、VMAF 93）
+            metric: 质量指标，ssim/psnr/vmaf
+            crf_range: CRF搜索区间（闭区间）
+            sample_count: 采样片段数
+            segment_duration: 每个片段的时长（秒）
+            aggregate: 片段得分汇总方式，min（保守）或mean
+
+        Returns:
+            搜索结果；没有CRF满足目标时返回区间下界
+        """
+        metric = metric.lower()
+        if metric not in self.SUPPORTED_METRICS:
+            raise ValueError(f"不支持的质量指标: {metric}")
+
+        config_dict = config.to_dict() if isinstance(config, EncodeConfig) else dict(config)
+        config_dict['bitrate'] = None
+        config_dict.pop('target_quality', None)
+        config_dict.pop('target_metric', None)
+
+        cache_key = self._cache_key(input_path, config_dict, target, metric, crf_range,
+                                    sample_count, segment_duration, aggregate)
+        with self._cache_lock:
+            cached = self._cache.get(cache_key)
+        if cached:
+            return TargetQualityResult(crf=cached['crf'], score=cached.get('score'),
+                                       metric=metric, from_cache=True)
+
+        lo, hi = crf_range
+        best_crf, best_score = lo, None
+        probes: Dict[int, float] = {}
+
+        with tempfile.TemporaryDirectory(prefix="mediaflow_crf_", dir=self.work_dir) as tmp_dir:
+            segments = self._extract_reference_segments(input_path, tmp_dir,
+                                                        sample_count, segment_duration)
+            if not segments:
+                self.logger.warning(f"无法采样片段，使用默认CRF: {input_path}")
+                return TargetQualityResult(crf=config_dict.get('crf', 23), metric=metric)
+
+            # CRF越大输出越小、质量越低，寻找满足目标的最大CRF
+            while lo <= hi:
+                crf = (lo + hi) // 2
+                score = self._probe(segments, tmp_dir, config_dict, crf, metric, aggregate)
+                if score is not None:
+                    probes[crf] = score = float(score)
+                self.logger.debug(f"CRF {crf}: {metric}={score}")
+                if score is not None and score >= target:
+                    best_crf, best_score = crf, score
+                    lo = crf + 1
+                else:
+                    hi = crf - 1
+
+        if best_score is None:
+            self.logger.warning(f"区间内没有CRF达到 {metric}>={target}，使用CRF {best_crf}")
+
+        result = TargetQualityResult(crf=best_crf, score=best_score, metric=metric, probes=probes)
+        self._store_cache(cache_key, result)
+        return result
+
+    def _probe(self,
+               segments: List[str],
+               tmp_dir: str,
+               config: Dict[str, Any],
+               crf: int,
+               metric: str,
+               aggregate: str) -> Optional[float]:
+        """以指定CRF并行编码所有片段并评分"""
+        workers = min(self.max_workers, len(segments))
+        vmaf_threads = max(1, (os.cpu_count() or 1) // workers)
+
+        def encode_and_score(index_segment):
+            index, segment = index_segment
+            out_path = os.path.join(tmp_dir, f"probe_{crf}_{index}.mp4")
+            result = self.codec_engine.compress_video(segment, out_path, dict(config, crf=crf))
+            if not result.success:
+                return None
+            try:
+                if metric == 'vmaf':
+                    # VMAF直接走libvmaf，线程数在并行片段之间分摊
+                    vmaf = self.quality_analyzer.compute_vmaf(segment, out_path,
+                                                              n_threads=vmaf_threads)
+                    return vmaf.mean if vmaf else None
+                metrics = self.quality_analyzer.compare_videos(segment, out_path)
+                return getattr(metrics, metric)
+            finally:
+                if os.path.exists(out_path):
+                    os.remove(out_path)
+
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            scores = list(ex.map(encode_and_score, enumerate(segments)))
+
+        if any(score is None for score in scores):
+            return None
+        if aggregate == "mean":
+            return sum(scores) / len(scores)
+        return min(scores)
+
+    def _extract_reference_segments(self,
+                                     input_path: str,
+                                     tmp_dir: str,
+                                     sample_count: int,
+                                     segment_duration: float) -> List[str]:
+        """均匀截取若干片段并无损保存（FFV1/NUT，保持原时间戳精度），作为评分参考"""
+        duration = self._get_duration(input_path)
+        if not duration:
+            return []
+
+        segment_duration = min(segment_duration, duration)
+        sample_count = max(1, min(sample_count, int(duration // segment_duration)))
+        step = duration / sample_count
+
+        segments = []
+        for i in range(sample_count):
+            start = i * step + max(0.0, (step - segment_duration) / 2)
+            seg_path = os.path.join(tmp_dir, f"ref_{i}.nut")
+            try:
+                stream = ffmpeg.input(input_path, ss=start, t=segment_duration)
+                stream = ffmpeg.output(stream, seg_path, vcodec='ffv1', an=None)
+                ffmpeg.run(stream, overwrite_output=True, quiet=True)
+                segments.append(seg_path)
+            except Exception as e:
+                self.logger.warning(f"截取片段失败 ({start:.1f}s): {e}")
+        return segments
+
+    def _get_duration(self, input_path: str) -> Optional[float]:
+        """获取视频时长（秒）"""
+        info = probe_video(input_path)
+        if info is None or not info.duration:
+            self.logger.error(f"获取视频时长失败: {input_path}")
+            return None
+        return info.duration
+
+    def _source_fingerprint(self, input_path: str) -> str:
+        """根据大小、修改时间和首尾数据计算源文件指纹"""
+        stat = os.stat(input_path)
+        digest = hashlib.blake2b(f"{stat.st_size}:{stat.st_mtime_ns}".encode(), digest_size=16)
+        chunk = 64 * 1024
+        with open(input_path, 'rb') as f:
+            digest.update(f.read(chunk))
+            if stat.st_size > chunk:
+                f.seek(max(chunk, stat.st_size - chunk))
+                digest.update(f.read(chunk))
+        return digest.hexdigest()
+
+    def _cache_key(self,
+                   input_path: str,
+                   config: Dict[str, Any],
+                   target: float,
+                   metric: str,
+                   crf_range: Tuple[int, int],
+                   sample_count: int,
+                   segment_duration: float,
+                   aggregate: str) -> str:
+        """缓存键：源指纹 + 影响结果的编码参数和采样方式"""
+        params = {k: config.get(k) for k in ('codec', 'preset', 'resolution',
+                                             'framerate', 'hardware_acceleration')}
+        params.update(target=target, metric=metric, crf_range=list(crf_range),
+                      sample_count=sample_count, segment_duration=segment_duration,
+                      aggregate=aggregate)
+        return f"{self._source_fingerprint(input_path)}:{json.dumps(params, sort_keys=True)}"
+
+    def _load_cache(self) -> Dict[str, Any]:
+        """加载CRF缓存"""
+        if os.path.exists(self.cache_file):
+            try:
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except Exception as e:
+                self.logger.warning(f"加载CRF缓存失败: {e}")
+        return {}
+
+    def _store_cache(self, cache_key: str, result: TargetQualityResult):
+        """写入CRF缓存"""
+        with self._cache_lock:
+            self._cache[cache_key] = {'crf': result.crf, 'score': result.score}
+            try:
+                with open(self.cache_file, 'w', encoding='utf-8') as f:
+                    json.dump(self._cache, f, ensure_ascii=False, indent=2)
+            except Exception as e:
+                self.logger.warning(f"保存CRF缓存失败: {e}")
@@ -0,0 +1,203 @@
+"""
+视频缩略图/联系表服务
+
+每个视频只运行一次FFmpeg（仅解码关键帧，fps + scale + tile 滤镜）生成联系表，
+结果按 (路径, 大小, 修改时间) 缓存到磁盘，在有界线程池中后台生成并支持预取。
+"""
+import hashlib
+import logging
+import os
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterable, Optional
+
+from PySide6.QtCore import QObject, Signal
+
+from config.app_config import app_config
+from core.engine.media_probe import probe_video
+
+
+class ThumbnailService(QObject):
+    """视频联系表生成与缓存服务"""
+
+    thumbnail_ready = Signal(str, str)   # 视频路径, 联系表图片路径
+    thumbnail_failed = Signal(str, str)  # 视频路径, 错误信息
+
+    VIDEO_EXTENSIONS = {'.mp4', '.mov', '.avi', '.mkv', '.wmv', '.flv', '.webm',
+                        '.m4v', '.mpg', '.mpeg', '.3gp', '.ts', '.mts'}
+
+    def __init__(self,
+                 cache_dir: Optional[str] = None,
+                 max_workers: int = 2,
+                 max_pending: int = 16,
+                 columns: int = 4,
+                 rows: int = 3,
+                 tile_width: int = 240):
+        """
+        Args:
+            cache_dir: 缓存目录，默认位于 paths.temp_directory 下
+            max_workers: 同时运行的FFmpeg进程数
+            max_pending: 预取队列上限，超出的预取请求直接丢弃
+            columns: 联系表列数
+            rows: 联系表行数
+            tile_width: 每个缩略图的宽度（像素）
+        """
+        super().__init__()
+        self.logger = logging.getLogger(__name__)
+        base_dir = app_config.get('paths.temp_directory') or tempfile.gettempdir()
+        self.cache_dir = cache_dir or os.path.join(base_dir, 'mediaflow_thumbnails')
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        self.columns = columns
+        self.rows = rows
+        self.tile_width = tile_width
+        self.max_pending = max_pending
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix="thumbnail")
+        self._pending: Dict[str, Future] = {}
+        self._prefetch_paths = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def is_video(cls, path: str) -> bool:
+        """是否为支持的视频文件"""
+        return os.path.splitext(path)[1].lower() in cls.VIDEO_EXTENSIONS
+
+    def cached_path(self, video_path: str) -> Optional[str]:
+        """返回已缓存的联系表路径，未缓存或源文件已变化时返回None"""
+        sheet_path = self._sheet_path(video_path)
+        if sheet_path and os.path.exists(sheet_path):
+            return sheet_path
+        return None
+
+    def request(self, video_path: str) -> Optional[str]:
+        """
+        请求联系表（前台）
+
+        已缓存时立即返回路径；否则取消尚未开始的预取任务，优先排队生成，
+        完成后通过 thumbnail_ready 信号通知并返回None。
+        """
+        cached = self.cached_path(video_path)
+        if cached:
+            return cached
+
+        # cancel()/add_done_callback() 可能同步触发 _on_done，必须在锁外调用
+        future = None
+        with self._lock:
+            # 为前台请求让路：撤销还没开始的预取
+            stale = [(path, self._pending.pop(path)) for path in self._prefetch_paths
+                     if path != video_path and path in self._pending]
+            self._prefetch_paths.clear()
+            if video_path not in self._pending:
+                future = self._submit(video_path)
+        running = [(path, f) for path, f in stale if not f.cancel()]
+        if running:
+            # 已开始生成的预取保留登记，避免重复提交
+            with self._lock:
+                for path, running_future in running:
+                    if not running_future.done():
+                        self._pending.setdefault(path, running_future)
+        if future is not None:
+            self._watch(video_path, future)
+        return None
+
+    def prefetch(self, video_paths: Iterable[str]):
+        """后台预取一组视频的联系表（如树视图中相邻的文件）"""
+        for video_path in video_paths:
+            if not self.is_video(video_path) or self.cached_path(video_path):
+                continue
+            with self._lock:
+                if video_path in self._pending or len(self._pending) >= self.max_pending:
+                    continue
+                self._prefetch_paths.add(video_path)
+                future = self._submit(video_path)
+            self._watch(video_path, future)
+
+    def shutdown(self):
+        """停止后台生成"""
+        with self._lock:
+            futures = list(self._pending.values())
+            self._pending.clear()
+            self._prefetch_paths.clear()
+        for future in futures:
+            future.cancel()
+        self._executor.shutdown(wait=False)
+
+    def _submit(self, video_path: str) -> Future:
+        """提交生成任务（调用方持有锁，返回后需在锁外调用 _watch）"""
+        future = self._executor.submit(self._generate, video_path)
+        self._pending[video_path] = future
+        return future
+
+    def _watch(self, video_path: str, future: Future):
+        """挂接完成回调（不得持有锁：已完成的任务会同步回调 _on_done）"""
+        future.add_done_callback(lambda _f, path=video_path: self._on_done(path, _f))
+
+    def _on_done(self, video_path: str, future: Future):
+        """生成任务结束"""
+        with self._lock:
+            if self._pending.get(video_path) is future:
+                del self._pending[video_path]
+            self._prefetch_paths.discard(video_path)
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            self.logger.warning(f"生成联系表失败 {video_path}: {error}")
+            self.thumbnail_failed.emit(video_path, str(error))
+        else:
+            self.thumbnail_ready.emit(video_path, future.result())
+
+    def _sheet_path(self, video_path: str) -> Optional[str]:
+        """缓存键：(绝对路径, 大小, 修改时间) 以及联系表布局"""
+        try:
+            stat = os.stat(video_path)
+        except OSError:
+            return None
+        key = (f"{os.path.abspath(video_path)}|{stat.st_size}|{stat.st_mtime_ns}|"
+               f"{self.columns}x{self.rows}@{self.tile_width}")
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}.jpg")
+
+    def _generate(self, video_path: str) -> str:
+        """单次FFmpeg调用生成联系表，返回图片路径"""
+        sheet_path = self._sheet_path(video_path)
+        if sheet_path is None:
+            raise FileNotFoundError(video_path)
+        if os.path.exists(sheet_path):
+            return sheet_path
+
+        tiles = self.columns * self.rows
+        duration = self._get_duration(video_path)
+        # 按时长均匀取 tiles 帧；时长未知时退化为每秒一帧
+        rate = f"{tiles}/{duration:.3f}" if duration else "1"
+        vf = (f"fps={rate},scale={self.tile_width}:-2:flags=fast_bilinear,"
+              f"tile={self.columns}x{self.rows}")
+
+        os.makedirs(os.path.dirname(sheet_path), exist_ok=True)
+        tmp_path = f"{sheet_path}.{threading.get_ident()}.tmp.jpg"
+        error = "FFmpeg未输出图片"
+        try:
+            # 先只解码关键帧；关键帧过稀疏（如整段只有一个GOP）时tile填不满，退回完整解码
+            for decode_args in (['-skip_frame', 'nokey'], []):
+                cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-nostdin',
+                       *decode_args, '-i', video_path,
+                       '-vf', vf, '-an', '-frames:v', '1', '-q:v', '4', '-y', tmp_path]
+                result = subprocess.run(cmd, capture_output=True, text=True,
+                                        encoding='utf-8', errors='ignore', timeout=600)
+                if result.returncode == 0 and os.path.exists(tmp_path):
+                    os.replace(tmp_path, sheet_path)
+                    return sheet_path
+                error = result.stderr.strip() or error
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        raise RuntimeError(error)
+
+    def _get_duration(self, video_path: str) -> Optional[float]:
+        """获取视频时长（秒）"""
+        info = probe_video(video_path)
+        return info.duration if info and info.duration else None
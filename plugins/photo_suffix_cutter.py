@@ -8,11 +8,139 @@
 import os
 import re
 import uuid
-from typing import List, Dict, Any, Optional
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple
 from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QCheckBox, QLineEdit, QSpinBox, QFormLayout
+from batch_processors.base import is_case_insensitive
+from core.services.capture_index import CaptureIndex, JPEG_EXTENSIONS
 from plugins.base_processor import BaseProcessor, MediaTask, ProcessingResult
 
 
+# 规则动作
+ACTION_RENAME = 'rename'
+ACTION_DENOISED = 'denoised'
+ACTION_DATE_PREFIX = 'date_prefix'
+ACTION_DELETE = 'delete'
+
+RENAME_MESSAGES = {
+    ACTION_RENAME: '重命名文件',
+    ACTION_DENOISED: '处理降噪JPG',
+    ACTION_DATE_PREFIX: '移除日期前缀',
+}
+SKIP_MESSAGES = {
+    ACTION_RENAME: '跳过重命名（目标文件已存在）',
+    ACTION_DENOISED: '跳过降噪JPG（目标文件已存在）',
+    ACTION_DATE_PREFIX: '跳过日期前缀（目标文件已存在）',
+}
+
+
+# 合并后分组编号会改变的构造：编号反向引用 \1、命名反向引用 (?P=name)、条件分组 (?(1)...)；
+# 行内全局标志 (?i) 只能出现在整个正则开头，合并后会报错或作用到其他模式；
+# 命名分组在多个模式中重名时也无法合并（编译失败，逐个匹配）
+_UNCOMBINABLE = re.compile(r'\\[1-9]|\(\?P[<=]|\(\?\(|\(\?[aiLmsux]+\)')
+
+
+def _combine_patterns(patterns: Tuple[str, ...]) -> List[re.Pattern]:
+    """多个模式能安全合并时返回一个按顺序尝试的分支正则，否则逐个编译"""
+    if len(patterns) > 1 and not any(_UNCOMBINABLE.search(p) for p in patterns):
+        try:
+            return [re.compile('|'.join(f'(?:{p})' for p in patterns))]
+        except re.error:
+            pass
+    return [re.compile(p) for p in patterns]
+
+
+class SuffixCutterRules:
+    """
+    编译后的后缀剪切规则集
+    
+    相机文件名规则（后缀编号、降噪JPG、降噪DNG）合并为一个正则，用命名分组区分；
+    多个日期前缀模式合并为一个按顺序尝试的分支正则。每个文件只匹配一次，
+    不再为每个文件重新构建扩展名列表和正则。
+    """
+
+    def __init__(self,
+                 rename_jpg_files: bool,
+                 file_prefix: str,
+                 suffix_number: int,
+                 process_denoised_jpg: bool,
+                 delete_denoised_dng: bool,
+                 remove_date_prefix: bool,
+                 date_prefix_patterns: Tuple[str, ...],
+                 extensions: Tuple[str, ...]):
+        self.suffix_number = suffix_number
+        self.extensions = frozenset(ext.lower() for ext in extensions)
+        
+        # 三条相机文件名规则互斥（后缀编号要求数字，降噪文件要求"已增强"），可以合并
+        branches = []
+        if rename_jpg_files:
+            branches.append(r'(?P<rename>' + re.escape(file_prefix) + r'\d{4})-\d+\.[^.]*')
+        if process_denoised_jpg:
+            branches.append(r'(?P<denoised>_DSC\d{4})-已增强-降噪(?:-\d+)?\.jpg')
+        if delete_denoised_dng:
+            branches.append(r'(?P<delete>_DSC\d{4})-已增强-降噪\.dng')
+        self.camera = re.compile('(?:' + '|'.join(branches) + r')\Z', re.IGNORECASE) if branches else None
+        
+        # 分支按顺序尝试，与逐个模式匹配、取第一个匹配的效果相同；
+        # 模式中含反向引用或命名分组时逐个匹配
+        self.date_prefixes: List[re.Pattern] = []
+        if remove_date_prefix and date_prefix_patterns:
+            self.date_prefixes = _combine_patterns(date_prefix_patterns)
+        
+        self.enabled = self.camera is not None or bool(self.date_prefixes)
+
+    def apply(self, filename: str) -> Tuple[Optional[str], Optional[str]]:
+        """
+        计算单个文件的处理动作
+        
+        先应用相机文件名规则，重命名后的名称再尝试移除日期前缀（与原先分步处理的顺序一致）。
+        
+        Args:
+            filename: 文件名
+            
+        Returns:
+            (动作, 新文件名)；无需处理时动作为None，删除时新文件名为None
+        """
+        file_ext = os.path.splitext(filename)[1]
+        if file_ext.lower() not in self.extensions:
+            return None, None
+        
+        action, name = None, filename
+        if self.camera is not None:
+            match = self.camera.match(filename)
+            if match:
+                if match.lastgroup == 'delete':
+                    return ACTION_DELETE, None
+                action = ACTION_RENAME if match.lastgroup == 'rename' else ACTION_DENOISED
+                name = f"{match.group(match.lastgroup)}-{self.suffix_number}{file_ext}"
+        
+        for pattern in self.date_prefixes:
+            match = pattern.match(name)
+            if match:
+                # 已由相机规则重命名的文件移除前缀后仍记为该规则的结果
+                return action or ACTION_DATE_PREFIX, name[match.end():]
+        return action, (name if action else None)
+
+
+@lru_cache(maxsize=32)
+def _compile_suffix_rules(*key) -> SuffixCutterRules:
+    return SuffixCutterRules(*key)
+
+
+def compile_suffix_rules(options: Dict[str, Any]) -> SuffixCutterRules:
+    """按选项获取编译好的规则集（相同选项只编译一次）"""
+    return _compile_suffix_rules(
+        bool(options['rename_jpg_files']),
+        options.get('file_prefix', '_DSC'),
+        options['dsc_suffix_number'],
+        bool(options['process_denoised_jpg']),
+        bool(options['delete_denoised_dng']),
+        bool(options['remove_date_prefix']),
+        tuple(options.get('date_prefix_patterns', ())),
+        tuple(options.get('file_extensions', ['.jpg', '.JPG', '.dng', '.DNG'])),
+    )
+
+
 class PhotoSuffixCutterProcessor(BaseProcessor):
     """照片后缀剪切处理器"""
 
@@ -25,6 +153,7 @@ class PhotoSuffixCutterProcessor(BaseProcessor):
             'dsc_suffix_number': 1,            # 文件后缀编号（如-1、-2等）
             'process_denoised_jpg': True,      # 是否处理降噪JPG文件
             'delete_denoised_dng': True,       # 是否删除降噪DNG文件
+            'keep_unpaired_dng': True,         # 没有对应降噪JPG的降噪DNG不删除
             'remove_date_prefix': True,        # 是否移除日期前缀
             'date_prefix_patterns': [          # 日期前缀模式列表
                 r'^\d{4}-\d{2}-\d{2}-',        # YYYY-MM-DD-
@@ -272,147 +401,54 @@ class PhotoSuffixCutterProcessor(BaseProcessor):
     
     def _process_folder(self, folder_path: str, options: Dict[str, Any] = None):
         """
-        处理单个文件夹
+        处理单个文件夹：只列出一次目录，每个文件按编译好的规则集依次匹配
         
         Args:
             folder_path: 文件夹路径
             options: 处理选项，如果为None则使用self.options
         """
-        # 保存原来的选项
-        original_options = self.options.copy()
-        
-        try:
-            # 使用传入的选项或默认选项
-            if options is not None:
-                self.options = options
-            
-            if self.options['rename_jpg_files']:
-                self._rename_jpg_files(folder_path)
-                
-            if self.options['process_denoised_jpg']:
-                self._process_denoised_jpg(folder_path)
-                
-            if self.options['delete_denoised_dng']:
-                self._delete_denoised_dng(folder_path)
-                
-            if self.options['remove_date_prefix']:
-                self._remove_date_prefix(folder_path)
+        options = options if options is not None else self.options
+        rules = compile_suffix_rules(options)
+        if not rules.enabled:
+            return
         
-        finally:
-            # 恢复原来的选项
-            self.options = original_options
-
-    def _rename_jpg_files(self, folder_path: str):
-        """重命名JPG文件（支持多种前缀）"""
-        suffix_number = self.options['dsc_suffix_number']
-        file_prefix = self.options.get('file_prefix', '_DSC')
-        # 获取配置的文件扩展名
-        extensions = self.options.get('file_extensions', ['.jpg', '.JPG', '.dng', '.DNG'])
-        
-        for filename in os.listdir(folder_path):
-            # 检查文件扩展名是否在配置的扩展名列表中（不区分大小写）
-            file_ext = os.path.splitext(filename)[1]
-            if file_ext.lower() not in [ext.lower() for ext in extensions]:
+        filenames = sorted(os.listdir(folder_path))
+        # 目录中已占用的名称，重命名/删除时同步更新，不再逐个 os.path.exists；
+        # 不区分大小写的文件系统上按小写比较，与 os.path.exists 的结果一致
+        fold = str.lower if is_case_insensitive(folder_path) else str
+        occupied = {fold(name) for name in filenames}
+        # 按拍摄分组（基于处理前的列表），降噪DNG是否有对应的降噪JPG只需查表
+        captures = CaptureIndex()
+        for filename in filenames:
+            captures.add(os.path.join(folder_path, filename))
+        for filename in filenames:
+            action, new_name = rules.apply(filename)
+            if action is None:
                 continue
-                
-            # 使用配置的前缀，匹配如 _DSC0001-2.ext 或 _Z80001-3.ext 等模式
-            # 注意：前缀可能包含特殊字符，需要转义
-            escaped_prefix = re.escape(file_prefix)
-            escaped_ext = re.escape(file_ext)
-            # 匹配模式：前缀 + 4位数字 + '-' + 数字 + 扩展名
-            pattern = r'(' + escaped_prefix + r'\d{4})-(\d+)' + escaped_ext + r'$'
-            match = re.match(pattern, filename, re.IGNORECASE)
-            if match:
-                prefix_number = match.group(1)  # 例如 _DSC0001
-                # 使用配置的后缀编号，保持原扩展名
-                new_base = f"{prefix_number}-{suffix_number}"
-                new_filename = new_base + file_ext
-                old_file = os.path.join(folder_path, filename)
-                new_file = os.path.join(folder_path, new_filename)
-                
-                # 检查目标文件是否已存在
-                if not os.path.exists(new_file):
-                    os.rename(old_file, new_file)
-                    print(f'重命名文件: {filename} -> {new_filename}')
-                else:
-                    print(f'跳过重命名（目标文件已存在）: {filename}')
-
-    def _process_denoised_jpg(self, folder_path: str):
-        """处理降噪JPG文件"""
-        suffix_number = self.options['dsc_suffix_number']
-        # 获取配置的文件扩展名
-        extensions = self.options.get('file_extensions', ['.jpg', '.JPG', '.dng', '.DNG'])
-        
-        for filename in os.listdir(folder_path):
-            # 检查文件扩展名是否在配置的扩展名列表中
-            file_ext = os.path.splitext(filename)[1]
-            if file_ext.lower() not in [ext.lower() for ext in extensions]:
-                continue
-                
-            # 匹配降噪JPG文件，如 _DSC0001-已增强-降噪.jpg 或 _DSC0001-已增强-降噪-3.jpg
-            match = re.match(r'(_DSC\d{4})-已增强-降噪(-(\d+))?\.jpg$', filename, re.IGNORECASE)
-            if match:
-                dsc_number = match.group(1)
-                # 使用配置的后缀编号，保持原扩展名
-                new_filename = f"{dsc_number}-{suffix_number}{file_ext}"
-                old_file = os.path.join(folder_path, filename)
-                new_file = os.path.join(folder_path, new_filename)
-                
-                # 检查目标文件是否已存在
-                if not os.path.exists(new_file):
-                    os.rename(old_file, new_file)
-                    print(f'处理降噪JPG: {filename} -> {new_filename}')
-                else:
-                    print(f'跳过降噪JPG（目标文件已存在）: {filename}')
-
-    def _delete_denoised_dng(self, folder_path: str):
-        """删除降噪DNG文件"""
-        # 获取配置的文件扩展名
-        extensions = self.options.get('file_extensions', ['.jpg', '.JPG', '.dng', '.DNG'])
-        
-        for filename in os.listdir(folder_path):
-            # 检查文件扩展名是否在配置的扩展名列表中（不区分大小写）
-            file_ext = os.path.splitext(filename)[1]
-            if file_ext.lower() not in [ext.lower() for ext in extensions]:
-                continue
-                
-            match = re.match(r'(_DSC\d{4})-已增强-降噪\.dng$', filename, re.IGNORECASE)
-            if match:
-                file_to_delete = os.path.join(folder_path, filename)
+            old_file = os.path.join(folder_path, filename)
+            
+            if action == ACTION_DELETE:
+                group = captures.group_of(old_file)
+                # 只认同名的降噪JPG（_DSC0001-已增强-降噪.dng 对应 _DSC0001-已增强-降噪.jpg）
+                if options.get('keep_unpaired_dng', True) and not group.variants_of(old_file, JPEG_EXTENSIONS):
+                    print(f'保留降噪DNG（没有对应的降噪JPG）: {filename}')
+                    continue
                 try:
-                    os.remove(file_to_delete)
+                    os.remove(old_file)
+                    occupied.discard(fold(filename))
                     print(f'Deleted: {filename}')
                 except Exception as e:
                     print(f'Failed to delete {filename}: {str(e)}')
-
-    def _remove_date_prefix(self, folder_path: str):
-        """移除日期前缀"""
-        # 获取配置的文件扩展名
-        extensions = self.options.get('file_extensions', ['.jpg', '.JPG', '.dng', '.DNG'])
-        
-        for filename in os.listdir(folder_path):
-            # 检查文件扩展名是否在配置的扩展名列表中（不区分大小写）
-            file_ext = os.path.splitext(filename)[1]
-            if file_ext.lower() not in [ext.lower() for ext in extensions]:
                 continue
-                
-            for pattern in self.options['date_prefix_patterns']:
-                match = re.match(pattern, filename)
-                if match:
-                    # 计算匹配的日期前缀长度
-                    match_end = match.end()
-                    new_name = filename[match_end:]  # 移除日期前缀
-                    old_path = os.path.join(folder_path, filename)
-                    new_path = os.path.join(folder_path, new_name)
-
-                    # 检查目标文件是否已存在
-                    if not os.path.exists(new_path):
-                        # 执行重命名
-                        os.rename(old_path, new_path)
-                        print(f'移除日期前缀: {filename} -> {new_name}')
-                    else:
-                        print(f'跳过日期前缀（目标文件已存在）: {filename}')
-                    break  # 匹配到一个模式就处理，不再尝试其他模式
+            
+            # 检查目标文件是否已存在（仅大小写不同的目标就是文件自身）
+            if fold(new_name) in occupied and fold(new_name) != fold(filename):
+                print(f'{SKIP_MESSAGES[action]}: {filename}')
+                continue
+            os.rename(old_file, os.path.join(folder_path, new_name))
+            occupied.discard(fold(filename))
+            occupied.add(fold(new_name))
+            print(f'{RENAME_MESSAGES[action]}: {filename} -> {new_name}')
 
     def _rename_single_file(self, filename: str, folder_path: str, file_ext: str, options: Dict[str, Any]) -> bool:
         """重命名单个文件"""
@@ -488,6 +524,14 @@ class PhotoSuffixCutterProcessor(BaseProcessor):
         match = re.match(r'(_DSC\d{4})-已增强-降噪\.dng$', filename, re.IGNORECASE)
         if match:
             file_to_delete = os.path.join(folder_path, filename)
+            if options.get('keep_unpaired_dng', True):
+                # 与批量处理相同：按拍摄分组，只认同名的降噪JPG
+                captures = CaptureIndex()
+                for name in os.listdir(folder_path):
+                    captures.add(os.path.join(folder_path, name))
+                if not captures.group_of(file_to_delete).variants_of(file_to_delete, JPEG_EXTENSIONS):
+                    print(f'保留降噪DNG（没有对应的降噪JPG）: {filename}')
+                    return False
             try:
                 os.remove(file_to_delete)
                 print(f'Deleted: {filename}')
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试可续传复制在中断后的续传与重新开始
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+
+from batch_processors.base import copy_engine
+from batch_processors.base.copy_engine import copy_file_resumable
+
+
+CHUNK = 64 * 1024
+SIZE = 4 * CHUNK + 1234
+# 第三块复制到一半时中断：检查点记录两块
+CRASH_AT = 2 * CHUNK + CHUNK // 2
+
+
+class _Crash(Exception):
+    pass
+
+
+class _CountingCopy:
+    """替换内核复制和缓冲复制，统计复制的字节数，并可在复制到 crash_at 字节时模拟中断"""
+
+    def __init__(self, crash_at=None):
+        self.crash_at = crash_at
+        self.copied = 0
+        self._kernel = copy_engine._copy_kernel
+        self._buffered = copy_engine._copy_buffered
+
+    def __enter__(self):
+        copy_engine._copy_kernel = self.kernel
+        copy_engine._copy_buffered = self.buffered
+        return self
+
+    def __exit__(self, *exc):
+        copy_engine._copy_kernel = self._kernel
+        copy_engine._copy_buffered = self._buffered
+
+    def _allowed(self, count):
+        if self.crash_at is None:
+            return count
+        return min(count, self.crash_at - self.copied)
+
+    def _account(self, copied, count):
+        self.copied += copied
+        if copied < count and self.crash_at is not None and self.copied >= self.crash_at:
+            raise _Crash()
+        return copied
+
+    def kernel(self, src_fd, dst_fd, size):
+        allowed = self._allowed(size)
+        return self._account(self._kernel(src_fd, dst_fd, allowed) if allowed else 0, size)
+
+    def buffered(self, src_fd, dst_fd, buffer_size, hasher=None, limit=None):
+        allowed = self._allowed(limit)
+        copied = self._buffered(src_fd, dst_fd, buffer_size, hasher, limit=allowed) if allowed else 0
+        return self._account(copied, limit)
+
+
+def _make_source(folder):
+    src = os.path.join(folder, 'src.bin')
+    with open(src, 'wb') as f:
+        f.write(os.urandom(SIZE))
+    return src
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def _interrupted_copy(hasher=None):
+    """复制到第三块中间时中断，返回 (目录, 源文件, 目标文件)"""
+    folder = tempfile.mkdtemp()
+    src = _make_source(folder)
+    dst = os.path.join(folder, 'dst.bin')
+    try:
+        with _CountingCopy(crash_at=CRASH_AT):
+            copy_file_resumable(src, dst, hasher=hasher, chunk_size=CHUNK)
+    except _Crash:
+        pass
+    else:
+        raise AssertionError("复制没有中断")
+    assert not os.path.exists(dst)
+    assert os.path.getsize(dst + '.part') == CRASH_AT
+    with open(dst + '.part.json', encoding='utf-8') as f:
+        assert json.load(f)['completed'] == 2 * CHUNK
+    return folder, src, dst
+
+
+def _resume(src, dst, hasher=None):
+    """继续复制，返回本次实际复制的字节数"""
+    with _CountingCopy() as counter:
+        assert copy_file_resumable(src, dst, hasher=hasher, chunk_size=CHUNK) == os.path.getsize(src)
+    assert _read(dst) == _read(src)
+    assert not os.path.exists(dst + '.part')
+    assert not os.path.exists(dst + '.part.json')
+    return counter.copied
+
+
+def test_resume_after_interrupt_mid_chunk():
+    """块中间中断后从最后一个完整块续传，结果逐字节一致"""
+    folder, src, dst = _interrupted_copy()
+    try:
+        assert _resume(src, dst) == SIZE - 2 * CHUNK
+    finally:
+        shutil.rmtree(folder)
+
+
+def test_resume_with_hasher():
+    """续传时补算已复制部分，哈希与源文件一致"""
+    folder, src, dst = _interrupted_copy(hasher=hashlib.sha256())
+    try:
+        hasher = hashlib.sha256()
+        assert _resume(src, dst, hasher) == SIZE - 2 * CHUNK
+        assert hasher.hexdigest() == hashlib.sha256(_read(src)).hexdigest()
+    finally:
+        shutil.rmtree(folder)
+
+
+def test_restart_when_source_mtime_changed():
+    """源文件修改时间变化时从头复制"""
+    folder, src, dst = _interrupted_copy()
+    try:
+        stat = os.stat(src)
+        os.utime(src, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        assert _resume(src, dst) == SIZE
+    finally:
+        shutil.rmtree(folder)
+
+
+def test_restart_when_source_size_changed():
+    """源文件大小变化时从头复制新内容"""
+    folder, src, dst = _interrupted_copy()
+    try:
+        stat = os.stat(src)
+        with open(src, 'ab') as f:
+            f.write(b'appended')
+        # 保持修改时间不变，只靠大小判断
+        os.utime(src, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        assert _resume(src, dst) == SIZE + len(b'appended')
+    finally:
+        shutil.rmtree(folder)
+
+
+def test_restart_when_last_chunk_mismatch():
+    """最后一个已完成的块与源文件不一致时从头复制"""
+    folder, src, dst = _interrupted_copy()
+    try:
+        with open(dst + '.part', 'r+b') as f:
+            f.seek(2 * CHUNK - 1)
+            byte = f.read(1)
+            f.seek(2 * CHUNK - 1)
+            f.write(bytes([byte[0] ^ 0xFF]))
+        assert _resume(src, dst) == SIZE
+    finally:
+        shutil.rmtree(folder)
+
+
+def test_restart_on_corrupt_checkpoint():
+    """检查点损坏（JSON不完整）时从头复制"""
+    folder, src, dst = _interrupted_copy()
+    try:
+        with open(dst + '.part.json', 'w', encoding='utf-8') as f:
+            f.write('{"src_size": ')
+        assert _resume(src, dst) == SIZE
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+    test_resume_after_interrupt_mid_chunk()
+    test_resume_with_hasher()
+    test_restart_when_source_mtime_changed()
+    test_restart_when_source_size_changed()
+    test_restart_when_last_chunk_mismatch()
+    test_restart_on_corrupt_checkpoint()
+    print("✅ 可续传复制测试通过")
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试重命名日志在各阶段中断后的恢复
+"""
+
+import os
+import shutil
+import tempfile
+
+from batch_processors.base.rename_journal import RenameJournal
+
+
+# 互换、链式改名（经过临时名称）和直接改名
+MOVES = [
+    ('a.jpg', 'b.jpg'),
+    ('b.jpg', 'a.jpg'),
+    ('x.jpg', 'y.jpg'),
+    ('y.jpg', 'z.jpg'),
+    ('c.jpg', 'c2.jpg'),
+]
+
+
+class _Crash(Exception):
+    pass
+
+
+class _CrashingJournal(RenameJournal):
+    """第 crash_at 次重命名前模拟进程中断，并丢弃尚未落盘的进度"""
+
+    def __init__(self, folder, crash_at, fail_targets=()):
+        super().__init__(folder, sync_every=1000)
+        self.crash_at = crash_at
+        self.fail_targets = set(fail_targets)
+        self.renames = 0
+        self.synced_size = 0
+
+    def _write_plan(self, entries):
+        super()._write_plan(entries)
+        self.synced_size = os.path.getsize(self.path)
+
+    def _sync(self):
+        super()._sync()
+        self.synced_size = os.path.getsize(self.path)
+
+    def _rename(self, old, new):
+        if self.renames == self.crash_at:
+            self._handle.close()
+            with open(self.path, 'r+b') as f:
+                f.truncate(self.synced_size)
+            raise _Crash()
+        self.renames += 1
+        if os.path.basename(new) in self.fail_targets:
+            return False
+        return super()._rename(old, new)
+
+
+def _make_folder():
+    folder = tempfile.mkdtemp()
+    for name in ('a.jpg', 'b.jpg', 'x.jpg', 'y.jpg', 'c.jpg'):
+        with open(os.path.join(folder, name), 'w') as f:
+            f.write(name)
+    return folder
+
+
+def _contents(folder):
+    result = {}
+    for name in os.listdir(folder):
+        with open(os.path.join(folder, name)) as f:
+            result[name] = f.read()
+    return result
+
+
+def _moves(folder):
+    return [(os.path.join(folder, src), os.path.join(folder, dst)) for src, dst in MOVES]
+
+
+def _run_with_crash(crash_at, fail_targets=()):
+    """执行到第 crash_at 次重命名时中断，返回目录；未中断返回 None"""
+    folder = _make_folder()
+    journal = _CrashingJournal(folder, crash_at, fail_targets)
+    try:
+        journal.execute(_moves(folder))
+    except _Crash:
+        return folder
+    shutil.rmtree(folder)
+    return None
+
+
+def test_resume_after_crash_in_every_phase():
+    """任一次重命名前中断后继续执行，所有文件都到达目标名称"""
+    crash_at = 0
+    while True:
+        folder = _run_with_crash(crash_at)
+        if folder is None:
+            break
+        try:
+            results = RenameJournal(folder).recover('resume')
+            assert not results['failure'], (crash_at, results)
+            assert _contents(folder) == {dst: src for src, dst in MOVES}, crash_at
+        finally:
+            shutil.rmtree(folder)
+        crash_at += 1
+    # 阶段1三次、阶段2两次、阶段3三次
+    assert crash_at == 8
+
+
+def test_rollback_after_crash_in_every_phase():
+    """任一次重命名前中断后回滚，所有文件恢复原名"""
+    for crash_at in range(8):
+        folder = _run_with_crash(crash_at)
+        try:
+            RenameJournal(folder).recover('rollback')
+            assert _contents(folder) == {src: src for src, _ in MOVES}, crash_at
+        finally:
+            shutil.rmtree(folder)
+
+
+def test_crash_after_failed_entry_restored():
+    """临时名称改为目标失败并改回源名称后中断，恢复时不会误判为已就位"""
+    # 重命名顺序：阶段1 三次、阶段2 两次、tmp->b.jpg 失败、改回 a.jpg，随后中断
+    folder = _run_with_crash(7, fail_targets={'b.jpg'})
+    try:
+        journal = RenameJournal(folder)
+        entries, _ = journal._load()
+        assert entries[0].state < 0 and os.path.exists(entries[0].src)
+        journal.recover('resume')
+        contents = _contents(folder)
+        assert sorted(contents.values()) == sorted(src for src, _ in MOVES)
+        assert not any(name.startswith('.mediaflow') for name in contents)
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+    test_resume_after_crash_in_every_phase()
+    test_rollback_after_crash_in_every_phase()
+    test_crash_after_failed_entry_restored()
+    print("✅ 重命名日志中断恢复测试通过")
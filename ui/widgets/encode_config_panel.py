@@ -12,6 +12,13 @@ from PySide6.QtCore import Qt
 class EncodeConfigPanel(QWidget):
     """编码配置面板"""
     
+    # 各质量指标的目标值范围、小数位数、步长和默认值
+    TARGET_METRIC_RANGES = {
+        "SSIM": (0.0, 1.0, 3, 0.005, 0.95),
+        "PSNR": (20.0, 60.0, 1, 0.5, 40.0),
+        "VMAF": (0.0, 100.0, 1, 1.0, 93.0),
+    }
+    
     def __init__(self, parent=None):
         super().__init__(parent)
         self._setup_ui()
@@ -77,6 +84,20 @@ class EncodeConfigPanel(QWidget):
         # 硬件加速
         self.hw_accel_checkbox = QCheckBox("启用硬件加速")
         
+        # 目标质量（自动搜索CRF）
+        target_layout = QHBoxLayout()
+        self.target_quality_checkbox = QCheckBox("按目标质量选择CRF")
+        self.target_metric_combo = QComboBox()
+        self.target_metric_combo.addItems(["SSIM", "PSNR", "VMAF"])
+        self.target_quality_spinbox = QDoubleSpinBox()
+        self._on_target_metric_changed(self.target_metric_combo.currentText())
+        self.target_metric_combo.setEnabled(False)
+        self.target_quality_spinbox.setEnabled(False)
+        
+        target_layout.addWidget(self.target_quality_checkbox)
+        target_layout.addWidget(self.target_metric_combo)
+        target_layout.addWidget(self.target_quality_spinbox)
+        
         # 添加到表单布局
         config_layout.addRow("编码器:", self.codec_combo)
         config_layout.addRow("预设:", self.preset_combo)
@@ -85,6 +106,7 @@ class EncodeConfigPanel(QWidget):
         config_layout.addRow("帧率:", self.framerate_spinbox)
         config_layout.addRow("分辨率:", res_layout)
         config_layout.addRow("", self.hw_accel_checkbox)
+        config_layout.addRow("目标质量:", target_layout)
         
         # 添加到主布局
         layout.addWidget(config_group)
@@ -92,7 +114,22 @@ class EncodeConfigPanel(QWidget):
     
     def _connect_signals(self):
         """连接信号"""
-        pass
+        self.target_quality_checkbox.toggled.connect(self._on_target_quality_toggled)
+        self.target_metric_combo.currentTextChanged.connect(self._on_target_metric_changed)
+    
+    def _on_target_quality_toggled(self, checked: bool):
+        """目标质量模式切换：启用时CRF由搜索决定"""
+        self.target_metric_combo.setEnabled(checked)
+        self.target_quality_spinbox.setEnabled(checked)
+        self.crf_spinbox.setEnabled(not checked)
+    
+    def _on_target_metric_changed(self, metric: str):
+        """切换质量指标时重置目标值的范围和默认值（SSIM 0.95、PSNR 40、VMAF 93）"""
+        minimum, maximum, decimals, step, default = self.TARGET_METRIC_RANGES[metric]
+        self.target_quality_spinbox.setDecimals(decimals)
+        self.target_quality_spinbox.setRange(minimum, maximum)
+        self.target_quality_spinbox.setSingleStep(step)
+        self.target_quality_spinbox.setValue(default)
     
     def get_config(self):
         """获取当前配置"""
@@ -103,7 +140,10 @@ class EncodeConfigPanel(QWidget):
             'bitrate': self.bitrate_spinbox.value(),
             'framerate': self.framerate_spinbox.value(),
             'resolution': (self.width_spinbox.value(), self.height_spinbox.value()),
-            'hardware_acceleration': self.hw_accel_checkbox.isChecked()
+            'hardware_acceleration': self.hw_accel_checkbox.isChecked(),
+            'target_quality': (self.target_quality_spinbox.value()
+                               if self.target_quality_checkbox.isChecked() else None),
+            'target_metric': self.target_metric_combo.currentText().lower()
         }
     
     def set_config(self, config: dict):
@@ -142,4 +182,15 @@ class EncodeConfigPanel(QWidget):
             self.height_spinbox.setValue(height)
         
         if 'hardware_acceleration' in config:
-            self.hw_accel_checkbox.setChecked(config['hardware_acceleration'])
\ No newline at end of file
+            self.hw_accel_checkbox.setChecked(config['hardware_acceleration'])
+        
+        if 'target_metric' in config and config['target_metric']:
+            index = self.target_metric_combo.findText(config['target_metric'].upper())
+            if index >= 0:
+                self.target_metric_combo.setCurrentIndex(index)
+        
+        if 'target_quality' in config:
+            target = config['target_quality']
+            self.target_quality_checkbox.setChecked(target is not None)
+            if target is not None:
+                self.target_quality_spinbox.setValue(target)
\ No newline at end of file
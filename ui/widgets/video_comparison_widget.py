@@ -1,6 +1,7 @@
 """
 左右分屏视频对比控件
 """
+import os
 from PySide6.QtWidgets import (
     QWidget, QHBoxLayout, QVBoxLayout, QSplitter,
     QLabel, QSlider, QPushButton, QFrame
@@ -10,6 +11,9 @@ from PySide6.QtGui import QImage, QPixmap, QPainter
 import pyqtgraph as pg
 import numpy as np
 
+from core.services.frame_cache import FramePrefetcher
+from core.services.proxy_manager import ProxyManager
+
 
 class VideoComparisonWidget(QWidget):
     """左右分屏视频对比控件"""
@@ -22,6 +26,18 @@ class VideoComparisonWidget(QWidget):
         # 存储原始和处理后的帧
         self.original_frame = None
         self.processed_frame = None
+        
+        # 帧缓存与预取（设置视频源后才创建）
+        self.prefetcher = None
+        
+        # 大分辨率源使用低分辨率代理进行交互预览
+        self.proxy_manager = None
+        self.source_paths = ()
+        self.use_proxy = True
+        
+        # 显示色阶（对比度通过色阶调整，不重算像素）和非uint8帧的转换缓冲区
+        self.display_levels = (0.0, 255.0)
+        self._display_buffers = {}
     
     def _setup_ui(self):
         """设置UI界面"""
@@ -33,16 +49,20 @@ class VideoComparisonWidget(QWidget):
         # 左侧：原始视频视图
         self.original_view = pg.GraphicsLayoutWidget()
         self.original_plot = self.original_view.addPlot(title="原始视频")
-        self.original_image = pg.ImageItem()
+        self.original_image = pg.ImageItem(axisOrder='row-major')
         self.original_plot.addItem(self.original_image)
+        # 行优先的图像原点在左上角
+        self.original_plot.getViewBox().invertY(True)
         self.original_plot.hideAxis('left')
         self.original_plot.hideAxis('bottom')
         
         # 右侧：处理后视频视图
         self.processed_view = pg.GraphicsLayoutWidget()
         self.processed_plot = self.processed_view.addPlot(title="处理后视频")
-        self.processed_image = pg.ImageItem()
+        self.processed_image = pg.ImageItem(axisOrder='row-major')
         self.processed_plot.addItem(self.processed_image)
+        # 行优先的图像原点在左上角
+        self.processed_plot.getViewBox().invertY(True)
         self.processed_plot.hideAxis('left')
         self.processed_plot.hideAxis('bottom')
         
@@ -70,13 +90,23 @@ class VideoComparisonWidget(QWidget):
         controls_layout.addWidget(self.contrast_slider)
         controls_layout.addStretch()
         
+        # 进度滑块：拖动时从帧缓存读取
+        self.position_slider = QSlider(Qt.Horizontal)
+        self.position_slider.setEnabled(False)
+        self.position_label = QLabel("00:00.000")
+        position_layout = QHBoxLayout()
+        position_layout.addWidget(self.position_slider)
+        position_layout.addWidget(self.position_label)
+        
         # 添加到主布局
         layout.addWidget(splitter)
+        layout.addLayout(position_layout)
         layout.addLayout(controls_layout)
     
     def _connect_signals(self):
         """连接信号"""
         self.contrast_slider.valueChanged.connect(self._on_contrast_changed)
+        self.position_slider.valueChanged.connect(self._on_position_changed)
         
         # 连接两个视图的缩放和移动事件
         if self.sync_zoom_btn.isChecked():
@@ -90,38 +120,113 @@ class VideoComparisonWidget(QWidget):
         
         # 更新左侧视图
         if original_frame is not None:
-            # 将numpy数组转换为适合显示的格式
-            img_data = self._convert_to_display_format(original_frame)
-            self.original_image.setImage(img_data)
+            img_data = self._convert_to_display_format(original_frame, 'original')
+            self.original_image.setImage(img_data, autoLevels=False, levels=self.display_levels)
         
         # 更新右侧视图
         if processed_frame is not None:
-            # 将numpy数组转换为适合显示的格式
-            img_data = self._convert_to_display_format(processed_frame)
-            self.processed_image.setImage(img_data)
+            img_data = self._convert_to_display_format(processed_frame, 'processed')
+            self.processed_image.setImage(img_data, autoLevels=False, levels=self.display_levels)
+    
+    def set_sources(self, original_path: str, processed_path: str = None, use_proxy: bool = True):
+        """
+        设置对比的两个视频，拖动进度条时按需解码并缓存
+        
+        use_proxy为True时，大分辨率源先用原文件显示，后台代理生成完成后自动切换到代理。
+        """
+        self.source_paths = (original_path, processed_path)
+        self.use_proxy = use_proxy
+        self._load_sources(position=0)
+    
+    def _load_sources(self, position: int):
+        """按当前代理状态加载视频源，并停留在指定帧"""
+        paths = [p for p in self.source_paths if p]
+        if self.use_proxy:
+            if self.proxy_manager is None:
+                self.proxy_manager = ProxyManager()
+                self.proxy_manager.proxy_ready.connect(self._on_proxy_ready)
+            paths = [self.proxy_manager.resolve(p) for p in paths]
+        
+        if self.prefetcher is None:
+            self.prefetcher = FramePrefetcher()
+        self.prefetcher.set_sources(*paths)
+        
+        position = min(position, max(0, self.prefetcher.frame_count - 1))
+        self.position_slider.blockSignals(True)
+        self.position_slider.setRange(0, max(0, self.prefetcher.frame_count - 1))
+        self.position_slider.setValue(position)
+        self.position_slider.blockSignals(False)
+        self.position_slider.setEnabled(self.prefetcher.frame_count > 0)
+        self.seek(position / self.prefetcher.fps)
     
-    def _convert_to_display_format(self, frame):
-        """将帧数据转换为适合pyqtgraph显示的格式"""
+    def _on_proxy_ready(self, source_path: str, proxy_path: str):
+        """代理生成完成：若属于当前视频则切换到代理"""
+        current = {os.path.abspath(p) for p in self.source_paths if p}
+        if self.use_proxy and source_path in current:
+            self._load_sources(position=self.position_slider.value())
+    
+    def seek(self, timestamp: float):
+        """跳转到指定时间（秒）并显示两侧的帧"""
+        if self.prefetcher is None or not self.prefetcher.sources:
+            return
+        frames = self.prefetcher.seek(timestamp)
+        original_frame = frames[0] if frames else None
+        processed_frame = frames[1] if len(frames) > 1 else None
+        self.update_frames(original_frame, processed_frame)
+        
+        minutes, seconds = divmod(timestamp, 60)
+        self.position_label.setText(f"{int(minutes):02d}:{seconds:06.3f}")
+    
+    def _on_position_changed(self, value):
+        """进度滑块变化处理"""
+        if self.prefetcher is not None:
+            self.seek(value / self.prefetcher.fps)
+    
+    def closeEvent(self, event):
+        """关闭时停止预取线程"""
+        if self.prefetcher is not None:
+            self.prefetcher.stop()
+            self.prefetcher = None
+        if self.proxy_manager is not None:
+            self.proxy_manager.shutdown()
+            self.proxy_manager = None
+        super().closeEvent(event)
+    
+    def _convert_to_display_format(self, frame, buffer_key: str = None):
+        """
+        将帧数据转换为适合pyqtgraph显示的格式
+        
+        uint8灰度图不复制，直接按单通道显示。BGR帧翻转通道后写入连续的RGB缓冲区
+        （反向步长的视图会在pyqtgraph内部再复制一次），非uint8帧同时截断为uint8；
+        缓冲区按尺寸复用。
+        """
         if frame is None:
-            return np.zeros((100, 100, 3))
-        
-        # 如果是BGR格式，转换为RGB
-        if len(frame.shape) == 3 and frame.shape[2] == 3:
-            # OpenCV默认是BGR，转换为RGB
-            frame_rgb = frame[:, :, [2, 1, 0]]  # BGR to RGB
-        elif len(frame.shape) == 2:
-            # 灰度图，复制到三个通道
-            frame_rgb = np.stack([frame, frame, frame], axis=2)
+            return np.zeros((100, 100), dtype=np.uint8)
+        
+        if frame.ndim == 3 and frame.shape[2] == 3:
+            # OpenCV默认是BGR
+            source = frame[:, :, ::-1]
+        elif frame.dtype != np.uint8:
+            source = frame
         else:
-            frame_rgb = frame
+            return frame
         
-        return frame_rgb.astype(np.uint8)
+        buffer = self._display_buffers.get(buffer_key)
+        if buffer is None or buffer.shape != frame.shape:
+            buffer = self._display_buffers[buffer_key] = np.empty(frame.shape, dtype=np.uint8)
+        if frame.dtype == np.uint8:
+            np.copyto(buffer, source)
+        else:
+            np.clip(source, 0, 255, out=buffer, casting='unsafe')
+        return buffer
     
     def _on_contrast_changed(self, value):
-        """对比度变化处理"""
-        # 这里可以实现对比度调整逻辑
-        contrast_factor = value / 100.0
-        # 更新显示...
+        """对比度变化处理：以中灰为中心收窄/放宽显示色阶"""
+        contrast_factor = max(value, 1) / 100.0
+        half_range = 127.5 / contrast_factor
+        self.display_levels = (127.5 - half_range, 127.5 + half_range)
+        self.original_image.setLevels(self.display_levels)
+        self.processed_image.setLevels(self.display_levels)
     
     def _sync_views(self):
         """同步两个视图的视图范围"""
@@ -5,6 +5,7 @@
 """
 import os
 import json
+import threading
 from PySide6.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QSplitter,
     QMenuBar, QStatusBar, QToolBar, QTabWidget, QDockWidget,
@@ -14,15 +15,22 @@ from PySide6.QtWidgets import (
     QHeaderView, QComboBox, QSizePolicy, QToolBox, QRadioButton, QButtonGroup
 )
 from PySide6.QtCore import Qt, QDir, QFileInfo, Signal, QModelIndex
-from PySide6.QtGui import QAction, QIcon, QKeySequence, QStandardItemModel, QStandardItem
+from PySide6.QtGui import QAction, QIcon, QKeySequence, QStandardItemModel, QStandardItem, QPixmap, QTransform
 
 
 from ui.viewmodels.main_viewmodel import MainViewModel
+from core.engine.raw_preview import extract_preview, is_raw_file
+from core.services.duplicate_index import DuplicateIndex
+from core.services.thumbnail_service import ThumbnailService
 
 
 class MainWindow(QMainWindow):
     """现代化主窗口 - 左右分栏布局"""
     
+    # 后台查找重复照片的结果（从工作线程发出，在界面线程处理）
+    duplicates_found = Signal(list, int)   # 重复分组, 本次新索引的数量
+    duplicates_failed = Signal(str)        # 错误信息
+    
     def __init__(self):
         super().__init__()
         self.viewmodel = MainViewModel()
@@ -37,6 +45,16 @@ class MainWindow(QMainWindow):
         # 当前选中的文件
         self.current_files = []
         
+        # 视频联系表服务（后台生成 + 磁盘缓存）
+        self.thumbnail_service = ThumbnailService()
+        self.thumbnail_service.thumbnail_ready.connect(self._on_thumbnail_ready)
+        self.current_thumbnail_video = None
+        
+        # 重复照片查找（感知哈希计算耗时，在后台线程中进行）
+        self.duplicates_found.connect(self._on_duplicates_found)
+        self.duplicates_failed.connect(self._on_duplicates_failed)
+        self._duplicate_thread = None
+        
         # 配置文件路径
         self.config_file = "mediaflow_config.json"
         
@@ -178,6 +196,9 @@ class MainWindow(QMainWindow):
         self.batch_process_action.setShortcut("Ctrl+B")
         self.batch_process_action.setStatusTip("执行批量处理")
         
+        self.find_duplicates_action = QAction("查找重复照片", self)
+        self.find_duplicates_action.setStatusTip("在所有根目录中查找重复和近似重复的照片")
+        
         # 帮助操作
         self.about_action = QAction("关于", self)
         self.about_action.setStatusTip("关于MediaFlow")
@@ -196,6 +217,8 @@ class MainWindow(QMainWindow):
         process_menu = menubar.addMenu("处理(&P)")
         process_menu.addAction(self.preview_action)
         process_menu.addAction(self.batch_process_action)
+        process_menu.addSeparator()
+        process_menu.addAction(self.find_duplicates_action)
         
         # 帮助菜单
         help_menu = menubar.addMenu("帮助(&H)")
@@ -294,6 +317,14 @@ class MainWindow(QMainWindow):
         self.file_info_text.setPlaceholderText("选择文件查看信息...")
         info_layout.addWidget(self.file_info_text)
         
+        # 视频联系表
+        self.thumbnail_label = QLabel()
+        self.thumbnail_label.setAlignment(Qt.AlignCenter)
+        self.thumbnail_label.setMinimumHeight(120)
+        self.thumbnail_label.setMaximumHeight(200)
+        self.thumbnail_label.setVisible(False)
+        info_layout.addWidget(self.thumbnail_label)
+        
         layout.addWidget(info_group)
         
         return panel
@@ -515,6 +546,7 @@ class MainWindow(QMainWindow):
         # 连接动作信号
         self.exit_action.triggered.connect(self.close)
         self.about_action.triggered.connect(self._show_about)
+        self.find_duplicates_action.triggered.connect(self._find_duplicate_photos)
         
         # 连接视图模型信号
         self.viewmodel.status_message_changed.connect(self._update_status)
@@ -624,6 +656,72 @@ class MainWindow(QMainWindow):
             elif file_info.isDir():
                 info = f"文件夹: {file_info.fileName()}\n路径: {file_path}"
                 self.file_info_text.setPlainText(info)
+            
+            self._show_video_thumbnail(index, file_path if file_info.isFile() else None)
+    
+    def _show_video_thumbnail(self, index: QModelIndex, file_path: str = None):
+        """显示视频联系表（并预取相邻视频）或RAW内嵌预览"""
+        if file_path and is_raw_file(file_path):
+            self._show_raw_preview(file_path)
+            return
+        if not file_path or not ThumbnailService.is_video(file_path):
+            self.current_thumbnail_video = None
+            self.thumbnail_label.clear()
+            self.thumbnail_label.setVisible(False)
+            return
+        
+        self.current_thumbnail_video = file_path
+        self.thumbnail_label.setVisible(True)
+        sheet_path = self.thumbnail_service.request(file_path)
+        if sheet_path:
+            self._set_thumbnail_pixmap(sheet_path)
+        else:
+            self.thumbnail_label.setPixmap(QPixmap())
+            self.thumbnail_label.setText("正在生成缩略图...")
+        
+        # 预取树视图中前后相邻的文件
+        model = self.file_tree_view.model()
+        parent = index.parent()
+        neighbours = []
+        for offset in (1, -1, 2, -2, 3, -3):
+            sibling = model.index(index.row() + offset, 0, parent)
+            if sibling.isValid():
+                neighbours.append(model.filePath(sibling))
+        self.thumbnail_service.prefetch(neighbours)
+    
+    def _show_raw_preview(self, file_path: str):
+        """直接显示RAW文件内嵌的JPEG预览（不解马赛克）"""
+        self.current_thumbnail_video = None
+        self.thumbnail_label.setVisible(True)
+        preview = extract_preview(file_path)
+        if preview is None:
+            self.thumbnail_label.setPixmap(QPixmap())
+            self.thumbnail_label.setText("未找到内嵌预览")
+            return
+        with preview:
+            pixmap = QPixmap()
+            pixmap.loadFromData(preview.to_bytes())
+        transform = {3: 180, 6: 90, 8: 270}.get(preview.orientation)
+        if transform:
+            pixmap = pixmap.transformed(QTransform().rotate(transform))
+        self.thumbnail_label.setPixmap(pixmap.scaled(
+            self.thumbnail_label.width(), self.thumbnail_label.maximumHeight(),
+            Qt.KeepAspectRatio, Qt.SmoothTransformation))
+    
+    def _on_thumbnail_ready(self, video_path: str, sheet_path: str):
+        """联系表生成完成"""
+        if video_path == self.current_thumbnail_video:
+            self._set_thumbnail_pixmap(sheet_path)
+    
+    def _set_thumbnail_pixmap(self, sheet_path: str):
+        """按标签大小缩放显示联系表"""
+        pixmap = QPixmap(sheet_path)
+        if pixmap.isNull():
+            self.thumbnail_label.setText("缩略图加载失败")
+            return
+        self.thumbnail_label.setPixmap(pixmap.scaled(
+            self.thumbnail_label.width(), self.thumbnail_label.maximumHeight(),
+            Qt.KeepAspectRatio, Qt.SmoothTransformation))
     
     def _on_file_double_clicked(self, index: QModelIndex):
         """文件双击事件"""
@@ -868,6 +966,48 @@ class MainWindow(QMainWindow):
         except Exception as e:
             QMessageBox.critical(self, "错误", f"执行失败: {str(e)}")
 
+    def _find_duplicate_photos(self):
+        """在所有根目录中查找重复/近似重复照片，结果显示在预览区"""
+        if not self.root_paths:
+            QMessageBox.warning(self, "提示", "请先添加文件夹。")
+            return
+        
+        if self._duplicate_thread is not None and self._duplicate_thread.is_alive():
+            return
+        
+        self._update_status("正在计算照片感知哈希...")
+        self.find_duplicates_action.setEnabled(False)
+        self._duplicate_thread = threading.Thread(
+            target=self._scan_duplicates, args=(list(self.root_paths),), daemon=True)
+        self._duplicate_thread.start()
+    
+    def _scan_duplicates(self, root_paths):
+        """工作线程：更新感知哈希索引并分组，结果通过信号交回界面线程"""
+        try:
+            with DuplicateIndex() as index:
+                index.prune_missing()
+                added = index.scan_folders(root_paths)
+                groups = index.find_duplicate_groups()
+        except Exception as e:
+            self.duplicates_failed.emit(str(e))
+            return
+        self.duplicates_found.emit(groups, len(added))
+    
+    def _on_duplicates_failed(self, message: str):
+        self.find_duplicates_action.setEnabled(True)
+        self._update_status("查找重复照片失败")
+        QMessageBox.critical(self, "错误", f"查找重复照片失败: {message}")
+    
+    def _on_duplicates_found(self, groups: list, added: int):
+        self.find_duplicates_action.setEnabled(True)
+        lines = [f"🔍 重复照片: {len(groups)} 组（本次新索引 {added} 张）", ""]
+        for i, group in enumerate(groups, 1):
+            lines.append(f"第 {i} 组:")
+            lines.extend(f"  {path}" for path in group)
+            lines.append("")
+        self.preview_text.setPlainText("\n".join(lines))
+        self._update_status(f"找到 {len(groups)} 组重复照片")
+    
     def _run_photo_batch_rename(self, folder_path: str):
         from batch_processors.photo.batch_extension_renamer import BatchPhotoExtensionRenamer
         input_ext = self.photo_input_fmt.currentText().strip()
@@ -968,5 +1108,6 @@ class MainWindow(QMainWindow):
     def closeEvent(self, event):
         """关闭事件处理"""
         # 清理资源
+        self.thumbnail_service.shutdown()
         self.viewmodel.dispose()
         event.accept()
\ No newline at end of file